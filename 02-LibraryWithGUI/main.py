@@ -7,10 +7,15 @@
 
 from tkinter import *
 from tkinter import messagebox
+from bisect import bisect_left, insort
 import json
 
 # Initializing library
 library = {}
+# Books ordered by title: sorted list of (lowercase title, key), kept up to date on add, delete and load
+title_order = []
+# List books alphabetically instead of in the order they were added
+sort_by_title = False
 # File path
 file = "assignment2/library.json"
 
@@ -18,6 +23,15 @@ file = "assignment2/library.json"
 def current_books():
     return len(library)
 
+# Rebuild the title order from the whole library
+def rebuild_title_order():
+    title_order[:] = sorted((value['title'].lower(), key) for key, value in library.items())
+
+# Books start to start + count in title order, without sorting
+def books_by_title(start=0, count=None):
+    stop = len(title_order) if count is None else start + count
+    return [(key, library[key]) for title, key in title_order[start:stop]]
+
 # List box function
 def list_box_f():
     def quit_listbox():
@@ -30,7 +44,8 @@ def list_box_f():
     list_box = Listbox(list_box_window, width=50)
     list_box.pack(pady=10)
 
-    for item, value in library.items():
+    books = books_by_title() if sort_by_title else library.items()
+    for item, value in books:
         list_box.insert(END, f"{item} - {value['title']} {value['author']} ({value['year']})")
 
     Button(list_box_window, text='Close', command=quit_listbox).pack(pady=10)
@@ -43,7 +58,13 @@ def add_book():
         year = entry_year.get()
 
         if title and author and year.isdigit():
-            library['Book ' + str(current_books() + 1)] = {"title": title, "author": author, "year": year}
+            # Skip numbers still in use, keys are not renumbered after a delete
+            number = current_books() + 1
+            while 'Book ' + str(number) in library:
+                number += 1
+            key = 'Book ' + str(number)
+            library[key] = {"title": title, "author": author, "year": year}
+            insort(title_order, (title.lower(), key))
             messagebox.showinfo("Success", f"Book '{title}' added!")
             add_window.destroy()
         else:
@@ -69,20 +90,10 @@ def add_book():
 
 # Sorting book function
 def sort_books():
-    global library
-
-    # Sort books by title
-    sorted_books = sorted(library.items(), key=lambda item: item[1]['title'].lower())
-
-    sorted_library = {}
-
-    # Iterate through sorted books and update the library
-    for i, (key, value) in enumerate(sorted_books):
-        new_key = f'Book {i + 1}'
-        sorted_library[new_key] = value
+    global sort_by_title
 
-    # Update the global library with sorted books
-    library = sorted_library
+    # The title order is already kept sorted, the list just reads from it
+    sort_by_title = True
 
     # Show message
     messagebox.showinfo("Sorted", "Books sorted alphabetically!")
@@ -105,13 +116,14 @@ def delete_book():
         
         title = entry_title.get()
         
-        # Search for the book and delete if found
-        for key, value in library.items():
-            if value["title"].lower() == title.lower():
-                del library[key]
-                messagebox.showinfo("Success", f"Book '{title}' deleted!")
-                delete_window.destroy()
-                return
+        # Find the book in the title order and delete it if found
+        i = bisect_left(title_order, (title.lower(),))
+        if i < len(title_order) and title_order[i][0] == title.lower():
+            key = title_order.pop(i)[1]
+            del library[key]
+            messagebox.showinfo("Success", f"Book '{title}' deleted!")
+            delete_window.destroy()
+            return
         messagebox.showerror("Error", "Book not found!")
 
     Button(delete_window, text="Delete", command=confirm_delete).pack()
@@ -123,6 +135,7 @@ def load_book():
     try:
         with open(file, 'r', encoding="utf-8") as f:
             library = json.load(f)
+        rebuild_title_order()
         messagebox.showinfo("Success!", "Books Loaded successfully!")
     except FileNotFoundError:
         messagebox.showerror("Failed!", "File not found!")
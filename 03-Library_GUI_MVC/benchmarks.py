@@ -0,0 +1,304 @@
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Tuple
+
+try:
+    import resource
+except ImportError:
+    resource = None  # type: ignore[assignment]
+
+from library_export import columnar_ext, export_library, open_columns
+from library_model import BookGenerator, Library, rand_author, rand_status, rand_title, rand_year
+
+# -----------------------
+# Helpers
+# -----------------------
+
+
+def uncached(lib: Library) -> Library:
+    # Time the search itself, not the query cache answering the repeats
+    lib.cache.maxsize = 0
+    return lib
+
+
+def fill(lib: Library, n: int, seed: int = 0) -> Library:
+    rng = random.Random(seed)
+    for _ in range(n):
+        lib.add_book(rand_title(rng), rand_author(rng), rand_year(rng), rand_status(rng))
+    return lib
+
+
+def timed(fn: Callable, repeat: int = 3) -> Tuple[float, object]:
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def report(rows: List[Tuple[str, float, float]]) -> None:
+    print(f"{'query':<32}{'scan ms':>12}{'index ms':>12}{'speedup':>10}")
+    for name, scan, idx in rows:
+        print(f"{name:<32}{scan * 1000:>12.1f}{idx * 1000:>12.1f}{scan / max(idx, 1e-9):>9.1f}x")
+
+
+# -----------------------
+# Benchmarks
+# -----------------------
+
+SEARCH_QUERIES: List[Tuple[str, Dict[str, object]]] = [
+    ("title 'dawn'", dict(title="dawn")),
+    ("title 'munich of the sea'", dict(title="munich of the sea")),
+    ("author 'baron'", dict(author="baron")),
+    ("title 'lost' + author 'key'", dict(title="lost", author="key")),
+    ("title 'zzz' (no match)", dict(title="zzz")),
+    ("status 'missing'", dict(include_statuses={"missing"})),
+    ("all but 'deleted'", dict(exclude_statuses={"deleted"})),
+    ("title 'dawn' not 'deleted'", dict(title="dawn", exclude_statuses={"deleted"})),
+    ("years 2020-2021", dict(year_from=2020, year_to=2021)),
+    ("title 'dawn' + years 1950-1960", dict(title="dawn", year_from=1950, year_to=1960)),
+]
+
+
+def bench_search(n: int) -> None:
+    """Linear scan vs. trigram index for substring queries."""
+    t0 = time.perf_counter()
+    scan_lib = uncached(fill(Library(), n))
+    t1 = time.perf_counter()
+    index_lib = uncached(fill(Library(indexed=True), n))
+    t2 = time.perf_counter()
+    print(f"{n} books: fill {t1 - t0:.2f}s plain, {t2 - t1:.2f}s indexed")
+
+    rows = []
+    for name, query in SEARCH_QUERIES:
+        scan_t, expected = timed(lambda: scan_lib.search(**query))
+        idx_t, got = timed(lambda: index_lib.search(**query))
+        if got != expected:
+            raise AssertionError(f"Index returned different results for {name}")
+        rows.append((f"{name} [{len(expected)}]", scan_t, idx_t))
+    report(rows)
+
+
+def peak_rss() -> int:
+    # Peak resident set size of this process in bytes
+    if resource is None:
+        import psutil  # Windows has no resource module
+        return psutil.Process().memory_info().peak_wset
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def fill_rss(n: int, columnar: bool) -> Tuple[int, float]:
+    # Runs in a fresh process, so the peak RSS only grows by what the library holds
+    before = peak_rss()
+    lib = Library(columnar=columnar)
+    t0 = time.perf_counter()
+    fill(lib, n)
+    return peak_rss() - before, time.perf_counter() - t0
+
+
+def bench_memory(n: int) -> None:
+    """Process RSS taken by the books of a dataclass vs. a columnar library."""
+    sizes = {}
+    for name, columnar in (("dataclass", False), ("columnar", True)):
+        # Each in its own spawned process; memory freed by the first is not given back to the OS
+        with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            sizes[name], elapsed = pool.submit(fill_rss, n, columnar).result()
+        print(f"{name:<10} {sizes[name] / 2**20:>9.1f} MiB  {sizes[name] / n:>7.1f} B/book  fill {elapsed:.2f}s")
+    print(f"columnar uses {sizes['columnar'] / sizes['dataclass']:.1%} of the dataclass RSS")
+
+
+def bench_generate(n: int) -> None:
+    """Per-row add_book loop vs. BookGenerator's bulk draw + fast path."""
+    for name, kwargs in (("dataclass", {}), ("columnar", dict(columnar=True)), ("indexed", dict(indexed=True))):
+        t0 = time.perf_counter()
+        fill(Library(**kwargs), n)
+        loop = time.perf_counter() - t0
+        gen = BookGenerator(seed=0)
+        gen.generate(Library(**kwargs), n)
+        print(f"{name:<10} loop {n / loop:>12,.0f} books/s   bulk {gen.rate():>12,.0f} books/s   {loop * gen.rate() / n:.1f}x")
+
+
+def bench_page(n: int) -> None:
+    """Full search() + sort vs. the first page of a search_cursor()."""
+    lib = uncached(Library(indexed=True))
+    BookGenerator(seed=0).generate(lib, n)
+    print(f"{'query':<32}{'full ms':>12}{'page ms':>12}{'speedup':>10}")
+    for name, query in SEARCH_QUERIES:
+        full, _ = timed(lambda: sorted(lib.search(**query).values(), key=lambda b: b.id))
+        page, _ = timed(lambda: lib.search_cursor(**query).fetch(500))
+        print(f"{name:<32}{full * 1000:>12.1f}{page * 1000:>12.2f}{full / max(page, 1e-9):>9.1f}x")
+
+
+def bench_cache(n: int) -> None:
+    """Repeated search(): first run, cached, and after a status change."""
+    lib = Library(indexed=True)
+    BookGenerator(seed=0).generate(lib, n)
+    print(f"{'query':<32}{'first ms':>12}{'cached ms':>12}{'changed ms':>12}")
+    for name, query in SEARCH_QUERIES:
+        lib.cache.clear()
+        first, _ = timed(lambda: lib.search(**query), repeat=1)
+        cached, _ = timed(lambda: lib.search(**query))
+        lib.set_status(n // 2, "lent out" if lib.get(n // 2).status != "lent out" else "available")
+        changed, _ = timed(lambda: lib.search(**query), repeat=1)
+        print(f"{name:<32}{first * 1000:>12.1f}{cached * 1000:>12.3f}{changed * 1000:>12.3f}")
+    print(f"hits {lib.cache.hits}, misses {lib.cache.misses}")
+
+
+def bench_shards(n: int) -> None:
+    """Full-scan search in-process vs. fanned out to 1, 2 and 4 shard processes."""
+    lib = uncached(Library())
+    BookGenerator(seed=0).generate(lib, n)
+    queries = [(name, q) for name, q in SEARCH_QUERIES if "title" in q or "author" in q]
+    scan = {name: timed(lambda: lib.search(**q), repeat=1)[0] for name, q in queries}
+    print(f"{'query':<32}{'1 proc ms':>12}" + "".join(f"{f'{w} shards':>12}" for w in (1, 2, 4)))
+    results = {}
+    for workers in (1, 2, 4):
+        lib.enable_shards(workers)
+        lib.search(title="warm up")  # start the workers and write the snapshot
+        for name, q in queries:
+            results[name, workers] = timed(lambda: lib.search(**q))[0]
+        lib.disable_shards()
+    for name, _ in queries:
+        print(f"{name:<32}{scan[name] * 1000:>12.1f}" + "".join(f"{results[name, w] * 1000:>12.1f}" for w in (1, 2, 4)))
+
+
+def bench_export(n: int) -> None:
+    """Saving and loading as indent-2 JSON vs. the chunked CSV and column formats."""
+    folder = tempfile.mkdtemp(prefix="library-bench-")
+    try:
+        for name, kwargs in (("dataclass", {}), ("columnar", dict(columnar=True))):
+            lib = Library(**kwargs)
+            BookGenerator(seed=0).generate(lib, n)
+            path = os.path.join(folder, "books.json")
+
+            def save_json() -> None:
+                with open(path, "w", encoding="utf-8") as f:
+                    json.dump(lib.to_json_obj(), f, indent=2)
+
+            save, _ = timed(save_json, repeat=1)
+            with open(path, encoding="utf-8") as f:
+                load, _ = timed(lambda: Library(**kwargs).load_json_stream(f), repeat=1)
+            print(f"{name:<10} {'.json':<9} save {save:>7.2f}s   load {load:>7.2f}s   {os.path.getsize(path) / 1e6:>8.1f} MB")
+            for ext in (".csv", columnar_ext()):
+                path = os.path.join(folder, "books" + ext)
+                save, _ = timed(lambda: export_library(lib, path), repeat=1)
+
+                def load() -> None:
+                    with open_columns(path) as reader:
+                        for _ in Library(**kwargs).iter_load_columns(reader):
+                            pass
+
+                print(f"{name:<10} {ext:<9} save {save:>7.2f}s   load {timed(load, repeat=1)[0]:>7.2f}s"
+                      f"   {os.path.getsize(path) / 1e6:>8.1f} MB")
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def bench_rollback(n: int) -> None:
+    """Undoing a generated batch: hard_delete per id vs. rollback to a savepoint."""
+    for name, kwargs in (("dataclass", {}), ("columnar", dict(columnar=True)), ("indexed", dict(indexed=True))):
+        lib = Library(**kwargs)
+        BookGenerator(seed=0).generate(lib, n)
+        ids = BookGenerator(seed=1).generate(lib, n)
+        t0 = time.perf_counter()
+        for bid in ids:
+            lib.hard_delete(bid)
+        per_id = time.perf_counter() - t0
+
+        lib = Library(**kwargs)
+        BookGenerator(seed=0).generate(lib, n)
+        sp = lib.savepoint()
+        BookGenerator(seed=1).generate(lib, n)
+        t0 = time.perf_counter()
+        lib.rollback(sp)
+        rollback = time.perf_counter() - t0
+        print(f"{name:<10} hard_delete {per_id * 1000:>9.1f} ms   rollback {rollback * 1000:>9.1f} ms   {per_id / max(rollback, 1e-9):.1f}x")
+
+
+def bench_threads(n: int, seconds: float = 2.0) -> None:
+    """Searches on several threads while writers swap statuses, with a consistency check.
+
+    Each write swaps the statuses of two books in one transaction, so the
+    number of "available" books never changes; every search that counts
+    something else saw a half-done write.
+    """
+    for name, kwargs in (("dataclass", {}), ("columnar", dict(columnar=True)), ("indexed", dict(indexed=True))):
+        for readers in (1, 2, 4, 8):
+            lib = uncached(Library(**kwargs))
+            BookGenerator(seed=0).generate(lib, n)
+            available = len(lib.search(include_statuses={"available"}))
+            stop = threading.Event()
+            reads = [0] * readers
+            writes = [0]
+            wrong = [0]
+
+            def read(slot: int) -> None:
+                rng = random.Random(slot)
+                while not stop.is_set():
+                    if rng.random() < 0.5:
+                        found = len(lib.search(include_statuses={"available"}))
+                    else:
+                        # A cursor takes the lock page by page, so count it out in one go
+                        with lib.lock.read():
+                            found = sum(1 for _ in lib.search_cursor(include_statuses={"available"}))
+                    if found != available:
+                        wrong[0] += 1
+                    reads[slot] += 1
+
+            def write() -> None:
+                rng = random.Random(-1)
+                while not stop.is_set():
+                    a, b = rng.randrange(1, lib.next_id), rng.randrange(1, lib.next_id)
+                    with lib.transaction():
+                        old_a, old_b = lib.get(a).status, lib.get(b).status
+                        lib.set_status(a, old_b)
+                        lib.set_status(b, old_a)
+                    writes[0] += 1
+
+            threads = [threading.Thread(target=read, args=(i,)) for i in range(readers)]
+            threads.append(threading.Thread(target=write))
+            for t in threads:
+                t.start()
+            time.sleep(seconds)
+            stop.set()
+            for t in threads:
+                t.join()
+            print(f"{name:<10} {readers} readers   {sum(reads) / seconds:>9,.1f} searches/s"
+                  f"   {writes[0] / seconds:>11,.1f} swaps/s   {wrong[0]} inconsistent")
+
+
+BENCHMARKS: Dict[str, Callable[[int], None]] = {
+    "cache": bench_cache,
+    "export": bench_export,
+    "generate": bench_generate,
+    "memory": bench_memory,
+    "page": bench_page,
+    "rollback": bench_rollback,
+    "search": bench_search,
+    "shards": bench_shards,
+    "threads": bench_threads,
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Library model benchmarks")
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument("-n", type=int, default=100_000, help="number of books")
+    args = parser.parse_args()
+    BENCHMARKS[args.benchmark](args.n)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from collections.abc import MutableMapping
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+# -----------------------
+# Columnar book storage
+# -----------------------
+#
+# A drop-in replacement for the Dict[int, Book] behind Library.books.  Each
+# book is one slot in a handful of typed arrays instead of its own object:
+#
+#   ids            array('q')  sorted book ids, lookup by bisect
+#   title/author   array('I')  codes into a StringPool
+#   years          array('H')  integer year, NO_YEAR if kept in odd_years
+#   status         bytearray   code into status_names, DEAD for deleted rows
+#
+# Deleted rows stay as tombstones until compact() squeezes them out.
+
+NO_YEAR = 0xFFFF
+DEAD = 0xFF
+
+
+def year_code(year: str) -> int:
+    # Anything that does not survive int() -> str() unchanged ("07", "",
+    # "19th c.") is kept verbatim on the side, as NO_YEAR in the column.
+    if year.isdigit() and int(year) < NO_YEAR and str(int(year)) == year:
+        return int(year)
+    return NO_YEAR
+
+
+class StringPool:
+    """Dictionary encoding: every distinct string is stored once."""
+
+    def __init__(self) -> None:
+        self.values: List[str] = []
+        self.codes: Dict[str, int] = {}
+
+    def encode(self, s: str) -> int:
+        code = self.codes.get(s)
+        if code is None:
+            code = self.codes[s] = len(self.values)
+            self.values.append(s)
+        return code
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def clear(self) -> None:
+        self.values.clear()
+        self.codes.clear()
+
+
+class BookRow:
+    """Read view of one row; only `status` can be assigned."""
+
+    __slots__ = ("_store", "_id", "_row", "_epoch")
+
+    def __init__(self, store: "ColumnStore", book_id: int, row: int) -> None:
+        self._store = store
+        self._id = book_id
+        self._row = row
+        self._epoch = store.epoch
+
+    def _pos(self) -> int:
+        # Rows move when the store is compacted; find ours again by id
+        store = self._store
+        if self._epoch != store.epoch:
+            self._row = store.row_of(self._id)
+            self._epoch = store.epoch
+        return self._row
+
+    @property
+    def id(self) -> int:
+        return self._id
+
+    @property
+    def title(self) -> str:
+        s = self._store
+        return s.titles.values[s.title_codes[self._pos()]]
+
+    @property
+    def author(self) -> str:
+        s = self._store
+        return s.authors.values[s.author_codes[self._pos()]]
+
+    @property
+    def year(self) -> str:
+        s = self._store
+        y = s.years[self._pos()]
+        return s.odd_years[self._id] if y == NO_YEAR else str(y)
+
+    @property
+    def status(self) -> str:
+        s = self._store
+        return s.status_names[s.status[self._pos()]]
+
+    @status.setter
+    def status(self, value: str) -> None:
+        s = self._store
+        s.status[self._pos()] = s.status_code(value)
+
+    def __repr__(self) -> str:
+        return f"BookRow(id={self.id}, title={self.title!r}, author={self.author!r}, year={self.year!r}, status={self.status!r})"
+
+
+class ColumnStore(MutableMapping):
+    """Mapping of book id -> BookRow backed by typed column arrays."""
+
+    def __init__(self, statuses: Sequence[str]) -> None:
+        self._empty_columns()
+        self.titles = StringPool()
+        self.authors = StringPool()
+        self.status_names: List[str] = list(statuses)
+        self.odd_years: Dict[int, str] = {}
+        self.live = 0
+        # Bumped whenever rows change position
+        self.epoch = 0
+
+    def _empty_columns(self) -> None:
+        self.ids = array("q")
+        self.title_codes = array("I")
+        self.author_codes = array("I")
+        self.years = array("H")
+        self.status = bytearray()
+
+    def _own_columns(self) -> None:
+        # Columns opened from a snapshot are read-only-sized views of the
+        # mapped file; copy them into growable arrays before the first insert.
+        if isinstance(self.ids, array):
+            return
+        cols = []
+        for code, view in (("q", self.ids), ("I", self.title_codes), ("I", self.author_codes), ("H", self.years)):
+            col = array(code)
+            col.frombytes(view.cast("B"))
+            cols.append(col)
+        self.ids, self.title_codes, self.author_codes, self.years = cols
+        self.status = bytearray(self.status)
+
+    # ---- encoding ----
+
+    def status_code(self, status: str) -> int:
+        try:
+            return self.status_names.index(status)
+        except ValueError:
+            if len(self.status_names) >= DEAD:
+                raise ValueError(f"Too many distinct statuses: {status}")
+            self.status_names.append(status)
+            return len(self.status_names) - 1
+
+    def encode_year(self, book_id: int, year: str) -> int:
+        code = year_code(year)
+        if code == NO_YEAR:
+            self.odd_years[book_id] = year
+        else:
+            self.odd_years.pop(book_id, None)
+        return code
+
+    # ---- row lookup ----
+
+    def row_of(self, book_id: int) -> int:
+        ids = self.ids
+        row = bisect_left(ids, book_id)
+        if row == len(ids) or ids[row] != book_id or self.status[row] == DEAD:
+            raise KeyError(book_id)
+        return row
+
+    def rows(self) -> Iterator[Tuple[int, int]]:
+        status = self.status
+        for row, bid in enumerate(self.ids):
+            if status[row] != DEAD:
+                yield row, bid
+
+    # ---- mapping protocol ----
+
+    def __getitem__(self, book_id: int) -> BookRow:
+        return BookRow(self, book_id, self.row_of(book_id))
+
+    def __setitem__(self, book_id: int, book) -> None:
+        if self.tombstones() > max(4096, self.live):
+            self.compact()
+        values = (
+            self.titles.encode(book.title),
+            self.authors.encode(book.author),
+            self.encode_year(book_id, book.year),
+            self.status_code(book.status),
+        )
+        ids = self.ids
+        # New ids normally come from Library.next_id, i.e. after the last row
+        row = len(ids) if not ids or book_id > ids[-1] else bisect_left(ids, book_id)
+        if row < len(ids) and ids[row] == book_id:
+            if self.status[row] == DEAD:
+                self.live += 1
+            self._write(row, values)
+            return
+        self._own_columns()
+        ids = self.ids
+        if row == len(ids):
+            ids.append(book_id)
+            self.title_codes.append(values[0])
+            self.author_codes.append(values[1])
+            self.years.append(values[2])
+            self.status.append(values[3])
+        else:
+            # Out of order id: shift everything after it
+            ids.insert(row, book_id)
+            self.title_codes.insert(row, values[0])
+            self.author_codes.insert(row, values[1])
+            self.years.insert(row, values[2])
+            self.status.insert(row, values[3])
+            self.epoch += 1
+        self.live += 1
+
+    def extend(self, ids: Sequence[int], titles: Sequence[str], authors: Sequence[str],
+               years: Sequence[str], statuses: Sequence[str]) -> int:
+        """Append rows whose ids are all past the last row; returns the first new row."""
+        if len(ids) and self.ids and ids[0] <= self.ids[-1]:
+            raise ValueError("extend() needs ids after the last row")
+        self._own_columns()
+        first = len(self.ids)
+        # Each distinct value is encoded once, rows are then dict lookups
+        titles_c = {t: self.titles.encode(t) for t in dict.fromkeys(titles)}
+        authors_c = {a: self.authors.encode(a) for a in dict.fromkeys(authors)}
+        years_c = {y: year_code(y) for y in dict.fromkeys(years)}
+        statuses_c = {s: self.status_code(s) for s in dict.fromkeys(statuses)}
+        self.ids.extend(ids)
+        self.title_codes.extend(map(titles_c.__getitem__, titles))
+        self.author_codes.extend(map(authors_c.__getitem__, authors))
+        self.years.extend(map(years_c.__getitem__, years))
+        self.status.extend(map(statuses_c.__getitem__, statuses))
+        if NO_YEAR in years_c.values():
+            for bid, year in zip(ids, years):
+                if years_c[year] == NO_YEAR:
+                    self.odd_years[bid] = year
+        self.live += len(ids)
+        return first
+
+    def truncate(self, book_id: int) -> None:
+        """Drop every row with an id >= book_id, in O(rows dropped)."""
+        row = bisect_left(self.ids, book_id)
+        if row == len(self.ids):
+            return
+        self._own_columns()
+        for bid in self.ids[row:]:
+            self.odd_years.pop(bid, None)
+        self.live -= len(self.status) - row - self.status.count(DEAD, row)
+        del self.ids[row:], self.title_codes[row:], self.author_codes[row:], self.years[row:], self.status[row:]
+
+    def _write(self, row: int, values: Tuple[int, int, int, int]) -> None:
+        self.title_codes[row], self.author_codes[row], self.years[row], self.status[row] = values
+
+    def __delitem__(self, book_id: int) -> None:
+        row = self.row_of(book_id)
+        self.status[row] = DEAD
+        self.live -= 1
+
+    def __iter__(self) -> Iterator[int]:
+        for _, bid in self.rows():
+            yield bid
+
+    def __len__(self) -> int:
+        return self.live
+
+    def __contains__(self, book_id) -> bool:
+        try:
+            self.row_of(book_id)
+        except (KeyError, TypeError):
+            return False
+        return True
+
+    def items(self) -> Iterator[Tuple[int, BookRow]]:  # type: ignore[override]
+        for row, bid in self.rows():
+            yield bid, BookRow(self, bid, row)
+
+    def items_after(self, book_id: int) -> Iterator[Tuple[int, BookRow]]:
+        """items() starting past `book_id`, found by bisect."""
+        status = self.status
+        for row in range(bisect_right(self.ids, book_id), len(self.ids)):
+            if status[row] != DEAD:
+                bid = self.ids[row]
+                yield bid, BookRow(self, bid, row)
+
+    def columns(self, lo: int, hi: int) -> Tuple[List[int], List[str], List[str], List[str], List[str]]:
+        """Decoded (ids, titles, authors, years, statuses) of the live rows in lo..hi."""
+        hi = min(hi, len(self.ids))
+        status = self.status[lo:hi]
+        cols = [self.ids[lo:hi], self.title_codes[lo:hi], self.author_codes[lo:hi], self.years[lo:hi]]
+        if DEAD in status:
+            keep = [i for i, code in enumerate(status) if code != DEAD]
+            cols = [[col[i] for i in keep] for col in cols]
+            status = bytes(status[i] for i in keep)
+        ids, title_codes, author_codes, year_codes = cols
+        ids = list(ids)
+        years_s = {code: str(code) for code in set(year_codes)}
+        if NO_YEAR in years_s:
+            odd = self.odd_years
+            years = [odd[bid] if code == NO_YEAR else years_s[code] for bid, code in zip(ids, year_codes)]
+        else:
+            years = list(map(years_s.__getitem__, year_codes))
+        return (
+            ids,
+            list(map(self.titles.values.__getitem__, title_codes)),
+            list(map(self.authors.values.__getitem__, author_codes)),
+            years,
+            list(map(self.status_names.__getitem__, status)),
+        )
+
+    def value_counts(self) -> Tuple[Counter, Counter, Counter]:
+        """(statuses, years, authors) counts of the live rows, counted on the codes."""
+        author_codes, year_codes = self.author_codes, self.years
+        if DEAD in self.status:
+            keep = [row for row, code in enumerate(self.status) if code != DEAD]
+            author_codes = [author_codes[row] for row in keep]
+            year_codes = [year_codes[row] for row in keep]
+        names = self.status_names
+        statuses = Counter({names[code]: n for code, n in Counter(self.status).items() if code != DEAD})
+        authors = Counter({self.authors.values[code]: n for code, n in Counter(author_codes).items()})
+        by_code = Counter(year_codes)
+        years = Counter({str(code): n for code, n in by_code.items() if code != NO_YEAR})
+        if NO_YEAR in by_code:
+            years.update(year for bid, year in self.odd_years.items() if bid in self)
+        return statuses, years, authors
+
+    def iter_columns(self, chunk: int) -> Iterator[Tuple[List[int], List[str], List[str], List[str], List[str]]]:
+        # columns() over the whole store, `chunk` rows at a time
+        for lo in range(0, len(self.ids), chunk):
+            columns = self.columns(lo, lo + chunk)
+            if columns[0]:
+                yield columns
+
+    def values(self) -> Iterator[BookRow]:  # type: ignore[override]
+        for row, bid in self.rows():
+            yield BookRow(self, bid, row)
+
+    def clear(self) -> None:
+        self._empty_columns()
+        self.titles = StringPool()
+        self.authors = StringPool()
+        self.odd_years.clear()
+        self.live = 0
+        self.epoch += 1
+
+    # ---- maintenance ----
+
+    def tombstones(self) -> int:
+        return len(self.ids) - self.live
+
+    def compact(self) -> None:
+        """Drop deleted rows. Strings no longer referenced stay in the pools."""
+        keep = [row for row, _ in self.rows()]
+        for row, bid in enumerate(self.ids):
+            if self.status[row] == DEAD:
+                self.odd_years.pop(bid, None)
+        self.ids = array("q", (self.ids[r] for r in keep))
+        self.title_codes = array("I", (self.title_codes[r] for r in keep))
+        self.author_codes = array("I", (self.author_codes[r] for r in keep))
+        self.years = array("H", (self.years[r] for r in keep))
+        self.status = bytearray(self.status[r] for r in keep)
+        self.epoch += 1
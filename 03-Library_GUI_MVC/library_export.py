@@ -0,0 +1,317 @@
+import csv
+import io
+import os
+import struct
+from abc import ABC, abstractmethod
+from array import array
+from itertools import accumulate, islice
+from typing import IO, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from column_store import ColumnStore
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # columnar exports fall back to the .libcols format
+    pa = pq = None
+
+# -----------------------
+# Bulk export / import
+# -----------------------
+#
+# Interchange formats for moving whole libraries to and from other tools
+# without going through the JSON document. Every format is written and read
+# in chunks of `chunk` rows, as five columns (ids, titles, authors, years,
+# statuses), so memory stays at one chunk whatever the size of the file:
+#
+#   .csv       header id,title,author,year,status, one row per book
+#   .parquet   one row group per chunk, next_id in the schema metadata;
+#              needs pyarrow (the engine pandas uses for Parquet)
+#   .libcols   stdlib-only columnar fallback, see below
+#
+# A .libcols file is a header (MAGIC, version, next_id) followed by one
+# group per chunk: the row count, the ids as int64, then for title, author,
+# year and status the distinct values of the chunk (uint64 offsets + UTF-8
+# heap) and one uint32 code per row. Repeated values are decoded once.
+#
+# Readers yield the raw columns; Library.iter_load_columns() validates each
+# chunk in bulk (library_model.checked_chunk) before it is stored.
+
+COLUMNS = ("id", "title", "author", "year", "status")
+CHUNK = 65536
+
+MAGIC = b"LIBCOLS1"
+VERSION = 1
+_HEADER = struct.Struct("<8sIq")
+_COUNT = struct.Struct("<Q")
+
+# File dialog choices, Parquet only when it can be written
+FILE_TYPES = [("CSV files", "*.csv"), ("Library column files", "*.libcols")]
+if pq is not None:
+    FILE_TYPES.insert(1, ("Parquet files", "*.parquet"))
+
+Columns = Tuple[Sequence[int], Sequence[str], Sequence[str], Sequence[str], Sequence[str]]
+
+
+def columnar_ext() -> str:
+    # Parquet when pyarrow is installed, the stdlib format otherwise
+    return ".parquet" if pq is not None else ".libcols"
+
+
+def iter_columns(items: Iterable[Tuple[int, object]], chunk: int = CHUNK) -> Iterator[Columns]:
+    """Turn (id, book) pairs into column chunks of up to `chunk` rows."""
+    it = iter(items)
+    while True:
+        rows = list(islice(it, chunk))
+        if not rows:
+            return
+        books = [b for _, b in rows]
+        yield (
+            [bid for bid, _ in rows],
+            [b.title for b in books],
+            [b.author for b in books],
+            [b.year for b in books],
+            [b.status for b in books],
+        )
+
+
+def book_columns(books, chunk: int = CHUNK) -> Iterator[Columns]:
+    """Column chunks of a Library.books store; a ColumnStore is read column-wise."""
+    if isinstance(books, ColumnStore):
+        return books.iter_columns(chunk)
+    return iter_columns(books.items(), chunk)
+
+
+def _read(f: IO[bytes], n: int) -> bytes:
+    data = f.read(n)
+    if len(data) != n:
+        raise ValueError("Column file ends in the middle of a chunk")
+    return data
+
+
+def _size_of(f: IO) -> int:
+    try:
+        return os.fstat(f.fileno()).st_size
+    except (AttributeError, OSError, ValueError):
+        return 0
+
+
+# ---- writers ----
+
+def _write_csv(chunks: Iterable[Columns], next_id: int, f: IO[bytes]) -> None:
+    # next_id is not stored; on import it follows on from the highest id
+    text = io.TextIOWrapper(f, encoding="utf-8", newline="")
+    writer = csv.writer(text)
+    writer.writerow(COLUMNS)
+    for columns in chunks:
+        writer.writerows(zip(*columns))
+    text.flush()
+    text.detach()
+
+
+def _write_string_column(f: IO[bytes], values: Sequence[str]) -> None:
+    codes: dict = {}
+    rows = array("I", [codes.setdefault(s, len(codes)) for s in values])
+    encoded = [s.encode("utf-8") for s in codes]
+    offsets = array("Q", [0])
+    offsets.extend(accumulate(map(len, encoded)))
+    f.write(_COUNT.pack(len(encoded)))
+    f.write(offsets.tobytes())
+    f.write(b"".join(encoded))
+    f.write(rows.tobytes())
+
+
+def _write_libcols(chunks: Iterable[Columns], next_id: int, f: IO[bytes]) -> None:
+    f.write(_HEADER.pack(MAGIC, VERSION, next_id))
+    for ids, *strings in chunks:
+        f.write(_COUNT.pack(len(ids)))
+        f.write(array("q", ids).tobytes())
+        for values in strings:
+            _write_string_column(f, values)
+
+
+def _write_parquet(chunks: Iterable[Columns], next_id: int, f: IO[bytes]) -> None:
+    schema = pa.schema(
+        [("id", pa.int64())] + [(name, pa.string()) for name in COLUMNS[1:]],
+        metadata={b"next_id": str(next_id).encode()},
+    )
+    with pq.ParquetWriter(f, schema) as writer:
+        for columns in chunks:
+            writer.write_batch(pa.record_batch([pa.array(col) for col in columns], schema=schema))
+
+
+def export_library(library, path: str, chunk: int = CHUNK) -> int:
+    """Write every book of `library` to `path`, format by extension; returns the row count."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        write = _write_csv
+    elif ext == ".libcols":
+        write = _write_libcols
+    elif ext == ".parquet":
+        if pq is None:
+            raise RuntimeError("Parquet export needs pyarrow; use .libcols instead")
+        write = _write_parquet
+    else:
+        raise ValueError(f"Unknown export format: {ext or path}")
+
+    count = 0
+
+    def counted() -> Iterator[Columns]:
+        nonlocal count
+        for columns in library.iter_columns(chunk):
+            count += len(columns[0])
+            yield columns
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        write(counted(), library.next_id, f)
+    os.replace(tmp, path)
+    return count
+
+
+# ---- readers ----
+
+class ColumnReader(ABC):
+    """Iterate column chunks of an exported file.
+
+    `next_id` is the stored next_id, or None when the format has none;
+    progress() can drive a progress bar. Readers are context managers.
+    """
+
+    next_id: Optional[int] = None
+
+    @abstractmethod
+    def __iter__(self) -> Iterator[Columns]:
+        ...
+
+    @abstractmethod
+    def progress(self) -> float:
+        ...
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> "ColumnReader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class CSVColumns(ColumnReader):
+    def __init__(self, path: str, chunk: int = CHUNK) -> None:
+        self.raw = open(path, "rb")
+        self.text = io.TextIOWrapper(self.raw, encoding="utf-8", newline="")
+        self.chunk = chunk
+        self.total_bytes = _size_of(self.raw)
+
+    def __iter__(self) -> Iterator[Columns]:
+        reader = csv.reader(self.text)
+        header = [h.strip().lower() for h in next(reader, [])]
+        missing = [name for name in COLUMNS if name not in header]
+        if missing:
+            raise ValueError(f"CSV file has no {', '.join(missing)} column")
+        order = [header.index(name) for name in COLUMNS]
+        width = len(header)
+        while True:
+            rows = list(islice(reader, self.chunk))
+            if not rows:
+                return
+            try:
+                columns = list(zip(*rows, strict=True))
+            except ValueError:
+                raise ValueError(f"CSV rows must all have {width} fields") from None
+            if len(columns) != width:
+                raise ValueError(f"CSV rows must all have {width} fields")
+            yield tuple(columns[i] for i in order)  # type: ignore[misc]
+
+    def progress(self) -> float:
+        if not self.total_bytes:
+            return 0.0
+        return min(1.0, self.raw.tell() / self.total_bytes)
+
+    def close(self) -> None:
+        self.text.close()
+
+
+class LibcolsColumns(ColumnReader):
+    def __init__(self, path: str, chunk: int = CHUNK) -> None:
+        # Chunks are as large as they were written; `chunk` is unused
+        self.f = open(path, "rb")
+        self.total_bytes = _size_of(self.f)
+        magic, version, next_id = _HEADER.unpack(self.f.read(_HEADER.size).ljust(_HEADER.size, b"\0"))
+        if magic != MAGIC or version != VERSION:
+            self.f.close()
+            raise ValueError(f"{path} is not a library column file")
+        self.next_id = next_id
+
+    def _string_column(self, rows: int) -> List[str]:
+        f = self.f
+        (count,) = _COUNT.unpack(_read(f, _COUNT.size))
+        offsets = array("Q")
+        offsets.frombytes(_read(f, 8 * (count + 1)))
+        heap = _read(f, offsets[-1])
+        values = [heap[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(count)]
+        codes = array("I")
+        codes.frombytes(_read(f, 4 * rows))
+        if rows and max(codes) >= count:
+            raise ValueError("Column file refers to a value it does not have")
+        return list(map(values.__getitem__, codes))
+
+    def __iter__(self) -> Iterator[Columns]:
+        f = self.f
+        while True:
+            head = f.read(_COUNT.size)
+            if not head:
+                return
+            if len(head) != _COUNT.size:
+                raise ValueError("Column file ends in the middle of a chunk")
+            (rows,) = _COUNT.unpack(head)
+            ids = array("q")
+            ids.frombytes(_read(f, 8 * rows))
+            yield (ids, *(self._string_column(rows) for _ in range(4)))  # type: ignore[misc]
+
+    def progress(self) -> float:
+        if not self.total_bytes:
+            return 0.0
+        return min(1.0, self.f.tell() / self.total_bytes)
+
+    def close(self) -> None:
+        self.f.close()
+
+
+class ParquetColumns(ColumnReader):
+    def __init__(self, path: str, chunk: int = CHUNK) -> None:
+        if pq is None:
+            raise RuntimeError("Reading Parquet files needs pyarrow")
+        self.file = pq.ParquetFile(path)
+        self.chunk = chunk
+        meta = self.file.schema_arrow.metadata or {}
+        self.next_id = int(meta[b"next_id"]) if b"next_id" in meta else None
+        self.total_rows = self.file.metadata.num_rows
+        self.rows_read = 0
+
+    def __iter__(self) -> Iterator[Columns]:
+        for batch in self.file.iter_batches(batch_size=self.chunk, columns=list(COLUMNS)):
+            self.rows_read += batch.num_rows
+            yield tuple(batch.column(i).to_pylist() for i in range(len(COLUMNS)))  # type: ignore[misc]
+
+    def progress(self) -> float:
+        if not self.total_rows:
+            return 0.0
+        return min(1.0, self.rows_read / self.total_rows)
+
+    def close(self) -> None:
+        self.file.close()
+
+
+def open_columns(path: str, chunk: int = CHUNK) -> ColumnReader:
+    """Reader for an exported file, picked by extension."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        return CSVColumns(path, chunk)
+    if ext == ".libcols":
+        return LibcolsColumns(path, chunk)
+    if ext == ".parquet":
+        return ParquetColumns(path, chunk)
+    raise ValueError(f"Unknown import format: {ext or path}")
@@ -0,0 +1,298 @@
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+# -----------------------
+# Secondary indexes
+# -----------------------
+#
+# Every index kept by Library implements the same small protocol, so the
+# model only has to notify them on mutation:
+#
+#   add(book)                   a new row became visible
+#   extend(ids, titles, authors, years, statuses)
+#                               rows appended in bulk, as columns
+#   remove(book)                a row was hard deleted
+#   set_status(book, old)       book.status changed from `old`
+#   clear()                     the library was emptied
+
+
+def trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TrigramIndex:
+    """Posting lists of book ids per lowercased trigram of title and author.
+
+    Lookups return a superset of the matching ids; callers re-check the
+    substring on the returned candidates.  Hard deletes are not removed from
+    the posting lists right away, the dead ids are dropped in one pass once
+    enough of them piled up.
+    """
+
+    FIELDS = ("title", "author")
+
+    def __init__(self) -> None:
+        self.postings: Dict[str, Dict[str, array]] = {f: {} for f in self.FIELDS}
+        self.removed: Set[int] = set()
+        self.size = 0
+
+    def add(self, book) -> None:
+        self.removed.discard(book.id)
+        for field in self.FIELDS:
+            postings = self.postings[field]
+            for gram in trigrams(getattr(book, field).lower()):
+                ids = postings.get(gram)
+                if ids is None:
+                    ids = postings[gram] = array("I")
+                ids.append(book.id)
+        self.size += 1
+
+    def extend(self, ids: Sequence[int], titles: Sequence[str], authors: Sequence[str],
+               years: Sequence[str], statuses: Sequence[str]) -> None:
+        if self.removed:
+            self.removed.difference_update(ids)
+        for field, values in (("title", titles), ("author", authors)):
+            postings = self.postings[field]
+            # Generated rows repeat a small set of strings; split each once
+            grams_of: Dict[str, Set[str]] = {}
+            for bid, text in zip(ids, values):
+                grams = grams_of.get(text)
+                if grams is None:
+                    grams = grams_of[text] = trigrams(text.lower())
+                for gram in grams:
+                    posting = postings.get(gram)
+                    if posting is None:
+                        posting = postings[gram] = array("I")
+                    posting.append(bid)
+        self.size += len(ids)
+
+    def remove(self, book) -> None:
+        self.removed.add(book.id)
+        self.size -= 1
+        if len(self.removed) > max(1024, self.size):
+            self.vacuum()
+
+    def set_status(self, book, old_status: str) -> None:
+        pass
+
+    def clear(self) -> None:
+        for postings in self.postings.values():
+            postings.clear()
+        self.removed.clear()
+        self.size = 0
+
+    def vacuum(self) -> None:
+        dead = self.removed
+        for postings in self.postings.values():
+            for gram, ids in list(postings.items()):
+                kept = array("I", (i for i in ids if i not in dead))
+                if kept:
+                    postings[gram] = kept
+                else:
+                    del postings[gram]
+        dead.clear()
+
+    def candidates(self, field: str, needle: str, limit: Optional[int] = None) -> Optional[Set[int]]:
+        """Ids whose `field` may contain `needle` (already lowercased).
+
+        Returns None when the needle is too short to use the index, or when
+        even the rarest trigram has more than `limit` ids and a plain scan
+        is the cheaper plan.
+        """
+        if len(needle) < 3:
+            return None
+        postings = self.postings[field]
+        lists = []
+        for gram in trigrams(needle):
+            ids = postings.get(gram)
+            if ids is None:
+                return set()
+            lists.append(ids)
+        lists.sort(key=len)
+        if limit is not None and len(lists[0]) > limit:
+            return None
+        out = set(lists[0])
+        for ids in lists[1:]:
+            # Intersecting with a much longer list costs more than
+            # re-checking the few candidates left.
+            if not out or len(ids) > 8 * len(out):
+                break
+            out.intersection_update(ids)
+        return out
+
+
+def year_value(year: str) -> Optional[int]:
+    # Years are free text; only all-digit ones take part in range queries
+    return int(year) if year.isdigit() else None
+
+
+class YearIndex:
+    """Book ids bucketed by integer year, with the distinct years kept sorted.
+
+    A year range is two bisects over the distinct years plus a union of
+    the buckets in between, so its cost does not depend on library size.
+    """
+
+    def __init__(self) -> None:
+        self.buckets: Dict[int, Set[int]] = {}
+        self.years: List[int] = []
+
+    def add(self, book) -> None:
+        self._add(book.id, book.year)
+
+    def _add(self, book_id: int, year: str) -> None:
+        y = year_value(year)
+        if y is None:
+            return
+        bucket = self.buckets.get(y)
+        if bucket is None:
+            bucket = self.buckets[y] = set()
+            insort(self.years, y)
+        bucket.add(book_id)
+
+    def extend(self, ids: Sequence[int], titles: Sequence[str], authors: Sequence[str],
+               years: Sequence[str], statuses: Sequence[str]) -> None:
+        for bid, year in zip(ids, years):
+            self._add(bid, year)
+
+    def remove(self, book) -> None:
+        y = year_value(book.year)
+        bucket = self.buckets.get(y) if y is not None else None
+        if bucket is None:
+            return
+        bucket.discard(book.id)
+        if not bucket:
+            del self.buckets[y]
+            del self.years[bisect_left(self.years, y)]
+
+    def set_status(self, book, old_status: str) -> None:
+        pass
+
+    def clear(self) -> None:
+        self.buckets.clear()
+        self.years.clear()
+
+    def _span(self, lo: Optional[int], hi: Optional[int]) -> List[int]:
+        i = 0 if lo is None else bisect_left(self.years, lo)
+        j = len(self.years) if hi is None else bisect_right(self.years, hi)
+        return self.years[i:j]
+
+    def count(self, lo: Optional[int] = None, hi: Optional[int] = None) -> int:
+        return sum(len(self.buckets[y]) for y in self._span(lo, hi))
+
+    def candidates(self, lo: Optional[int] = None, hi: Optional[int] = None,
+                   limit: Optional[int] = None) -> Optional[Set[int]]:
+        """Ids with lo <= year <= hi (either end open), or None if more than `limit`."""
+        span = self._span(lo, hi)
+        if limit is not None and sum(len(self.buckets[y]) for y in span) > limit:
+            return None
+        out: Set[int] = set()
+        for y in span:
+            out |= self.buckets[y]
+        return out
+
+
+class StatusIndex:
+    """Set of book ids per status, so status filters become set algebra."""
+
+    def __init__(self) -> None:
+        self.by_status: Dict[str, Set[int]] = {}
+
+    def add(self, book) -> None:
+        self.by_status.setdefault(book.status.lower(), set()).add(book.id)
+
+    def extend(self, ids: Sequence[int], titles: Sequence[str], authors: Sequence[str],
+               years: Sequence[str], statuses: Sequence[str]) -> None:
+        by_status = self.by_status
+        for bid, status in zip(ids, statuses):
+            ids_of = by_status.get(status)
+            if ids_of is None:
+                ids_of = by_status.setdefault(status.lower(), set())
+            ids_of.add(bid)
+
+    def remove(self, book) -> None:
+        self.by_status.get(book.status.lower(), set()).discard(book.id)
+
+    def set_status(self, book, old_status: str) -> None:
+        self.by_status.get(old_status.lower(), set()).discard(book.id)
+        self.add(book)
+
+    def clear(self) -> None:
+        self.by_status.clear()
+
+    def ids(self, statuses) -> Set[int]:
+        """Ids whose status is one of `statuses` (already lowercased)."""
+        sets = [self.by_status[s] for s in statuses if s in self.by_status]
+        if len(sets) == 1:
+            return sets[0]
+        return set().union(*sets)
+
+
+def _decrement(counter: Counter, key: str) -> None:
+    n = counter[key] - 1
+    if n:
+        counter[key] = n
+    else:
+        del counter[key]
+
+
+class LibraryStats:
+    """Running book counts per status, year and author.
+
+    Every change costs O(1), so the numbers are there without a scan no
+    matter how big the library is.
+    """
+
+    def __init__(self) -> None:
+        self.total = 0
+        self.statuses: Counter = Counter()
+        self.years: Counter = Counter()
+        self.authors: Counter = Counter()
+
+    def add(self, book) -> None:
+        self.total += 1
+        self.statuses[book.status] += 1
+        self.years[book.year] += 1
+        self.authors[book.author] += 1
+
+    def extend(self, ids: Sequence[int], titles: Sequence[str], authors: Sequence[str],
+               years: Sequence[str], statuses: Sequence[str]) -> None:
+        self.total += len(ids)
+        self.statuses.update(statuses)
+        self.years.update(years)
+        self.authors.update(authors)
+
+    def remove(self, book) -> None:
+        self.total -= 1
+        _decrement(self.statuses, book.status)
+        _decrement(self.years, book.year)
+        _decrement(self.authors, book.author)
+
+    def set_status(self, book, old_status: str) -> None:
+        _decrement(self.statuses, old_status)
+        self.statuses[book.status] += 1
+
+    def count_store(self, store) -> None:
+        """Start over from a ColumnStore's code columns, without decoding its rows."""
+        self.total = len(store)
+        self.statuses, self.years, self.authors = store.value_counts()
+
+    def clear(self) -> None:
+        self.total = 0
+        self.statuses.clear()
+        self.years.clear()
+        self.authors.clear()
+
+    # ---- queries ----
+
+    def status_counts(self) -> Dict[str, int]:
+        return dict(self.statuses)
+
+    def year_histogram(self) -> List[Tuple[str, int]]:
+        # O(distinct years), numeric years first in order
+        return sorted(self.years.items(), key=lambda kv: (not kv[0].isdigit(), int(kv[0]) if kv[0].isdigit() else 0, kv[0]))
+
+    def top_authors(self, n: int = 10) -> List[Tuple[str, int]]:
+        return self.authors.most_common(n)
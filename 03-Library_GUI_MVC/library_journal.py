@@ -0,0 +1,235 @@
+import glob
+import json
+import os
+import threading
+from typing import List, Optional
+
+# -----------------------
+# Journaled persistence
+# -----------------------
+#
+# A journaled library lives in two kinds of files next to each other:
+#
+#   library.json              snapshot, same format as Library.to_json_obj()
+#   library.json.journal      one compact JSON record per change since then
+#   library.json.journal.N    sealed journal segments waiting to be compacted
+#
+# Records:
+#   ["a", id, title, author, year, status]   book added
+#   ["s", id, status]                        status changed
+#   ["d", id]                                book hard deleted
+#   ["c"]                                    library cleared
+#
+# Every record sets the final state of one id, so replaying a segment on top
+# of a snapshot that already contains it is harmless. That is what makes a
+# crash in the middle of a compaction safe.
+#
+# A crash in the middle of a write leaves a torn last line. Opening the
+# journal cuts it off again (repair_journal()) before anything is appended,
+# otherwise the next record would be glued onto it and lost with it.
+
+_SEP = (",", ":")
+
+
+def _segments(path: str) -> List[str]:
+    paths = glob.glob(glob.escape(path) + ".journal.*")
+    return sorted((p for p in paths if p.rsplit(".", 1)[1].isdigit()), key=lambda p: int(p.rsplit(".", 1)[1]))
+
+
+def _read_snapshot(path: str) -> dict:
+    if not os.path.exists(path):
+        return {"next_id": 1, "books": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def repair_journal(journal_path: str) -> None:
+    """Cut a journal back to the end of its last complete line."""
+    try:
+        f = open(journal_path, "r+b")
+    except FileNotFoundError:
+        return
+    with f:
+        size = end = f.seek(0, os.SEEK_END)
+        keep = 0
+        while end > 0:
+            start = max(0, end - 65536)
+            f.seek(start)
+            newline = f.read(end - start).rfind(b"\n")
+            if newline >= 0:
+                keep = start + newline + 1
+                break
+            end = start
+        if keep != size:
+            f.truncate(keep)
+
+
+def _replay_into_obj(obj: dict, journal_path: str) -> None:
+    # Apply a journal file to a snapshot object in to_json_obj() form
+    books = obj["books"]
+    with open(journal_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                rec = json.loads(line)
+            except json.JSONDecodeError:
+                # A torn line from a crash mid-write; the records after it still count
+                continue
+            op = rec[0]
+            if op == "a":
+                bid, title, author, year, status = rec[1:]
+                books[str(bid)] = {"id": bid, "title": title, "author": author, "year": year, "status": status}
+                obj["next_id"] = max(int(obj["next_id"]), bid + 1)
+            elif op == "s":
+                book = books.get(str(rec[1]))
+                if book is not None:
+                    book["status"] = rec[2]
+            elif op == "d":
+                books.pop(str(rec[1]), None)
+            elif op == "c":
+                books.clear()
+                obj["next_id"] = 1
+
+
+def _write_snapshot(obj: dict, path: str) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f, separators=_SEP)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def read_journaled(path: str) -> dict:
+    """Snapshot at `path` with every journal segment applied, in to_json_obj() form."""
+    obj = _read_snapshot(path)
+    for seg in _segments(path) + [path + ".journal"]:
+        if os.path.exists(seg):
+            _replay_into_obj(obj, seg)
+    return obj
+
+
+def fold(path: str, segments: List[str]) -> None:
+    """Fold sealed journal segments into the snapshot at `path`."""
+    obj = _read_snapshot(path)
+    for seg in segments:
+        _replay_into_obj(obj, seg)
+    _write_snapshot(obj, path)
+    for seg in segments:
+        os.remove(seg)
+
+
+class LibraryJournal:
+    """Keeps a snapshot + journal on disk in sync with a Library.
+
+    The journal registers itself as one of the library's indexes, so every
+    add_book, set_status, hard_delete and clear appends one record. Saving
+    is then just flush(); compact() folds the journal into the snapshot on a
+    background thread without touching the live library.
+    """
+
+    def __init__(self, path: str, auto_compact: int = 500_000) -> None:
+        self.path = path
+        self.journal_path = path + ".journal"
+        self.auto_compact = auto_compact
+        self.records = 0
+        self.library = None
+        repair_journal(self.journal_path)
+        self._file = open(self.journal_path, "a", encoding="utf-8")
+        self._compactor: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    # ---- opening ----
+
+    @classmethod
+    def create(cls, path: str, library) -> "LibraryJournal":
+        """Write `library` as a fresh snapshot at `path` and start journaling."""
+        for seg in _segments(path) + [path + ".journal"]:
+            if os.path.exists(seg):
+                os.remove(seg)
+        _write_snapshot(library.to_json_obj(), path)
+        journal = cls(path)
+        journal.attach(library)
+        return journal
+
+    @classmethod
+    def open(cls, path: str, library) -> "LibraryJournal":
+        """Load snapshot + journal into `library` and keep journaling."""
+        library.load_json_obj(read_journaled(path))
+        journal = cls(path)
+        journal.attach(library)
+        return journal
+
+    def attach(self, library) -> None:
+        self.library = library
+        library.indexes.append(self)
+
+    def close(self) -> None:
+        if self.library is not None:
+            self.library.indexes.remove(self)
+            self.library = None
+        self.wait()
+        self._file.close()
+
+    # ---- index protocol ----
+
+    def add(self, book) -> None:
+        self._append(["a", book.id, book.title, book.author, book.year, book.status])
+
+    def extend(self, ids, titles, authors, years, statuses) -> None:
+        dumps = json.JSONEncoder(separators=_SEP).encode
+        lines = [dumps(["a", *row]) + "\n" for row in zip(ids, titles, authors, years, statuses)]
+        with self._lock:
+            self._file.writelines(lines)
+            self.records += len(lines)
+        if self.auto_compact and self.records >= self.auto_compact:
+            self.compact()
+
+    def remove(self, book) -> None:
+        self._append(["d", book.id])
+
+    def set_status(self, book, old_status: str) -> None:
+        self._append(["s", book.id, book.status])
+
+    def clear(self) -> None:
+        self._append(["c"])
+
+    # ---- writing ----
+
+    def _append(self, rec: list) -> None:
+        with self._lock:
+            self._file.write(json.dumps(rec, separators=_SEP))
+            self._file.write("\n")
+            self.records += 1
+        if self.auto_compact and self.records >= self.auto_compact:
+            self.compact()
+
+    def flush(self) -> None:
+        """Make every change so far durable. Cost is O(changes since last flush)."""
+        with self._lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def compact(self, wait: bool = False) -> None:
+        """Seal the current journal and fold it into the snapshot in the background."""
+        if self._compactor is not None and self._compactor.is_alive():
+            if not wait:
+                return
+            self._compactor.join()
+        with self._lock:
+            self._file.close()
+            existing = _segments(self.path)
+            n = int(existing[-1].rsplit(".", 1)[1]) + 1 if existing else 1
+            sealed = f"{self.journal_path}.{n}"
+            os.replace(self.journal_path, sealed)
+            self._file = open(self.journal_path, "a", encoding="utf-8")
+            self.records = 0
+        self._compactor = threading.Thread(target=fold, args=(self.path, existing + [sealed]), daemon=True)
+        self._compactor.start()
+        if wait:
+            self._compactor.join()
+
+    def wait(self) -> None:
+        if self._compactor is not None:
+            self._compactor.join()
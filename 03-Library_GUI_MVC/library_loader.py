@@ -0,0 +1,131 @@
+import json
+import os
+from typing import IO, Iterator, Optional, Tuple
+
+# -----------------------
+# Streaming JSON reader
+# -----------------------
+#
+# Walks a library file one book record at a time instead of json.load()ing
+# the whole document.  Both layouts written over time are understood:
+#
+#   {"next_id": N, "books": {"1": {...}, "2": {...}}}    Library.to_json_obj()
+#   {"1": {...}, "2": {...}}                             old flat format
+#
+# Only the outer object(s) are scanned by hand; each record is decoded with
+# JSONDecoder.raw_decode, so memory stays at one chunk plus one record.
+
+_WS = " \t\r\n"
+
+
+class BookStream:
+    """Iterate (key, record) pairs of a library file.
+
+    After iteration `next_id` holds the stored next_id (None for the old
+    format) and `flat` tells which layout was read.  `bytes_read` and
+    `total_bytes` can drive a progress bar.
+    """
+
+    def __init__(self, f: IO[str], chunk_size: int = 1 << 16) -> None:
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.bytes_read = 0
+        self.total_bytes = _size_of(f)
+        self.next_id: Optional[int] = None
+        self.flat = True
+        self._decoder = json.JSONDecoder()
+
+    # ---- low level ----
+
+    def _fill(self) -> None:
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+        self.bytes_read += len(chunk)
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+
+    def _peek(self) -> str:
+        while True:
+            buf = self.buf
+            n = len(buf)
+            pos = self.pos
+            while pos < n and buf[pos] in _WS:
+                pos += 1
+            self.pos = pos
+            if pos < n:
+                return buf[pos]
+            if self.eof:
+                return ""
+            self._fill()
+
+    def _expect(self, ch: str) -> None:
+        got = self._peek()
+        if got != ch:
+            raise ValueError(f"Expected {ch!r} in library file, found {got or 'end of file'!r}")
+        self.pos += 1
+
+    def _value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+                self._fill()
+                continue
+            # A number cut at the chunk border still decodes, so only trust
+            # a value once something follows it.
+            if end < len(self.buf) or self.eof:
+                self.pos = end
+                return value
+            self._fill()
+
+    def _members(self) -> Iterator[Tuple[str, object]]:
+        # Body of an object whose "{" was already consumed
+        if self._peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self._value()
+            self._expect(":")
+            yield key, None
+            sep = self._peek()
+            self.pos += 1
+            if sep == "}":
+                return
+            if sep != ",":
+                raise ValueError(f"Expected ',' or '}}' in library file, found {sep or 'end of file'!r}")
+
+    # ---- public ----
+
+    def __iter__(self) -> Iterator[Tuple[str, dict]]:
+        self._expect("{")
+        for key, _ in self._members():
+            if key == "books" and self._peek() == "{":
+                self.flat = False
+                self.pos += 1
+                for book_key, _ in self._members():
+                    yield book_key, self._value()
+            else:
+                value = self._value()
+                if key == "next_id":
+                    self.next_id = int(value)
+                elif isinstance(value, dict):
+                    yield key, value
+
+    def progress(self) -> float:
+        if not self.total_bytes:
+            return 0.0
+        return min(1.0, (self.bytes_read - len(self.buf) + self.pos) / self.total_bytes)
+
+
+def _size_of(f: IO[str]) -> int:
+    try:
+        return os.fstat(f.fileno()).st_size
+    except (AttributeError, OSError, ValueError):
+        return 0
@@ -0,0 +1,841 @@
+import itertools
+import operator
+import random
+import threading
+from array import array
+from bisect import bisect_right
+from sys import intern
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import IO, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Iterable, Set
+
+try:
+    import numpy as np
+except ImportError:  # generation falls back to random.choices
+    np = None
+
+from column_store import BookRow, ColumnStore
+from library_export import CHUNK, Columns, book_columns
+from library_index import LibraryStats, StatusIndex, TrigramIndex, YearIndex
+from library_loader import BookStream
+from library_shards import ShardedSearch
+from library_snapshot import open_snapshot, write_snapshot
+from query_cache import ColumnFilter, QueryCache, SearchKey, key_matches, search_key, value_tests
+from rwlock import RWLock, read_locked, write_locked
+
+# -----------------------
+# Model
+# -----------------------
+
+STATUSES: Tuple[str, ...] = ("available", "lent out", "missing", "deleted")
+
+# Below this many books a full scan is quicker than handing it to the shard workers
+SHARD_MIN = 200_000
+
+
+@dataclass
+class Book:
+    id: int
+    title: str
+    author: str
+    year: str
+    status: str = "available"
+
+
+def book_to_dict(b) -> dict:
+    # Works for Book as well as the row views of the columnar store
+    return {"id": b.id, "title": b.title, "author": b.author, "year": b.year, "status": b.status}
+
+
+def book_from_json(bid: int, v: dict) -> Book:
+    # Interned, so books with the same title or author share one string
+    return Book(
+        id=bid,
+        title=intern(v.get("title", "")),
+        author=intern(v.get("author", "")),
+        year=intern(str(v.get("year", ""))),
+        status=intern(v.get("status", "available").lower()),
+    )
+
+
+def check_status(status: str) -> str:
+    status_l = status.strip().lower()
+    if status_l not in STATUSES:
+        raise ValueError(f"Invalid status: {status}")
+    return STATUSES[STATUSES.index(status_l)]
+
+
+def check_year(year: str) -> None:
+    if not year.isdigit() or len(year) not in (2, 4):
+        raise ValueError("Year must be numeric (2 or 4 digits)")
+
+
+def checked_columns(rows: Iterable[Tuple[str, str, str, str]]) -> Tuple[List[str], List[str], List[str], List[str]]:
+    """Validate (title, author, year, status) rows into the columns add_books_unchecked takes."""
+    titles: List[str] = []
+    authors: List[str] = []
+    years: List[str] = []
+    statuses: List[str] = []
+    for title, author, year, status in rows:
+        statuses.append(check_status(status))
+        check_year(year)
+        titles.append(title.strip())
+        authors.append(author.strip())
+        years.append(year.strip())
+    return titles, authors, years, statuses
+
+
+def checked_chunk(
+    ids: Sequence, titles: Sequence[str], authors: Sequence[str], years: Sequence, statuses: Sequence[str]
+) -> Tuple[array, Sequence[str], Sequence[str], List[str], List[str]]:
+    """Validate one imported chunk of columns (library_export.py) as a whole.
+
+    Ids must be ascending and unique. Each distinct status is checked once
+    and replaced by its canonical spelling; years are kept as text, like
+    JSON loads do. Raises ValueError on the first problem.
+    """
+    n = len(ids)
+    if not len(titles) == len(authors) == len(years) == len(statuses) == n:
+        raise ValueError("Imported columns differ in length")
+    try:
+        ids = array("q", map(int, ids))
+    except (TypeError, ValueError):
+        raise ValueError("Book ids must be whole numbers") from None
+    if not all(map(operator.lt, ids, itertools.islice(ids, 1, None))):
+        raise ValueError("Book ids must be unique and in ascending order")
+    for name, col in (("title", titles), ("author", authors), ("year", years), ("status", statuses)):
+        if None in col:
+            raise ValueError(f"Imported book without a {name}")
+    canonical = {s: check_status(s) for s in set(statuses)}
+    return ids, titles, authors, list(map(str, years)), list(map(canonical.__getitem__, statuses))
+
+
+def books_from_json_obj(data: dict) -> Tuple[List[Book], int]:
+    """Books in id order plus next_id from a loaded library file."""
+    # Supports both new format and old flat {id:book} format
+    rows: List[Tuple[int, dict]] = []
+    if "books" in data and "next_id" in data:
+        for k, v in data["books"].items():
+            rows.append((int(k), v))
+        next_id = int(data["next_id"])
+    else:
+        # Old format: dict[str/int] -> {title, author, year, status}
+        for k, v in data.items():
+            try:
+                bid = int(k)
+            except Exception:
+                continue
+            rows.append((bid, v))
+        next_id = max((bid for bid, _ in rows), default=0) + 1
+
+    # Id order lets array-backed storage only ever append
+    rows.sort(key=lambda r: r[0])
+    return [book_from_json(bid, v) for bid, v in rows], next_id
+
+
+class SearchCursor:
+    """Lazy search results in id order.
+
+    Rows are only looked at as books are taken from it. The cursor keeps
+    the last id it returned, so when the library changes under it, it picks
+    up again after that id (keyset pagination) instead of failing. Books
+    added after the cursor was opened may or may not show up.
+    """
+
+    def __init__(
+        self,
+        source: Callable[[Optional[int]], Iterator[Book]],
+        after_id: Optional[int] = None,
+        on_done: Optional[Callable[[Dict[int, Book]], None]] = None,
+    ) -> None:
+        self.source = source
+        self.last_id = after_id
+        self._rows = source(after_id)
+        # Everything handed out, for on_done once the cursor is used up
+        self._seen: Optional[Dict[int, Book]] = {} if on_done is not None and after_id is None else None
+        self._on_done = on_done
+
+    def __iter__(self) -> "SearchCursor":
+        return self
+
+    def __next__(self) -> Book:
+        try:
+            try:
+                book = next(self._rows)
+            except RuntimeError:
+                # The dict of books changed size mid-scan
+                self._rows = self.source(self.last_id)
+                book = next(self._rows)
+        except StopIteration:
+            if self._seen is not None and self._on_done is not None:
+                self._on_done(self._seen)
+                self._on_done = None
+            raise
+        self.last_id = book.id
+        if self._seen is not None:
+            self._seen[book.id] = book
+        return book
+
+    def fetch(self, n: int) -> List[Book]:
+        """The next `n` books (fewer at the end)."""
+        return list(itertools.islice(self, n))
+
+
+class Library:
+    def __init__(self, indexed: bool = False, columnar: bool = False) -> None:
+        # columnar=True keeps books in typed arrays (column_store.py) instead
+        # of one Book object per row; the API stays the same.
+        self.columnar = columnar
+        self.books: Dict[int, Book] = self._new_store()
+        self.next_id: int = 1
+        # Secondary indexes, notified on every mutation (see library_index.py)
+        self.stats = LibraryStats()
+        self.cache = QueryCache()
+        self.indexes: List = [self.stats, self.cache]
+        self.text_index: Optional[TrigramIndex] = None
+        self.year_index: Optional[YearIndex] = None
+        self.status_index: Optional[StatusIndex] = None
+        # Undo records while a savepoint is open (see savepoint())
+        self._undo: Optional[List[tuple]] = None
+        self._savepoints = 0
+        # Worker processes for full scans, see enable_shards()
+        self.shards: Optional[ShardedSearch] = None
+        self._shards_busy = threading.Lock()
+        # Searches share it, mutations take it alone (rwlock.py)
+        self.lock = RWLock()
+        # Search indexes built in the background after load_snapshot()
+        self.indexed = indexed
+        self.index_build: Optional[threading.Thread] = None
+        self._index_builds = 0
+        if indexed:
+            self.text_index = TrigramIndex()
+            self.year_index = YearIndex()
+            self.status_index = StatusIndex()
+            self.indexes += [self.text_index, self.year_index, self.status_index]
+
+    def _new_store(self) -> Dict[int, Book]:
+        return ColumnStore(STATUSES) if self.columnar else {}  # type: ignore[return-value]
+
+    @read_locked
+    def count(self) -> int:
+        return len(self.books)
+
+    @read_locked
+    def get(self, book_id: int) -> Optional[Book]:
+        return self.books.get(book_id)
+
+    @write_locked
+    def add_book(self, title: str, author: str, year: str, status: str) -> Book:
+        status_l = check_status(status)
+        check_year(year)
+        book = Book(id=self.next_id, title=intern(title.strip()), author=intern(author.strip()),
+                    year=intern(year.strip()), status=status_l)
+        self.books[book.id] = book
+        self.next_id += 1
+        for ix in self.indexes:
+            ix.add(book)
+        return book
+
+    def add_books_bulk(self, rows: Iterable[Tuple[str, str, str, str]]) -> range:
+        """Add (title, author, year, status) rows; all are checked before any is added."""
+        return self.add_books_unchecked(*checked_columns(rows))
+
+    @write_locked
+    def add_books_unchecked(
+        self, titles: Sequence[str], authors: Sequence[str], years: Sequence[str], statuses: Sequence[str]
+    ) -> range:
+        """Append trusted rows (e.g. from BookGenerator) without validation.
+
+        The four columns must have the same length; values are stored as
+        given. Returns the range of new ids.
+        """
+        ids = range(self.next_id, self.next_id + len(titles))
+        books = self.books
+        if isinstance(books, ColumnStore):
+            books.extend(ids, titles, authors, years, statuses)
+        else:
+            columns = (map(intern, col) for col in (titles, authors, years, statuses))
+            books.update(zip(ids, map(Book, ids, *columns)))
+        self.next_id = ids.stop
+        for ix in self.indexes:
+            ix.extend(ids, titles, authors, years, statuses)
+        return ids
+
+    @write_locked
+    def set_status(self, book_id: int, status: str) -> None:
+        status_l = check_status(status)
+        book = self.books.get(book_id)
+        if not book:
+            raise KeyError(f"Book id {book_id} not found")
+        old = book.status
+        book.status = status_l
+        if self._undo is not None:
+            self._undo.append(("s", book_id, old))
+        for ix in self.indexes:
+            ix.set_status(book, old)
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        # Groups a burst of mutations; everything in the block is rolled
+        # back if it raises. SQLite (library_sqlite.py) commits once at the end.
+        # The write lock is held for the whole block, so readers see all of it or none.
+        with self.lock.write():
+            sp = self.savepoint()
+            try:
+                yield
+            except BaseException:
+                self.rollback(sp)
+                raise
+            self.release(sp)
+
+    @write_locked
+    def savepoint(self) -> Tuple[int, int]:
+        """Mark the current state so rollback() can return to it.
+
+        Covers add_book(s), set_status, hard_delete and clear. Added books
+        are found by id (everything from the saved next_id on), so only the
+        other changes are recorded and a rollback costs O(changes since).
+        """
+        if self._undo is None:
+            self._undo = []
+        self._savepoints += 1
+        return self.next_id, len(self._undo)
+
+    @write_locked
+    def release(self, sp: Tuple[int, int]) -> None:
+        # Keep the changes since `sp`
+        self._savepoints -= 1
+        if self._savepoints == 0:
+            self._undo = None
+
+    @write_locked
+    def rollback(self, sp: Tuple[int, int]) -> None:
+        """Undo every change since `sp` and release it."""
+        first_new, mark = sp
+        undo = self._undo or []
+        stop = self.next_id
+        reindex = any(rec[0] == "c" for rec in undo[mark:])
+        notify = [] if reindex else self.indexes
+        reinserted = False
+        while len(undo) > mark:
+            rec = undo.pop()
+            if rec[0] == "s":
+                book = self.books.get(rec[1])
+                if book is not None and rec[1] < first_new:
+                    new = book.status
+                    book.status = rec[2]
+                    for ix in notify:
+                        ix.set_status(book, new)
+            elif rec[0] == "d":
+                book = rec[1]
+                if book.id < first_new:
+                    self.books[book.id] = book
+                    reinserted = True
+                    for ix in notify:
+                        ix.add(self.books[book.id])
+            else:
+                self.books, cleared_next_id = rec[1], rec[2]
+                stop = max(stop, cleared_next_id)
+
+        # Everything added since has an id in [first_new, stop)
+        books = self.books
+        if notify:
+            for bid in reversed(range(first_new, stop)):
+                book = books.get(bid)
+                if book is not None:
+                    for ix in notify:
+                        ix.remove(book)
+        if isinstance(books, ColumnStore):
+            books.truncate(first_new)
+        else:
+            pop = books.pop
+            for bid in reversed(range(first_new, stop)):
+                pop(bid, None)
+        if reinserted and not isinstance(books, ColumnStore):
+            # Deleted books came back at the end of the dict
+            self.books = dict(sorted(books.items()))
+        self.next_id = first_new
+        if reindex:
+            self.rebuild_indexes()
+        self.release(sp)
+
+    def mark_deleted(self, book_id: int) -> None:
+        self.set_status(book_id, "deleted")
+
+    @write_locked
+    def hard_delete(self, book_id: int) -> None:
+        book = self.books.get(book_id)
+        if book is None:
+            raise KeyError(f"Book id {book_id} not found")
+        if self._undo is not None:
+            # Copy it: a columnar row view is unreadable once deleted
+            self._undo.append(("d", Book(book.id, book.title, book.author, book.year, book.status)))
+        # Indexes still get to read the row
+        for ix in self.indexes:
+            ix.remove(book)
+        del self.books[book_id]
+
+    @read_locked
+    def search(
+        self,
+        title: Optional[str] = None,
+        author: Optional[str] = None,
+        year: Optional[str] = None,
+        include_statuses: Optional[Set[str]] = None,
+        exclude_statuses: Optional[Set[str]] = None,
+        year_from: Optional[int] = None,
+        year_to: Optional[int] = None,
+    ) -> Dict[int, Book]:
+        """Books matching every given filter, in id order.
+
+        title/author/year are case-insensitive substrings; year_from/year_to
+        is an inclusive range over numeric years (either end may be open).
+        Results come from the query cache when nothing relevant changed, so
+        the returned dict is shared and must not be modified.
+        """
+        key = search_key(title, author, year, include_statuses, exclude_statuses, year_from, year_to)
+        result = self.cache.lookup(key, self.books.get)
+        if result is None:
+            version = self.cache.version
+            result = {b.id: b for b in self._matches(key, None, parallel=True)}
+            self.cache.store(key, result, version)
+        return result
+
+    @write_locked
+    def enable_shards(self, workers: Optional[int] = None) -> None:
+        """Run full-scan searches of large libraries on `workers` processes (library_shards.py)."""
+        if self.shards is None:
+            self.shards = ShardedSearch(workers)
+
+    @write_locked
+    def disable_shards(self) -> None:
+        if self.shards is not None:
+            self.shards.close()
+            self.shards = None
+
+    def _sharded_ids(self, key: SearchKey) -> List[int]:
+        shards = self.shards
+        # Searches run side by side, the worker pool takes one at a time
+        with self._shards_busy:
+            changed = self.cache.changed_since(shards.version)
+            if changed is None:
+                shards.refresh(self.books, self.next_id, self.cache.version)
+                changed = set()
+            ids = shards.search(key)
+        if not changed:
+            return ids.tolist()
+        # The snapshot is older than these ids; check them against the live books
+        get = self.books.get
+        now = {bid for bid in changed if (b := get(bid)) is not None and key_matches(key, b)}
+        kept = [bid for bid in ids if bid not in changed]
+        kept.extend(now)
+        kept.sort()
+        return kept
+
+    def search_cursor(
+        self,
+        title: Optional[str] = None,
+        author: Optional[str] = None,
+        year: Optional[str] = None,
+        include_statuses: Optional[Set[str]] = None,
+        exclude_statuses: Optional[Set[str]] = None,
+        year_from: Optional[int] = None,
+        year_to: Optional[int] = None,
+        after_id: Optional[int] = None,
+    ) -> "SearchCursor":
+        """Same filters as search(), as a lazy cursor over ids > after_id.
+
+        Reads from the query cache when it has the result; a cursor run to
+        the end from the start fills the cache.
+        """
+        key = search_key(title, author, year, include_statuses, exclude_statuses, year_from, year_to)
+        with self.lock.read():
+            cached = self.cache.lookup(key, self.books.get)
+            version = self.cache.version
+        if cached is not None:
+            def from_cache(after: Optional[int]) -> Iterator[Book]:
+                rows = iter(cached.values())
+                return rows if after is None else itertools.dropwhile(lambda b: b.id <= after, rows)
+            return SearchCursor(from_cache, after_id)
+        return SearchCursor(self._paged(lambda after: self._matches(key, after)), after_id,
+                            lambda result: self._store_result(key, result, version))
+
+    @read_locked
+    def _store_result(self, key: SearchKey, result: Dict[int, Book], version: int) -> None:
+        self.cache.store(key, result, version)
+
+    def _paged(self, source: Callable[[Optional[int]], Iterator[Book]],
+               page: int = 512) -> Callable[[Optional[int]], Iterator[Book]]:
+        # A cursor source that takes `page` rows at a time under the read
+        # lock, so a cursor left half read never holds it. When the library
+        # changed between pages the scan starts again after the last id.
+        def rows(after: Optional[int]) -> Iterator[Book]:
+            it: Optional[Iterator[Book]] = None
+            seen = -1
+            while True:
+                with self.lock.read():
+                    if self.cache.version != seen:
+                        it = source(after)
+                        seen = self.cache.version
+                    books = list(itertools.islice(it, page))  # type: ignore[arg-type]
+                if not books:
+                    return
+                yield from books
+                after = books[-1].id
+        return rows
+
+    def _rows_after(self, after_id: Optional[int]) -> Iterable[Tuple[int, Book]]:
+        books = self.books
+        if after_id is None:
+            return books.items()
+        if isinstance(books, ColumnStore):
+            return books.items_after(after_id)
+        # A dict cannot seek, but its ids are in order: skip the ones seen
+        return itertools.dropwhile(lambda kv: kv[0] <= after_id, books.items())
+
+    def _matches(self, key: SearchKey, after_id: Optional[int], parallel: bool = False) -> Iterator[Book]:
+        # Books matching a search_key() in id order; query_cache.key_matches()
+        # is the same test for a single book. parallel=True lets a full scan
+        # go to the shard workers (enable_shards()).
+        t, a, y, inc, exc, year_from, year_to = key
+        ranged = year_from is not None or year_to is not None
+
+        # Status filters as id sets; they replace the per-row status checks
+        allowed: Optional[Set[int]] = None
+        banned: Set[int] = set()
+        by_index = self.status_index is not None
+        if self.status_index is not None:
+            if inc is not None:
+                allowed = self.status_index.ids(inc)
+            if exc:
+                banned = self.status_index.ids(exc)
+            if not (t or a or y or ranged):
+                # Nothing left to check on the rows themselves
+                if allowed is not None:
+                    ids = sorted(allowed - banned)
+                    start = 0 if after_id is None else bisect_right(ids, after_id)
+                    books = self.books
+                    yield from (books[bid] for bid in ids[start:] if bid in books)
+                else:
+                    yield from (b for bid, b in self._rows_after(after_id) if bid not in banned)
+                return
+
+        # Narrow down to the ids the indexes say can match
+        candidates: Optional[Set[int]] = None
+        limit = len(self.books) // 8
+        if allowed is not None and len(allowed) <= limit:
+            candidates = allowed
+        if self.text_index is not None:
+            for field, needle in (("title", t), ("author", a)):
+                if not needle:
+                    continue
+                ids = self.text_index.candidates(field, needle, limit)
+                if ids is not None:
+                    candidates = ids if candidates is None else candidates & ids
+        if ranged and self.year_index is not None:
+            ids = self.year_index.candidates(year_from, year_to, limit)
+            if ids is not None:
+                candidates = ids if candidates is None else candidates & ids
+
+        if candidates is None and parallel and self.shards is not None and len(self.books) >= SHARD_MIN:
+            books = self.books
+            yield from (books[bid] for bid in self._sharded_ids(key))
+            return
+        if candidates is None and isinstance(self.books, ColumnStore):
+            yield from self._scan_columns(key, after_id)
+            return
+        if candidates is None:
+            rows = self._rows_after(after_id)
+        else:
+            ids = sorted(candidates)
+            start = 0 if after_id is None else bisect_right(ids, after_id)
+            rows = ((bid, self.books[bid]) for bid in ids[start:] if bid in self.books)
+
+        # Each test runs once per distinct string, see query_cache.Memo
+        title_ok, author_ok, year_ok, status_ok = value_tests(key)
+        for bid, b in rows:
+            if title_ok is not None and not title_ok[b.title]:
+                continue
+            if author_ok is not None and not author_ok[b.author]:
+                continue
+            if year_ok is not None and not year_ok[b.year]:
+                continue
+            if by_index:
+                if allowed is not None and bid not in allowed:
+                    continue
+                if bid in banned:
+                    continue
+            elif status_ok is not None and not status_ok[b.status]:
+                continue
+            yield b
+
+    def _scan_columns(self, key: SearchKey, after_id: Optional[int], chunk: int = 4096) -> Iterator[Book]:
+        # Full scan of a ColumnStore on its code columns, a chunk of rows at a
+        # time; each chunk starts again from the last id, as rows move when the
+        # store is compacted.
+        store: ColumnStore = self.books  # type: ignore[assignment]
+        test = ColumnFilter(store, key)
+        last = after_id
+        while True:
+            lo = 0 if last is None else bisect_right(store.ids, last)
+            if lo >= len(store.ids):
+                return
+            hi = min(lo + chunk, len(store.ids))
+            ids = store.ids
+            for row in test.rows(lo, hi):
+                yield BookRow(store, ids[row], row)
+            last = ids[hi - 1]
+
+    @read_locked
+    def to_json_obj(self) -> dict:
+        # Store as a mapping of id->book plus next_id
+        return {
+            "next_id": self.next_id,
+            "books": {str(bid): book_to_dict(b) for bid, b in self.books.items()},
+        }
+
+    @write_locked
+    def load_json_obj(self, data: dict) -> None:
+        rows, next_id = books_from_json_obj(data)
+        self.books.clear()
+        for book in rows:
+            self.books[book.id] = book
+        self.next_id = next_id
+        self.rebuild_indexes()
+
+    def iter_load_json(self, f: IO[str], every: int = 20_000) -> Iterator[float]:
+        """Stream a library file into this library, one record at a time.
+
+        Yields the fraction of the file read every `every` books. The current
+        books are only replaced once the whole file was read, so closing the
+        generator early cancels the load and leaves the library untouched.
+        """
+        stream = BookStream(f)
+        staged = self._new_store()
+        max_id = 0
+        in_order = True
+        for n, (k, v) in enumerate(stream, 1):
+            if stream.flat:
+                try:
+                    bid = int(k)
+                except Exception:
+                    continue
+            else:
+                bid = int(k)
+            if bid < max_id:
+                in_order = False
+            max_id = max(max_id, bid)
+            staged[bid] = book_from_json(bid, v)
+            if n % every == 0:
+                yield stream.progress()
+        if not in_order and isinstance(staged, dict):
+            staged = dict(sorted(staged.items()))
+        with self.lock.write():
+            self.books = staged
+            self.next_id = stream.next_id if not stream.flat and stream.next_id is not None else max_id + 1
+            self.rebuild_indexes()
+        yield 1.0
+
+    def load_json_stream(
+        self,
+        f: IO[str],
+        progress: Optional[Callable[[float], None]] = None,
+        cancel: Optional[Callable[[], bool]] = None,
+    ) -> bool:
+        # Blocking variant of iter_load_json; returns False if cancelled
+        steps = self.iter_load_json(f)
+        for frac in steps:
+            if cancel is not None and cancel():
+                steps.close()
+                return False
+            if progress is not None:
+                progress(frac)
+        return True
+
+    def iter_load_columns(self, reader) -> Iterator[float]:
+        """Load column chunks from a library_export reader in place of the current books.
+
+        Yields reader.progress() after every chunk. Like iter_load_json the
+        books are only replaced at the end, so closing early cancels.
+        """
+        staged = self._new_store()
+        last = 0
+        for chunk in reader:
+            ids, titles, authors, years, statuses = checked_chunk(*chunk)
+            if not ids:
+                continue
+            if ids[0] <= last:
+                raise ValueError("Book ids must be unique and in ascending order")
+            if isinstance(staged, ColumnStore):
+                staged.extend(ids, titles, authors, years, statuses)
+            else:
+                columns = (map(intern, col) for col in (titles, authors, years))
+                staged.update(zip(ids, map(Book, ids, *columns, statuses)))
+            last = ids[-1]
+            yield reader.progress()
+        with self.lock.write():
+            self.books = staged
+            self.next_id = max(reader.next_id or 0, last + 1)
+            self.rebuild_indexes()
+        yield 1.0
+
+    def iter_columns(self, chunk: int = CHUNK) -> Iterator[Columns]:
+        """The books as (ids, titles, authors, years, statuses) chunks, in id order.
+
+        Holds the read lock until the last chunk is taken (or the iterator
+        is closed), so the chunks are one consistent copy of the library.
+        """
+        with self.lock.read():
+            yield from book_columns(self.books, chunk)
+
+    @read_locked
+    def save_snapshot(self, path: str) -> None:
+        write_snapshot(self.books.items(), self.next_id, path)
+
+    @write_locked
+    def load_snapshot(self, path: str) -> None:
+        """Open a binary snapshot (library_snapshot.py) in place of the current books.
+
+        The file is memory-mapped and rows are decoded on access, so opening
+        is immediate; the library switches to columnar storage. Stats are
+        counted from the code columns; the search indexes are built on a
+        background thread and until then searches scan the mapped columns.
+        """
+        self.books, self.next_id = open_snapshot(path)  # type: ignore[assignment]
+        self.columnar = True
+        self.stats.count_store(self.books)  # type: ignore[arg-type]
+        self.cache.clear()
+        if self.indexed:
+            self.text_index = self.year_index = self.status_index = None
+            self.indexes = [self.stats, self.cache]
+            self._index_builds += 1
+            self.index_build = threading.Thread(target=self._build_indexes, args=(self._index_builds,), daemon=True)
+            self.index_build.start()
+
+    def _build_indexes(self, build: int, chunk: int = CHUNK) -> None:
+        # Fills fresh search indexes a chunk at a time under the read lock, so
+        # searches and changes go on meanwhile, and puts them in under the
+        # write lock. Starts over when the books changed in between; gives up
+        # once a later load_snapshot() started a build of its own.
+        while True:
+            fresh = [TrigramIndex(), YearIndex(), StatusIndex()]
+            with self.lock.read():
+                books, version = self.books, self.cache.version
+            chunks = book_columns(books, chunk)
+            while True:
+                with self.lock.read():
+                    if build != self._index_builds:
+                        return
+                    if self.books is not books or self.cache.version != version:
+                        break
+                    columns = next(chunks, None)
+                if columns is not None:
+                    for ix in fresh:
+                        ix.extend(*columns)
+                    continue
+                with self.lock.write():
+                    if build != self._index_builds:
+                        return
+                    if self.books is books and self.cache.version == version:
+                        self.text_index, self.year_index, self.status_index = fresh
+                        self.indexes += fresh
+                        return
+                break
+
+    @write_locked
+    def rebuild_indexes(self) -> None:
+        for ix in self.indexes:
+            ix.clear()
+        # Fed in column chunks, so each index takes its bulk extend() path
+        for columns in book_columns(self.books):
+            for ix in self.indexes:
+                ix.extend(*columns)
+
+    @write_locked
+    def clear(self) -> None:
+        if self._undo is not None:
+            # Keep the old store around for rollback() instead of emptying it
+            self._undo.append(("c", self.books, self.next_id))
+            self.books = self._new_store()
+        else:
+            self.books.clear()
+        self.next_id = 1
+        for ix in self.indexes:
+            ix.clear()
+
+
+# -----------------------
+# Utilities
+# -----------------------
+
+ADJ = ["Dusk", "Dawn", "Ancient", "Lost", "Sacred", "Salvation"]
+NOUN = ["Empress", "Roy", "Paris", "Frankfurt", "Munich", "Deggendorf", "Berlin", "Garry", "Berry"]
+THEMES = ["Sun", "Moon", "Destiny", "Mars", "Neptune", "Winter", "Summer", "Time", "Abyss", "Hole", "End", "Start", "Middle", "Ground", "Sea", "Ocean"]
+
+FIRST_NAMES = ["Rey", "Key", "Garry", "Frow", "Grpw", "Arrow", "Aron", "Baron", "Ron", "Roney"]
+LAST_NAMES = ["Jerrey", "Kein", "Garry", "Frow", "Grpw", "Arrow", "Aron", "Baron", "Ron", "Roney"]
+
+
+def rand_title(rng) -> str:
+    return f"{rng.choice(ADJ)} in {rng.choice(NOUN)} of the {rng.choice(THEMES)}"
+
+
+def rand_author(rng) -> str:
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+
+def rand_year(rng) -> str:
+    return str(rng.randint(1900, 2025))
+
+
+def rand_status(rng) -> str:
+    return rng.choice(list(STATUSES))
+
+
+# Every title/author the rand_* helpers can produce; drawing uniformly from
+# these is the same distribution as drawing each part on its own.
+ALL_TITLES = [f"{a} in {n} of the {t}" for a, n, t in itertools.product(ADJ, NOUN, THEMES)]
+ALL_AUTHORS = [f"{f} {l}" for f, l in itertools.product(FIRST_NAMES, LAST_NAMES)]
+ALL_YEARS = [str(y) for y in range(1900, 2026)]
+
+
+class BookGenerator:
+    """Draws random books a whole batch at a time.
+
+    Each column is one vectorized draw of indices (NumPy when installed,
+    random.choices(k=) otherwise) into the lists above. The same seed gives
+    the same books on the same backend.
+    """
+
+    def __init__(self, seed: Optional[int] = None) -> None:
+        self.rows = 0
+        self.seconds = 0.0
+        if np is not None:
+            self.np_rng = np.random.default_rng(seed)
+            self.columns = [np.array(c, dtype=object) for c in (ALL_TITLES, ALL_AUTHORS, ALL_YEARS, STATUSES)]
+        else:
+            self.rng = random.Random(seed)
+
+    def draw(self, k: int) -> Tuple[List[str], List[str], List[str], List[str]]:
+        if np is not None:
+            titles, authors, years, statuses = (col[self.np_rng.integers(0, len(col), k)].tolist() for col in self.columns)
+        else:
+            rng = self.rng
+            titles = rng.choices(ALL_TITLES, k=k)
+            authors = rng.choices(ALL_AUTHORS, k=k)
+            years = rng.choices(ALL_YEARS, k=k)
+            statuses = rng.choices(STATUSES, k=k)
+        return titles, authors, years, statuses
+
+    def generate(self, library: Library, k: int) -> range:
+        """Add `k` random books to `library` through its bulk fast path."""
+        t0 = time.perf_counter()
+        ids = library.add_books_unchecked(*self.draw(k))
+        self.seconds += time.perf_counter() - t0
+        self.rows += k
+        return ids
+
+    def rate(self) -> float:
+        # Rows per second over everything generated so far
+        return self.rows / self.seconds if self.seconds else 0.0
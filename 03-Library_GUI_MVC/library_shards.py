@@ -0,0 +1,95 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import weakref
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from column_store import ColumnStore
+from library_snapshot import open_snapshot, write_snapshot
+from query_cache import ColumnFilter, SearchKey
+
+# -----------------------
+# Sharded search
+# -----------------------
+#
+# A substring scan is CPU bound and a Python process only uses one core, so
+# for very large libraries ShardedSearch runs the scan in a pool of worker
+# processes. The books are written once to a binary snapshot
+# (library_snapshot.py) that every worker maps read-only; the OS shares the
+# pages, so no process holds its own copy. Each worker scans one contiguous
+# row range (= id range) with a ColumnFilter, testing each distinct title,
+# author and status once, and sends back the matching ids. As the ranges
+# are in id order the results are merged by concatenating them.
+#
+# The snapshot is not rewritten on every change. Library.search() asks the
+# query cache which ids changed since the snapshot was taken and re-checks
+# just those in this process; only when the cache's change log no longer
+# reaches back that far is a new snapshot written.
+
+# Worker side: the snapshot each worker process has open, by path
+_opened: Dict[str, ColumnStore] = {}
+
+
+def _scan(path: str, key: SearchKey, lo: int, hi: int) -> bytes:
+    # Runs in a worker: ids of the rows lo..hi of the snapshot matching `key`
+    store = _opened.get(path)
+    if store is None:
+        _opened.clear()
+        store = _opened[path] = open_snapshot(path)[0]
+    return ColumnFilter(store, key).ids(lo, hi).tobytes()
+
+
+def _shutdown(pool: ProcessPoolExecutor, folder: str) -> None:
+    pool.shutdown(wait=False, cancel_futures=True)
+    shutil.rmtree(folder, ignore_errors=True)
+
+
+class ShardedSearch:
+    """A process pool scanning a mapped snapshot of the books in id-range shards."""
+
+    def __init__(self, workers: Optional[int] = None) -> None:
+        self.workers = workers or os.cpu_count() or 1
+        # Spawned, not forked: workers start small instead of inheriting the
+        # whole library (and the Tk app's threads)
+        self.pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        self.folder = tempfile.mkdtemp(prefix="library-shards-")
+        self.path: Optional[str] = None
+        self.rows = 0
+        # QueryCache.version the snapshot was taken at
+        self.version = -1
+        self._snapshots = 0
+        self._finalizer = weakref.finalize(self, _shutdown, self.pool, self.folder)
+
+    def refresh(self, books, next_id: int, version: int) -> None:
+        """Write a new snapshot of `books`; workers switch to it on their next scan."""
+        self._snapshots += 1
+        path = os.path.join(self.folder, f"books-{self._snapshots}.libsnap")
+        write_snapshot(books.items(), next_id, path)
+        if self.path is not None:
+            try:
+                os.remove(self.path)
+            except OSError:
+                # Still mapped on Windows; close() removes the folder
+                pass
+        self.path = path
+        self.rows = len(books)
+        self.version = version
+
+    def shards(self) -> List[Tuple[int, int]]:
+        # One contiguous row range per worker
+        step = -(-self.rows // self.workers) if self.rows else 1
+        return [(lo, min(lo + step, self.rows)) for lo in range(0, self.rows, step)]
+
+    def search(self, key: SearchKey) -> array:
+        """Ids in the snapshot matching `key`, in id order."""
+        futures = [self.pool.submit(_scan, self.path, key, lo, hi) for lo, hi in self.shards()]
+        ids = array("q")
+        for future in futures:
+            ids.frombytes(future.result())
+        return ids
+
+    def close(self) -> None:
+        self._finalizer()
@@ -0,0 +1,179 @@
+import mmap
+import os
+import struct
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from column_store import NO_YEAR, ColumnStore, StringPool
+
+# -----------------------
+# Binary snapshot format
+# -----------------------
+#
+# One file, little endian, every section padded to 8 bytes:
+#
+#   header       MAGIC, version, rows, next_id and the size of each table
+#   ids          int64[rows]      sorted book ids
+#   title_codes  uint32[rows]     index into the title table
+#   author_codes uint32[rows]     index into the author table
+#   years        uint16[rows]     year, NO_YEAR -> see the odd year table
+#   status       uint8[rows]      index into the status table
+#   tables       titles, authors, statuses, odd years: each one
+#                uint64[count + 1] offsets followed by a UTF-8 heap
+#   odd_ids      int64[odd]       ids whose year is in the odd year table
+#
+# Opening maps the file and wraps the sections in memoryviews; nothing is
+# decoded until a row is read, so open time does not depend on the size.
+
+MAGIC = b"LIBSNAP1"
+VERSION = 1
+_HEADER = struct.Struct("<8sIIqqQQQQ")
+
+
+def _pad(n: int) -> int:
+    return (n + 7) & ~7
+
+
+class _Writer:
+    def __init__(self, f) -> None:
+        self.f = f
+
+    def section(self, data: bytes) -> None:
+        self.f.write(data)
+        self.f.write(b"\0" * (_pad(len(data)) - len(data)))
+
+    def table(self, strings: Sequence[str]) -> None:
+        encoded = [s.encode("utf-8") for s in strings]
+        offsets = array("Q", [0])
+        for b in encoded:
+            offsets.append(offsets[-1] + len(b))
+        self.section(offsets.tobytes())
+        self.section(b"".join(encoded))
+
+
+def write_snapshot(books: Iterable[Tuple[int, Any]], next_id: int, path: str) -> None:
+    """Write (id, book) pairs to `path` in the binary snapshot format."""
+    rows = sorted(books, key=lambda item: item[0])
+    titles, authors = StringPool(), StringPool()
+    statuses = StringPool()
+    ids = array("q")
+    title_codes, author_codes = array("I"), array("I")
+    years = array("H")
+    status = bytearray()
+    odd_ids = array("q")
+    odd_years: List[str] = []
+    for bid, b in rows:
+        ids.append(bid)
+        title_codes.append(titles.encode(b.title))
+        author_codes.append(authors.encode(b.author))
+        y = b.year
+        if y.isdigit() and int(y) < NO_YEAR and str(int(y)) == y:
+            years.append(int(y))
+        else:
+            years.append(NO_YEAR)
+            odd_ids.append(bid)
+            odd_years.append(y)
+        status.append(statuses.encode(b.status))
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, 0, len(ids), next_id,
+                             len(titles), len(authors), len(statuses), len(odd_ids)))
+        w = _Writer(f)
+        for col in (ids, title_codes, author_codes, years):
+            w.section(col.tobytes())
+        w.section(bytes(status))
+        for table in (titles.values, authors.values, statuses.values, odd_years):
+            w.table(table)
+        w.section(odd_ids.tobytes())
+    os.replace(tmp, path)
+
+
+class MappedStrings:
+    """A string table in the mapped file, decoded one entry at a time."""
+
+    def __init__(self, buf: memoryview, offsets: memoryview, heap_start: int) -> None:
+        self.buf = buf
+        self.offsets = offsets
+        self.heap_start = heap_start
+        self.count = len(offsets) - 1
+        self.cache: Dict[int, str] = {}
+        self.extra: List[str] = []
+
+    def __len__(self) -> int:
+        return self.count + len(self.extra)
+
+    def __getitem__(self, code: int) -> str:
+        if code >= self.count:
+            return self.extra[code - self.count]
+        s = self.cache.get(code)
+        if s is None:
+            lo = self.heap_start + self.offsets[code]
+            hi = self.heap_start + self.offsets[code + 1]
+            s = self.cache[code] = bytes(self.buf[lo:hi]).decode("utf-8")
+        return s
+
+    def __iter__(self) -> Iterable[str]:
+        for code in range(len(self)):
+            yield self[code]
+
+    def append(self, s: str) -> None:
+        self.extra.append(s)
+
+
+class MappedStringPool(StringPool):
+    """StringPool over a mapped table; the reverse lookup is built on first encode."""
+
+    def __init__(self, values: MappedStrings) -> None:
+        self.values = values  # type: ignore[assignment]
+        self._codes: Optional[Dict[str, int]] = None
+
+    @property  # type: ignore[override]
+    def codes(self) -> Dict[str, int]:
+        if self._codes is None:
+            self._codes = {}
+            for code, s in enumerate(self.values):
+                self._codes.setdefault(s, code)
+        return self._codes
+
+
+def _read_table(buf: memoryview, pos: int, count: int) -> Tuple[MappedStrings, int]:
+    # Returns the table and the position of the next section
+    end = pos + 8 * (count + 1)
+    offsets = buf[pos:end].cast("Q")
+    heap_len = offsets[count]
+    return MappedStrings(buf, offsets, end), end + _pad(heap_len)
+
+
+def open_snapshot(path: str) -> Tuple[ColumnStore, int]:
+    """Map a snapshot file; returns (store, next_id).
+
+    The store is a regular ColumnStore whose columns are views of the file
+    (mapped copy-on-write, so edits never reach the file) until the first
+    insert copies them into arrays.
+    """
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    buf = memoryview(mm)
+    magic, version, _, n, next_id, n_titles, n_authors, n_statuses, n_odd = _HEADER.unpack_from(buf, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} is not a library snapshot")
+
+    pos = _pad(_HEADER.size)
+    cols = []
+    for code, width in (("q", 8), ("I", 4), ("I", 4), ("H", 2), ("B", 1)):
+        cols.append(buf[pos:pos + width * n].cast(code))
+        pos += _pad(width * n)
+    titles, pos = _read_table(buf, pos, n_titles)
+    authors, pos = _read_table(buf, pos, n_authors)
+    statuses, pos = _read_table(buf, pos, n_statuses)
+    odd_years, pos = _read_table(buf, pos, n_odd)
+    odd_ids = buf[pos:pos + 8 * n_odd].cast("q")
+
+    store = ColumnStore(list(statuses))
+    store.ids, store.title_codes, store.author_codes, store.years, store.status = cols  # type: ignore[assignment]
+    store.titles = MappedStringPool(titles)
+    store.authors = MappedStringPool(authors)
+    store.odd_years = {odd_ids[i]: odd_years[i] for i in range(n_odd)}
+    store.live = n
+    return store, next_id
@@ -0,0 +1,428 @@
+import itertools
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import IO, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from library_export import CHUNK, Columns
+from library_loader import BookStream
+from library_model import Book, SearchCursor, book_from_json, books_from_json_obj, check_status, check_year, checked_chunk, checked_columns
+from library_snapshot import open_snapshot, write_snapshot
+
+# -----------------------
+# SQLite storage backend
+# -----------------------
+#
+# Same method surface as library_model.Library, for libraries that outgrow
+# RAM. Books live in one table with indexes on status and year; title and
+# author substrings are answered by an FTS5 trigram index kept in step by
+# the methods below (no triggers, so clear() and bulk loads stay cheap).
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS books (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    author TEXT NOT NULL,
+    year TEXT NOT NULL,
+    status TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS books_status ON books(status);
+CREATE INDEX IF NOT EXISTS books_year ON books(year);
+CREATE INDEX IF NOT EXISTS books_year_num ON books(CAST(year AS INTEGER)) WHERE year NOT GLOB '*[^0-9]*' AND year <> '';
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+INSERT OR IGNORE INTO meta VALUES ('next_id', 1);
+CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+    title, author, content='books', content_rowid='id', tokenize='trigram'
+);
+"""
+
+_INSERT = "INSERT INTO books (id, title, author, year, status) VALUES (?, ?, ?, ?, ?)"
+_INSERT_FTS = "INSERT INTO books_fts (rowid, title, author) VALUES (?, ?, ?)"
+_DELETE_FTS = "INSERT INTO books_fts (books_fts, rowid, title, author) VALUES ('delete', ?, ?, ?)"
+
+# Names for in-memory databases, which have to be shared between connections
+_memory_dbs = itertools.count()
+
+# Rows per query when paging through a search_cursor()
+_PAGE = 500
+
+
+class SQLiteStats:
+    """LibraryStats queries answered by GROUP BY (status and year use their indexes)."""
+
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self.conn = conn
+
+    @property
+    def total(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM books").fetchone()[0]
+
+    def status_counts(self) -> Dict[str, int]:
+        return dict(self.conn.execute("SELECT status, COUNT(*) FROM books GROUP BY status"))
+
+    def year_histogram(self) -> List[Tuple[str, int]]:
+        rows = self.conn.execute("SELECT year, COUNT(*) FROM books GROUP BY year").fetchall()
+        return sorted(rows, key=lambda kv: (not kv[0].isdigit(), int(kv[0]) if kv[0].isdigit() else 0, kv[0]))
+
+    def top_authors(self, n: int = 10) -> List[Tuple[str, int]]:
+        sql = "SELECT author, COUNT(*) AS c FROM books GROUP BY author ORDER BY c DESC, MIN(id) LIMIT ?"
+        return self.conn.execute(sql, (n,)).fetchall()
+
+
+def _fts_phrase(column: str, needle: str) -> str:
+    return f'{column} : "{needle.replace(chr(34), chr(34) * 2)}"'
+
+
+class SQLiteLibrary:
+    def __init__(self, path: str = ":memory:") -> None:
+        self.path = path
+        # Search workers (search_worker.py) page through their own connection,
+        # so an in-memory database is opened under a name they can share
+        self._uri = f"file:library-{next(_memory_dbs)}?mode=memory&cache=shared" if path == ":memory:" else None
+        self._owner = threading.get_ident()
+        self._readers = threading.local()
+        self.conn = self._connect()
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+        self._depth = 0
+        self.stats = SQLiteStats(self.conn)
+
+    # ---- bookkeeping ----
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self._uri, uri=True) if self._uri else sqlite3.connect(self.path)
+        # Python's lower() so matching agrees with Library.search on non-ASCII text
+        conn.create_function("py_lower", 1, lambda s: s.lower(), deterministic=True)
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        # Connection for reads on the calling thread. One connection cannot be
+        # shared: py_lower() calls back into Python while SQLite holds its
+        # mutex, and another thread waiting on that mutex with the GIL deadlocks.
+        if threading.get_ident() == self._owner:
+            return self.conn
+        conn = getattr(self._readers, "conn", None)
+        if conn is None:
+            conn = self._readers.conn = self._connect()
+            if self._uri:
+                # See the main connection's open transaction instead of waiting on its table locks
+                conn.execute("PRAGMA read_uncommitted = 1")
+        return conn
+
+    @property
+    def next_id(self) -> int:
+        return self.conn.execute("SELECT value FROM meta WHERE key = 'next_id'").fetchone()[0]
+
+    @next_id.setter
+    def next_id(self, value: int) -> None:
+        self.conn.execute("UPDATE meta SET value = ? WHERE key = 'next_id'", (value,))
+
+    def _commit(self) -> None:
+        if self._depth == 0:
+            self.conn.commit()
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """Commit everything inside the block at once (rolled back on error)."""
+        sp = self.savepoint()
+        try:
+            yield
+        except BaseException:
+            self.rollback(sp)
+            raise
+        self.release(sp)
+
+    def savepoint(self) -> str:
+        # Same contract as Library.savepoint(), on top of SQL savepoints;
+        # nothing is committed while one is open.
+        self._depth += 1
+        name = f"sp{self._depth}"
+        self.conn.execute(f"SAVEPOINT {name}")
+        return name
+
+    def release(self, sp: str) -> None:
+        self.conn.execute(f"RELEASE {sp}")
+        self._depth -= 1
+        self._commit()
+
+    def rollback(self, sp: str) -> None:
+        self.conn.execute(f"ROLLBACK TO {sp}")
+        self.release(sp)
+
+    def close(self) -> None:
+        self.conn.commit()
+        self.conn.close()
+
+    # ---- Library interface ----
+
+    def count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM books").fetchone()[0]
+
+    def get(self, book_id: int) -> Optional[Book]:
+        row = self.conn.execute("SELECT id, title, author, year, status FROM books WHERE id = ?", (book_id,)).fetchone()
+        return None if row is None else Book(*row)
+
+    def add_book(self, title: str, author: str, year: str, status: str) -> Book:
+        status_l = check_status(status)
+        check_year(year)
+        book = Book(id=self.next_id, title=title.strip(), author=author.strip(), year=year.strip(), status=status_l)
+        self._insert([book])
+        self.next_id = book.id + 1
+        self._commit()
+        return book
+
+    def add_books_bulk(self, rows: Iterable[Tuple[str, str, str, str]]) -> range:
+        return self.add_books_unchecked(*checked_columns(rows))
+
+    def add_books_unchecked(
+        self, titles: Sequence[str], authors: Sequence[str], years: Sequence[str], statuses: Sequence[str]
+    ) -> range:
+        ids = range(self.next_id, self.next_id + len(titles))
+        self._insert(map(Book, ids, titles, authors, years, statuses))
+        self.next_id = ids.stop
+        self._commit()
+        return ids
+
+    def set_status(self, book_id: int, status: str) -> None:
+        status_l = check_status(status)
+        cur = self.conn.execute("UPDATE books SET status = ? WHERE id = ?", (status_l, book_id))
+        if cur.rowcount == 0:
+            raise KeyError(f"Book id {book_id} not found")
+        self._commit()
+
+    def mark_deleted(self, book_id: int) -> None:
+        self.set_status(book_id, "deleted")
+
+    def hard_delete(self, book_id: int) -> None:
+        row = self.conn.execute("SELECT title, author FROM books WHERE id = ?", (book_id,)).fetchone()
+        if row is None:
+            raise KeyError(f"Book id {book_id} not found")
+        self.conn.execute("DELETE FROM books WHERE id = ?", (book_id,))
+        self.conn.execute(_DELETE_FTS, (book_id, row[0], row[1]))
+        self._commit()
+
+    def search(
+        self,
+        title: Optional[str] = None,
+        author: Optional[str] = None,
+        year: Optional[str] = None,
+        include_statuses: Optional[Set[str]] = None,
+        exclude_statuses: Optional[Set[str]] = None,
+        year_from: Optional[int] = None,
+        year_to: Optional[int] = None,
+    ) -> Dict[int, Book]:
+        where, params = self._where(title, author, year, include_statuses, exclude_statuses, year_from, year_to)
+        sql = "SELECT id, title, author, year, status FROM books"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY id"
+        return {row[0]: Book(*row) for row in self.conn.execute(sql, params)}
+
+    def search_cursor(
+        self,
+        title: Optional[str] = None,
+        author: Optional[str] = None,
+        year: Optional[str] = None,
+        include_statuses: Optional[Set[str]] = None,
+        exclude_statuses: Optional[Set[str]] = None,
+        year_from: Optional[int] = None,
+        year_to: Optional[int] = None,
+        after_id: Optional[int] = None,
+    ) -> SearchCursor:
+        where, params = self._where(title, author, year, include_statuses, exclude_statuses, year_from, year_to)
+        sql = "SELECT id, title, author, year, status FROM books WHERE id > ?"
+        if where:
+            sql += " AND " + " AND ".join(where)
+        sql += " ORDER BY id LIMIT ?"
+
+        def pages(after: Optional[int]) -> Iterator[Book]:
+            # One short query per page, so no statement stays open between fetches
+            last = -1 if after is None else after
+            while True:
+                rows = self._reader().execute(sql, [last, *params, _PAGE]).fetchall()
+                for row in rows:
+                    yield Book(*row)
+                if len(rows) < _PAGE:
+                    return
+                last = rows[-1][0]
+
+        return SearchCursor(pages, after_id)
+
+    def _where(
+        self,
+        title: Optional[str],
+        author: Optional[str],
+        year: Optional[str],
+        include_statuses: Optional[Set[str]],
+        exclude_statuses: Optional[Set[str]],
+        year_from: Optional[int],
+        year_to: Optional[int],
+    ) -> Tuple[List[str], List[object]]:
+        t = (title or "").strip().lower()
+        a = (author or "").strip().lower()
+        y = (year or "").strip().lower()
+
+        where: List[str] = []
+        params: List[object] = []
+        phrases = []
+        for column, needle in (("title", t), ("author", a)):
+            if not needle:
+                continue
+            # Trigrams narrow it down, instr() keeps the exact substring semantics
+            if len(needle) >= 3:
+                phrases.append(_fts_phrase(column, needle))
+            where.append(f"instr(py_lower({column}), ?) > 0")
+            params.append(needle)
+        if phrases:
+            where.insert(0, "id IN (SELECT rowid FROM books_fts WHERE books_fts MATCH ?)")
+            params.insert(0, " AND ".join(phrases))
+        if y:
+            where.append("instr(year, ?) > 0")
+            params.append(y)
+        if year_from is not None or year_to is not None:
+            # Same expression and WHERE as the books_year_num partial index
+            where.append("year NOT GLOB '*[^0-9]*' AND year <> ''")
+            if year_from is not None:
+                where.append("CAST(year AS INTEGER) >= ?")
+                params.append(year_from)
+            if year_to is not None:
+                where.append("CAST(year AS INTEGER) <= ?")
+                params.append(year_to)
+        if include_statuses:
+            inc = sorted({s.lower() for s in include_statuses})
+            where.append(f"status IN ({', '.join('?' * len(inc))})")
+            params.extend(inc)
+        if exclude_statuses:
+            exc = sorted({s.lower() for s in exclude_statuses})
+            where.append(f"status NOT IN ({', '.join('?' * len(exc))})")
+            params.extend(exc)
+        return where, params
+
+    def items(self) -> Iterator[Tuple[int, Book]]:
+        for row in self.conn.execute("SELECT id, title, author, year, status FROM books ORDER BY id"):
+            yield row[0], Book(*row)
+
+    def iter_columns(self, chunk: int = CHUNK) -> Iterator[Columns]:
+        """Like Library.iter_columns; one fetchmany() per chunk."""
+        cur = self.conn.execute("SELECT id, title, author, year, status FROM books ORDER BY id")
+        while True:
+            rows = cur.fetchmany(chunk)
+            if not rows:
+                return
+            yield tuple(map(list, zip(*rows)))  # type: ignore[misc]
+
+    def to_json_obj(self) -> dict:
+        return {
+            "next_id": self.next_id,
+            "books": {
+                str(bid): {"id": b.id, "title": b.title, "author": b.author, "year": b.year, "status": b.status}
+                for bid, b in self.items()
+            },
+        }
+
+    def load_json_obj(self, data: dict) -> None:
+        books, next_id = books_from_json_obj(data)
+        with self.transaction():
+            self._clear()
+            self._insert(books)
+            self.next_id = next_id
+
+    def iter_load_json(self, f: IO[str], every: int = 20_000) -> Iterator[float]:
+        """Like Library.iter_load_json; closing it early rolls the load back."""
+        stream = BookStream(f)
+        batch: List[Book] = []
+        max_id = 0
+        done = False
+        self._depth += 1
+        try:
+            self._clear()
+            for k, v in stream:
+                try:
+                    bid = int(k)
+                except ValueError:
+                    if stream.flat:
+                        continue
+                    raise
+                max_id = max(max_id, bid)
+                batch.append(book_from_json(bid, v))
+                if len(batch) >= every:
+                    self._insert(batch)
+                    batch.clear()
+                    yield stream.progress()
+            self._insert(batch)
+            self.next_id = stream.next_id if not stream.flat and stream.next_id is not None else max_id + 1
+            done = True
+        finally:
+            self._depth -= 1
+            if done:
+                self._commit()
+            elif self._depth == 0:
+                self.conn.rollback()
+        yield 1.0
+
+    def load_json_stream(
+        self,
+        f: IO[str],
+        progress: Optional[Callable[[float], None]] = None,
+        cancel: Optional[Callable[[], bool]] = None,
+    ) -> bool:
+        steps = self.iter_load_json(f)
+        for frac in steps:
+            if cancel is not None and cancel():
+                steps.close()
+                return False
+            if progress is not None:
+                progress(frac)
+        return True
+
+    def iter_load_columns(self, reader) -> Iterator[float]:
+        """Like Library.iter_load_columns; closing it early rolls the load back."""
+        last = 0
+        done = False
+        self._depth += 1
+        try:
+            self._clear()
+            for chunk in reader:
+                ids, titles, authors, years, statuses = checked_chunk(*chunk)
+                if not ids:
+                    continue
+                if ids[0] <= last:
+                    raise ValueError("Book ids must be unique and in ascending order")
+                self._insert(map(Book, ids, titles, authors, years, statuses))
+                last = ids[-1]
+                yield reader.progress()
+            self.next_id = max(reader.next_id or 0, last + 1)
+            done = True
+        finally:
+            self._depth -= 1
+            if done:
+                self._commit()
+            elif self._depth == 0:
+                self.conn.rollback()
+        yield 1.0
+
+    def save_snapshot(self, path: str) -> None:
+        write_snapshot(self.items(), self.next_id, path)
+
+    def load_snapshot(self, path: str) -> None:
+        store, next_id = open_snapshot(path)
+        with self.transaction():
+            self._clear()
+            self._insert(store.values())
+            self.next_id = next_id
+
+    def clear(self) -> None:
+        self._clear()
+        self.next_id = 1
+        self._commit()
+
+    # ---- bulk helpers ----
+
+    def _clear(self) -> None:
+        self.conn.execute("DELETE FROM books")
+        self.conn.execute("INSERT INTO books_fts (books_fts) VALUES ('delete-all')")
+
+    def _insert(self, books: Iterable) -> None:
+        rows = [(b.id, b.title, b.author, b.year, b.status) for b in books]
+        self.conn.executemany(_INSERT, rows)
+        self.conn.executemany(_INSERT_FTS, [(r[0], r[1], r[2]) for r in rows])
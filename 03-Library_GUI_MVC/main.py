@@ -1,166 +1,18 @@
 import json
+import os
 import sys
 import time
-from dataclasses import dataclass, asdict
-from typing import Dict, List, Optional, Tuple, Iterable, Set
+from typing import Callable, Dict, Iterator, Optional
 
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog, simpledialog
 
-# -----------------------
-# Model
-# -----------------------
-
-STATUSES: Tuple[str, ...] = ("available", "lent out", "missing", "deleted")
-
-
-@dataclass
-class Book:
-    id: int
-    title: str
-    author: str
-    year: str
-    status: str = "available"
-
-
-class Library:
-    def __init__(self) -> None:
-        self.books: Dict[int, Book] = {}
-        self.next_id: int = 1
-
-    def count(self) -> int:
-        return len(self.books)
-
-    def add_book(self, title: str, author: str, year: str, status: str) -> Book:
-        status_l = status.strip().lower()
-        if status_l not in STATUSES:
-            raise ValueError(f"Invalid status: {status}")
-        if not year.isdigit() or len(year) not in (2, 4):
-            raise ValueError("Year must be numeric (2 or 4 digits)")
-        book = Book(id=self.next_id, title=title.strip(), author=author.strip(), year=year.strip(), status=status_l)
-        self.books[book.id] = book
-        self.next_id += 1
-        return book
-
-    def set_status(self, book_id: int, status: str) -> None:
-        status_l = status.strip().lower()
-        if status_l not in STATUSES:
-            raise ValueError(f"Invalid status: {status}")
-        book = self.books.get(book_id)
-        if not book:
-            raise KeyError(f"Book id {book_id} not found")
-        book.status = status_l
-
-    def mark_deleted(self, book_id: int) -> None:
-        self.set_status(book_id, "deleted")
-
-    def hard_delete(self, book_id: int) -> None:
-        if book_id in self.books:
-            del self.books[book_id]
-        else:
-            raise KeyError(f"Book id {book_id} not found")
-
-    def search(
-        self,
-        title: Optional[str] = None,
-        author: Optional[str] = None,
-        year: Optional[str] = None,
-        include_statuses: Optional[Set[str]] = None,
-        exclude_statuses: Optional[Set[str]] = None,
-    ) -> Dict[int, Book]:
-        t = (title or "").strip().lower()
-        a = (author or "").strip().lower()
-        y = (year or "").strip().lower()
-        inc = {s.lower() for s in include_statuses} if include_statuses else None
-        exc = {s.lower() for s in exclude_statuses} if exclude_statuses else set()
-
-        out: Dict[int, Book] = {}
-        for bid, b in self.books.items():
-            if t and t not in b.title.lower():
-                continue
-            if a and a not in b.author.lower():
-                continue
-            if y and y not in b.year.lower():
-                continue
-            if inc is not None and b.status.lower() not in inc:
-                continue
-            if b.status.lower() in exc:
-                continue
-            out[bid] = b
-        return out
-
-    def to_json_obj(self) -> dict:
-        # Store as a mapping of id->book plus next_id
-        return {
-            "next_id": self.next_id,
-            "books": {str(bid): asdict(b) for bid, b in self.books.items()},
-        }
-
-    def load_json_obj(self, data: dict) -> None:
-        # Supports both new format and old flat {id:book} format
-        if "books" in data and "next_id" in data:
-            self.books = {}
-            for k, v in data["books"].items():
-                bid = int(k)
-                self.books[bid] = Book(
-                    id=bid,
-                    title=v.get("title", ""),
-                    author=v.get("author", ""),
-                    year=str(v.get("year", "")),
-                    status=v.get("status", "available").lower(),
-                )
-            self.next_id = int(data["next_id"])
-        else:
-            # Old format: dict[str/int] -> {title, author, year, status}
-            self.books = {}
-            max_id = 0
-            for k, v in data.items():
-                try:
-                    bid = int(k)
-                except Exception:
-                    continue
-                self.books[bid] = Book(
-                    id=bid,
-                    title=v.get("title", ""),
-                    author=v.get("author", ""),
-                    year=str(v.get("year", "")),
-                    status=v.get("status", "available").lower(),
-                )
-                max_id = max(max_id, bid)
-            self.next_id = max_id + 1
-
-    def clear(self) -> None:
-        self.books.clear()
-        self.next_id = 1
-
-
-# -----------------------
-# Utilities
-# -----------------------
-
-ADJ = ["Dusk", "Dawn", "Ancient", "Lost", "Sacred", "Salvation"]
-NOUN = ["Empress", "Roy", "Paris", "Frankfurt", "Munich", "Deggendorf", "Berlin", "Garry", "Berry"]
-THEMES = ["Sun", "Moon", "Destiny", "Mars", "Neptune", "Winter", "Summer", "Time", "Abyss", "Hole", "End", "Start", "Middle", "Ground", "Sea", "Ocean"]
-
-FIRST_NAMES = ["Rey", "Key", "Garry", "Frow", "Grpw", "Arrow", "Aron", "Baron", "Ron", "Roney"]
-LAST_NAMES = ["Jerrey", "Kein", "Garry", "Frow", "Grpw", "Arrow", "Aron", "Baron", "Ron", "Roney"]
-
-
-def rand_title(rng) -> str:
-    return f"{rng.choice(ADJ)} in {rng.choice(NOUN)} of the {rng.choice(THEMES)}"
-
-
-def rand_author(rng) -> str:
-    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
-
-
-def rand_year(rng) -> str:
-    return str(rng.randint(1900, 2025))
-
-
-def rand_status(rng) -> str:
-    return rng.choice(list(STATUSES))
-
+from library_export import FILE_TYPES, columnar_ext, export_library, open_columns
+from library_journal import LibraryJournal, read_journaled
+from library_model import STATUSES, BookGenerator, Library
+from library_sqlite import SQLiteLibrary
+from search_worker import SearchWorker
+from virtual_tree import VirtualTree
 
 # -----------------------
 # View/Controller (Tk App)
@@ -172,7 +24,9 @@ class LibraryApp:
         self.root.title("Library Management System v2.0")
         self.root.geometry("520x420")
 
-        self.library = Library()
+        self.library = Library(indexed=True)
+        # Set while the library is saved as snapshot + journal
+        self.journal: Optional[LibraryJournal] = None
 
         # UI: Header
         ttk.Label(self.root, text="Main Menu", font=("Georgia", 16)).place(relx=0.5, rely=0.12, anchor=tk.CENTER)
@@ -194,11 +48,22 @@ class LibraryApp:
         file_menu = tk.Menu(menubar, tearoff=0)
         file_menu.add_command(label="New", command=self.new_library)
         file_menu.add_command(label="Open...", command=self.open_library)
+        file_menu.add_command(label="Save", command=self.save_journaled)
         file_menu.add_command(label="Save As...", command=self.save_library)
         file_menu.add_separator()
-        file_menu.add_command(label="Exit", command=self.root.quit)
+        file_menu.add_command(label="Import...", command=self.import_books)
+        file_menu.add_command(label="Export...", command=self.export_books)
+        file_menu.add_separator()
+        file_menu.add_command(label="Open Database...", command=self.open_database)
+        file_menu.add_command(label="Close Database", command=self.close_database)
+        file_menu.add_separator()
+        file_menu.add_command(label="Exit", command=self.exit_app)
         menubar.add_cascade(label="File", menu=file_menu)
 
+        view_menu = tk.Menu(menubar, tearoff=0)
+        view_menu.add_command(label="Statistics", command=self.stats_dialog)
+        menubar.add_cascade(label="View", menu=view_menu)
+
         help_menu = tk.Menu(menubar, tearoff=0)
         help_menu.add_command(label="About", command=self.about_dialog)
         menubar.add_cascade(label="Help", menu=help_menu)
@@ -211,35 +76,180 @@ class LibraryApp:
     def refresh_count(self) -> None:
         self.count_var.set(f"Current Book Count: {self.library.count()}")
 
+    def close_journal(self) -> None:
+        if self.journal is not None:
+            self.journal.flush()
+            self.journal.close()
+            self.journal = None
+
+    def use_library(self, library) -> None:
+        # Swap storage backends; every dialog goes through self.library
+        self.close_journal()
+        if isinstance(self.library, SQLiteLibrary):
+            self.library.close()
+        self.library = library
+        self.refresh_count()
+
+    def open_database(self) -> None:
+        path = filedialog.asksaveasfilename(
+            title="Open or create database",
+            defaultextension=".db",
+            filetypes=[("SQLite databases", "*.db")],
+            confirmoverwrite=False,
+        )
+        if not path:
+            return
+        try:
+            self.use_library(SQLiteLibrary(path))
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to open database: {e}")
+
+    def close_database(self) -> None:
+        if isinstance(self.library, SQLiteLibrary):
+            self.use_library(Library(indexed=True))
+
     def new_library(self) -> None:
         if messagebox.askyesno("Confirm", "Clear the current library?"):
+            self.close_journal()
             self.library.clear()
             self.refresh_count()
 
     def open_library(self) -> None:
-        path = filedialog.askopenfilename(filetypes=[("JSON files", "*.json")])
+        path = filedialog.askopenfilename(filetypes=[("JSON files", "*.json"), ("Library snapshots", "*.libsnap")])
         if not path:
             return
         try:
-            with open(path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            self.library.load_json_obj(data)
-            messagebox.showinfo("Loaded", "Library loaded successfully.")
-            self.refresh_count()
+            self.close_journal()
+            if path.endswith(".libsnap"):
+                self.library.load_snapshot(path)
+                messagebox.showinfo("Loaded", "Library loaded successfully.")
+                self.refresh_count()
+            elif os.path.exists(path + ".journal"):
+                # Journaled library: snapshot + replayed changes
+                if isinstance(self.library, SQLiteLibrary):
+                    self.library.load_json_obj(read_journaled(path))
+                else:
+                    self.journal = LibraryJournal.open(path, self.library)
+                messagebox.showinfo("Loaded", "Library loaded successfully.")
+                self.refresh_count()
+            else:
+                self.stream_load(path)
         except Exception as e:
             messagebox.showerror("Error", f"Failed to load library: {e}")
 
+    def stream_load(self, path: str) -> None:
+        f = open(path, "r", encoding="utf-8")
+        self.run_load(path, self.library.iter_load_json(f), f.close)
+
+    def import_books(self) -> None:
+        path = filedialog.askopenfilename(filetypes=FILE_TYPES)
+        if not path:
+            return
+        try:
+            self.close_journal()
+            reader = open_columns(path)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to import library: {e}")
+            return
+        self.run_load(path, self.library.iter_load_columns(reader), reader.close)
+
+    def export_books(self) -> None:
+        path = filedialog.asksaveasfilename(defaultextension=columnar_ext(), filetypes=FILE_TYPES)
+        if not path:
+            return
+        try:
+            rows = export_library(self.library, path)
+            messagebox.showinfo("Exported", f"{rows:,} books exported.")
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to export library: {e}")
+
+    def run_load(self, path: str, steps: Iterator[float], close: Callable[[], None]) -> None:
+        # Drive a load generator from after() callbacks behind a progress dialog
+        top = tk.Toplevel(self.root)
+        top.title("Loading")
+        top.geometry("380x170")
+
+        info_var = tk.StringVar(value=f"Loading {os.path.basename(path)}...")
+        ttk.Label(top, textvariable=info_var).pack(pady=(16, 4))
+        pb = ttk.Progressbar(top, orient=tk.HORIZONTAL, length=300, mode="determinate", maximum=100)
+        pb.pack(pady=12)
+
+        job = None
+
+        def finish():
+            steps.close()
+            close()
+            top.destroy()
+
+        def cancel():
+            if job is not None:
+                top.after_cancel(job)
+            finish()
+
+        def step():
+            nonlocal job
+            # Parse for a short slice of time, then give Tk the loop back
+            frac = 0.0
+            deadline = time.perf_counter() + 0.05
+            try:
+                while time.perf_counter() < deadline:
+                    frac = next(steps)
+            except StopIteration:
+                finish()
+                self.refresh_count()
+                messagebox.showinfo("Loaded", "Library loaded successfully.")
+                return
+            except Exception as e:
+                finish()
+                messagebox.showerror("Error", f"Failed to load library: {e}")
+                return
+            pb["value"] = frac * 100
+            info_var.set(f"Loading {os.path.basename(path)}... {frac:.0%}")
+            job = top.after(1, step)
+
+        ttk.Button(top, text="Cancel", command=cancel).pack()
+        top.protocol("WM_DELETE_WINDOW", cancel)
+        step()
+
     def save_library(self) -> None:
-        path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("JSON files", "*.json")])
+        path = filedialog.asksaveasfilename(
+            defaultextension=".json", filetypes=[("JSON files", "*.json"), ("Library snapshots", "*.libsnap")]
+        )
         if not path:
             return
         try:
-            with open(path, "w", encoding="utf-8") as f:
-                json.dump(self.library.to_json_obj(), f, indent=2)
+            if path.endswith(".libsnap"):
+                self.library.save_snapshot(path)
+            else:
+                with open(path, "w", encoding="utf-8") as f:
+                    json.dump(self.library.to_json_obj(), f, indent=2)
             messagebox.showinfo("Saved", "Library saved successfully.")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to save library: {e}")
 
+    def save_journaled(self) -> None:
+        # First save writes a snapshot; after that only the journal is flushed
+        try:
+            if isinstance(self.library, SQLiteLibrary):
+                # Every change is already committed to the database
+                pass
+            elif self.journal is None:
+                path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("JSON files", "*.json")])
+                if not path:
+                    return
+                self.journal = LibraryJournal.create(path, self.library)
+            else:
+                self.journal.flush()
+            messagebox.showinfo("Saved", "Library saved successfully.")
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to save library: {e}")
+
+    def exit_app(self) -> None:
+        self.close_journal()
+        if isinstance(self.library, SQLiteLibrary):
+            self.library.close()
+        self.root.quit()
+
     # -------------
     # Dialogs
     # -------------
@@ -253,6 +263,44 @@ class LibraryApp:
         ttk.Label(top, text="THD", font=("Georgia", 10)).pack(pady=4)
         ttk.Button(top, text="Close", command=top.destroy).pack(pady=8)
 
+    def stats_dialog(self) -> None:
+        # Counts come from the library's running stats, no scan needed
+        stats = self.library.stats
+        top = tk.Toplevel(self.root)
+        top.title("Statistics")
+        top.geometry("420x520")
+
+        ttk.Label(top, text=f"Books: {stats.total:,}", font=("Georgia", 13)).pack(pady=(12, 6))
+        by_status = stats.status_counts()
+        lines = [f"{s}: {by_status.get(s, 0):,}" for s in STATUSES]
+        lines += [f"{s}: {n:,}" for s, n in by_status.items() if s not in STATUSES]
+        ttk.Label(top, text="\n".join(lines), justify="center").pack(pady=4)
+
+        ttk.Label(top, text="Top authors", font=("Georgia", 11)).pack(pady=(10, 2))
+        authors = ttk.Treeview(top, columns=("author", "books"), show="headings", height=5)
+        authors.heading("author", text="Author")
+        authors.heading("books", text="Books")
+        authors.column("books", width=80, anchor=tk.E)
+        for author, n in stats.top_authors(10):
+            authors.insert("", tk.END, values=(author, f"{n:,}"))
+        authors.pack(fill=tk.X, padx=12)
+
+        ttk.Label(top, text="Books per year", font=("Georgia", 11)).pack(pady=(10, 2))
+        years = ttk.Treeview(top, columns=("year", "books"), show="headings", height=7)
+        years.heading("year", text="Year")
+        years.heading("books", text="Books")
+        years.column("books", width=80, anchor=tk.E)
+        for year, n in stats.year_histogram():
+            years.insert("", tk.END, values=(year, f"{n:,}"))
+        years.pack(fill=tk.BOTH, expand=True, padx=12)
+
+        # The SQLite backend has no query cache
+        cache = getattr(self.library, "cache", None)
+        if cache is not None:
+            ttk.Label(top, text=f"Search cache: {cache.hits:,} hits, {cache.misses:,} misses").pack(pady=(6, 0))
+
+        ttk.Button(top, text="Close", command=top.destroy).pack(pady=8)
+
     def add_book_dialog(self) -> None:
         top = tk.Toplevel(self.root)
         top.title("Add New Book")
@@ -329,9 +377,15 @@ class LibraryApp:
         ttk.Button(toolbar, text="Search / Filter", command=lambda: self.search_dialog(win)).pack(side=tk.LEFT, padx=4)
         ttk.Button(toolbar, text="Refresh", command=lambda: self.populate_tree(win)).pack(side=tk.LEFT, padx=4)
 
-        # Treeview
+        # Only the rows in view are Tk items, see virtual_tree.py
         columns = ("id", "title", "author", "year", "status")
-        tree = ttk.Treeview(win, columns=columns, show="headings", height=18)
+
+        def row_values(bid: int):
+            b = self.library.get(bid)
+            return None if b is None else (b.id, b.title, b.author, b.year, b.status)
+
+        vt = VirtualTree(win, columns, row_values)
+        tree = vt.tree
         tree.heading("id", text="ID")
         tree.heading("title", text="Title")
         tree.heading("author", text="Author")
@@ -344,28 +398,20 @@ class LibraryApp:
         tree.column("year", width=80, anchor=tk.CENTER)
         tree.column("status", width=120, anchor=tk.CENTER)
 
-        vsb = ttk.Scrollbar(win, orient="vertical", command=tree.yview)
-        tree.configure(yscrollcommand=vsb.set)
-        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        vsb.pack(side=tk.RIGHT, fill=tk.Y)
-
         # Status line
         status_var = tk.StringVar(value="")
         status_lbl = ttk.Label(win, textvariable=status_var)
         status_lbl.pack(side=tk.BOTTOM, anchor=tk.W, padx=8, pady=4)
+        vt.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
 
-        win._tree = tree
+        win._vt = vt
         win._status_var = status_var
+        win._search = SearchWorker(win)
         win._current_filter = dict(title="", author="", year="", include=None, exclude={"deleted"})  # default: exclude deleted
 
         def on_double_click(event):
-            sel = tree.selection()
-            if not sel:
-                return
-            try:
-                item = sel[0]
-                bid = int(tree.item(item, "values")[0])
-            except Exception:
+            bid = vt.id_at(event.y)
+            if bid is None:
                 return
             new_status = simpledialog.askstring(
                 "Change Status",
@@ -377,7 +423,7 @@ class LibraryApp:
             try:
                 self.library.set_status(bid, new_status.strip().lower())
                 self.refresh_count()
-                self.populate_tree(win)  # refresh
+                self.populate_tree(win, keep_position=True)  # refresh
                 messagebox.showinfo("Success", "Status updated.")
             except Exception as e:
                 messagebox.showerror("Error", str(e))
@@ -385,54 +431,47 @@ class LibraryApp:
         tree.bind("<Double-1>", on_double_click)
         self.populate_tree(win)
 
-    def populate_tree(self, win: tk.Toplevel, cap: int = 10000) -> None:
-        tree: ttk.Treeview = win._tree  # type: ignore
+    def populate_tree(self, win: tk.Toplevel, keep_position: bool = False) -> None:
+        vt: VirtualTree = win._vt  # type: ignore
         status_var: tk.StringVar = win._status_var  # type: ignore
         filt = win._current_filter  # type: ignore
 
-        for item in tree.get_children():
-            tree.delete(item)
-
         include = set(filt["include"]) if filt.get("include") else None
         exclude = set(filt.get("exclude") or set())
 
-        results = self.library.search(
+        cursor = self.library.search_cursor(
             title=filt.get("title"),
             author=filt.get("author"),
             year=filt.get("year"),
             include_statuses=include,
             exclude_statuses=exclude,
+            year_from=filt.get("year_from"),
+            year_to=filt.get("year_to"),
         )
-        total = len(results)
-        shown = 0
-
-        # Insert in batches to keep UI responsive
-        items = list(results.values())
-        items.sort(key=lambda b: b.id)
-
-        batch = 1000
-        idx = 0
-
-        def insert_batch():
-            nonlocal idx, shown
-            end = min(idx + batch, len(items))
-            for b in items[idx:end]:
-                if shown >= cap:
-                    break
-                tree.insert("", tk.END, values=(b.id, b.title, b.author, b.year, b.status))
-                shown += 1
-            idx = end
-            if shown >= cap or idx >= len(items):
-                status_var.set(f"Showing {shown} of {total} result(s).")
-                return
-            win.after(5, insert_batch)
+        restore = vt.first if keep_position else 0
+        vt.set_ids(())
+        status_var.set("Searching...")
 
-        insert_batch()
+        def on_rows(ids):
+            vt.extend_ids(ids)
+            if restore and vt.first < restore <= len(vt):
+                vt.scroll_to(restore)
+            status_var.set(f"Searching... {len(vt):,} result(s) so far.")
+
+        def on_done(seconds):
+            status_var.set(f"{len(vt):,} result(s) in {seconds:.2f} s.")
+
+        def on_error(e):
+            status_var.set("Search failed.")
+            messagebox.showerror("Error", f"Search failed: {e}", parent=win)
+
+        # The scan runs on a worker thread; a new search cancels this one
+        win._search.start((b.id for b in cursor), on_rows, on_done, on_error)  # type: ignore
 
     def search_dialog(self, parent: tk.Toplevel) -> None:
         top = tk.Toplevel(parent)
         top.title("Search / Filter")
-        top.geometry("380x360")
+        top.geometry("380x420")
 
         ttk.Label(top, text="Title contains:").pack(pady=(12, 2))
         title_e = ttk.Entry(top, width=40)
@@ -446,6 +485,15 @@ class LibraryApp:
         year_e = ttk.Entry(top, width=40)
         year_e.pack()
 
+        ttk.Label(top, text="Published between (inclusive, either may be empty):").pack(pady=(10, 2))
+        range_frame = ttk.Frame(top)
+        range_frame.pack()
+        year_from_e = ttk.Entry(range_frame, width=10)
+        year_from_e.pack(side=tk.LEFT)
+        ttk.Label(range_frame, text=" and ").pack(side=tk.LEFT)
+        year_to_e = ttk.Entry(range_frame, width=10)
+        year_to_e.pack(side=tk.LEFT)
+
         ttk.Label(top, text="Include statuses (leave none to include all):").pack(pady=(14, 6))
         include_vars: Dict[str, tk.IntVar] = {}
         inc_frame = ttk.Frame(top)
@@ -466,6 +514,11 @@ class LibraryApp:
             ttk.Checkbutton(exc_frame, text=s, variable=v).pack(side=tk.LEFT, padx=4)
 
         def apply_search():
+            bounds = [e.get().strip() for e in (year_from_e, year_to_e)]
+            if any(b and not b.isdigit() for b in bounds):
+                messagebox.showerror("Error", "Years must be whole numbers.", parent=top)
+                return
+            year_from, year_to = (int(b) if b else None for b in bounds)
             include = {s for s, v in include_vars.items() if v.get() == 1}
             exclude = {s for s, v in exclude_vars.items() if v.get() == 1}
             # If no include selections, include is None => include all
@@ -473,6 +526,8 @@ class LibraryApp:
                 title=title_e.get().strip(),
                 author=author_e.get().strip(),
                 year=year_e.get().strip(),
+                year_from=year_from,
+                year_to=year_to,
                 include=include if include else None,
                 exclude=exclude if exclude else None,
             )
@@ -488,7 +543,7 @@ class LibraryApp:
     def open_generate_window(self) -> None:
         top = tk.Toplevel(self.root)
         top.title("Generate Books")
-        top.geometry("400x240")
+        top.geometry("400x300")
 
         ttk.Label(top, text="Generate random books").pack(pady=(16, 4))
 
@@ -497,6 +552,10 @@ class LibraryApp:
         count_e.insert(0, "1000000")
         count_e.pack()
 
+        ttk.Label(top, text="Seed (optional, for repeatable runs)").pack(pady=(8, 2))
+        seed_e = ttk.Entry(top, width=20)
+        seed_e.pack()
+
         pb = ttk.Progressbar(top, orient=tk.HORIZONTAL, length=300, mode="determinate", maximum=100)
         pb.pack(pady=16)
 
@@ -504,7 +563,8 @@ class LibraryApp:
         ttk.Label(top, textvariable=info_var).pack()
 
         cancel_flag = {"cancel": False}
-        added_ids: List[int] = []
+        # Open savepoint while a run is in progress; cancelling rolls back to it
+        run: Dict[str, object] = {"sp": None, "library": None}
 
         def do_cancel():
             cancel_flag["cancel"] = True
@@ -518,51 +578,55 @@ class LibraryApp:
             if n <= 0 or n > 1_000_000:
                 messagebox.showerror("Error", "Please enter a number between 1 and 1,000,000.")
                 return
+            seed_str = seed_e.get().strip()
+            if seed_str and not seed_str.lstrip("-").isdigit():
+                messagebox.showerror("Error", "Seed must be an integer.")
+                return
 
             start_btn.config(state=tk.DISABLED)
             cancel_btn.config(state=tk.NORMAL)
             info_var.set("Starting generation...")
 
-            rng = __import__("random").Random()
+            gen = BookGenerator(int(seed_str) if seed_str else None)
+            library = run["library"] = self.library
+            run["sp"] = library.savepoint()
             target = n
             batch = 2000
             created = 0
 
             def step():
-                nonlocal created
+                nonlocal created, batch
+                if run["sp"] is None:
+                    # Window closed mid-run
+                    return
                 if cancel_flag["cancel"]:
                     # Roll back newly added items
-                    for bid in added_ids:
-                        try:
-                            self.library.hard_delete(bid)
-                        except KeyError:
-                            pass
+                    library.rollback(run["sp"])
+                    run["sp"] = None
+                    cancel_flag["cancel"] = False
                     self.refresh_count()
                     pb["value"] = 0
-                    info_var.set(f"Cancelled. Reverted {len(added_ids)} added book(s).")
+                    info_var.set(f"Cancelled. Reverted {created} added book(s).")
                     start_btn.config(state=tk.NORMAL)
                     cancel_btn.config(state=tk.DISABLED)
                     return
 
                 # Add a batch
                 to_make = min(batch, target - created)
-                for _ in range(to_make):
-                    b = self.library.add_book(
-                        title=rand_title(rng),
-                        author=rand_author(rng),
-                        year=rand_year(rng),
-                        status=rand_status(rng),
-                    )
-                    added_ids.append(b.id)
+                gen.generate(library, to_make)
                 created += to_make
+                # Size the next batch to roughly 100 ms of work
+                batch = max(1000, int(gen.rate() * 0.1))
 
                 # Progress
                 pb["value"] = (created / target) * 100
-                info_var.set(f"Generated {created}/{target}...")
+                info_var.set(f"Generated {created}/{target}... ({gen.rate():,.0f} books/s)")
 
                 if created >= target:
+                    library.release(run["sp"])
+                    run["sp"] = None
                     self.refresh_count()
-                    info_var.set("Done.")
+                    info_var.set(f"Done. {gen.rate():,.0f} books/s")
                     start_btn.config(state=tk.NORMAL)
                     cancel_btn.config(state=tk.DISABLED)
                     return
@@ -576,7 +640,16 @@ class LibraryApp:
         cancel_btn = ttk.Button(top, text="Cancel", command=do_cancel, state=tk.DISABLED)
         cancel_btn.pack()
 
-        ttk.Button(top, text="Close", command=top.destroy).pack(pady=10)
+        def close():
+            # Closing keeps whatever was generated so far
+            if run["sp"] is not None:
+                run["library"].release(run["sp"])
+                run["sp"] = None
+                self.refresh_count()
+            top.destroy()
+
+        ttk.Button(top, text="Close", command=close).pack(pady=10)
+        top.protocol("WM_DELETE_WINDOW", close)
 
 
 def main():
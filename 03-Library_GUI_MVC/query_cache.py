@@ -0,0 +1,260 @@
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Callable, Dict, FrozenSet, Hashable, List, Optional, Sequence, Set, Tuple
+
+from column_store import DEAD, NO_YEAR, ColumnStore
+from library_index import year_value
+
+# -----------------------
+# Search result cache
+# -----------------------
+#
+# Library.search() results keyed by the normalized filters (search_key()).
+# The cache is one of the library's indexes: every mutation bumps `version`
+# and logs the id it touched. A cached result stays valid as long as none of
+# the ids changed since it was stored moved into or out of it, which lookup()
+# checks against just those ids. Anything else about the library can change
+# without costing the cached entries anything.
+
+SearchKey = Tuple[str, str, str, Optional[FrozenSet[str]], FrozenSet[str], Optional[int], Optional[int]]
+
+
+def search_key(
+    title: Optional[str],
+    author: Optional[str],
+    year: Optional[str],
+    include_statuses: Optional[Set[str]],
+    exclude_statuses: Optional[Set[str]],
+    year_from: Optional[int],
+    year_to: Optional[int],
+) -> SearchKey:
+    """Search filters in the normalized form Library._matches() works with."""
+    return (
+        (title or "").strip().lower(),
+        (author or "").strip().lower(),
+        (year or "").strip().lower(),
+        frozenset(s.lower() for s in include_statuses) if include_statuses else None,
+        frozenset(s.lower() for s in exclude_statuses) if exclude_statuses else frozenset(),
+        year_from,
+        year_to,
+    )
+
+
+def key_matches(key: SearchKey, book) -> bool:
+    # One book against the filters; must agree with Library._matches()
+    return fields_match(key, book.title, book.author, book.year, book.status)
+
+
+def fields_match(key: SearchKey, title: str, author: str, year: str, status: str) -> bool:
+    t, a, y, inc, exc, year_from, year_to = key
+    if t and t not in title.lower():
+        return False
+    if a and a not in author.lower():
+        return False
+    if y and y not in year.lower():
+        return False
+    if year_from is not None or year_to is not None:
+        yv = year_value(year)
+        if yv is None or (year_from is not None and yv < year_from) or (year_to is not None and yv > year_to):
+            return False
+    status = status.lower()
+    if inc is not None and status not in inc:
+        return False
+    return status not in exc
+
+
+class Memo(dict):
+    """test(value) for each distinct value, worked out the first time it is asked for.
+
+    Filters evaluated through a Memo cost one dict lookup per row; the
+    actual test (lower(), substring search) runs once per distinct title,
+    author, year or status, of which generated libraries have very few.
+    """
+
+    def __init__(self, test: Callable[[Hashable], bool]) -> None:
+        super().__init__()
+        self.test = test
+
+    def __missing__(self, value: Hashable) -> bool:
+        ok = self[value] = self.test(value)
+        return ok
+
+
+def value_tests(key: SearchKey) -> Tuple[Optional[Memo], Optional[Memo], Optional[Memo], Optional[Memo]]:
+    """Memos over title, author, year and status strings for `key`, None where it has no filter."""
+    t, a, y, inc, exc, year_from, year_to = key
+    year_key = ("", "", y, None, frozenset(), year_from, year_to)
+    status_key = ("", "", "", inc, exc, None, None)
+    return (
+        Memo(lambda s: t in s.lower()) if t else None,
+        Memo(lambda s: a in s.lower()) if a else None,
+        Memo(lambda s: fields_match(year_key, "", "", s, "")) if y or year_from is not None or year_to is not None else None,
+        Memo(lambda s: fields_match(status_key, "", "", "", s)) if inc is not None or exc else None,
+    )
+
+
+class ColumnFilter:
+    """A search key evaluated straight on a ColumnStore's code columns.
+
+    Titles, authors and statuses are tested once per code and years once
+    per value; a row is then a few dict lookups. Deleted rows never match.
+    """
+
+    def __init__(self, store: ColumnStore, key: SearchKey) -> None:
+        self.store = store
+        titles, authors, years, statuses = value_tests(key)
+        names = store.status_names
+        self.year_test = years
+        # (column attribute, memo over its codes)
+        self.tests: List[Tuple[str, Memo]] = []
+        if titles is not None:
+            title_values = store.titles.values
+            self.tests.append(("title_codes", Memo(lambda c: titles[title_values[c]])))
+        if authors is not None:
+            author_values = store.authors.values
+            self.tests.append(("author_codes", Memo(lambda c: authors[author_values[c]])))
+        if years is not None:
+            # Odd years are not in the column; ids() checks those rows one by one
+            self.tests.append(("years", Memo(lambda c: c == NO_YEAR or years[str(c)])))
+        # Always there, rows can be deleted while a cursor is using this
+        self.tests.append(("status", Memo(lambda c: c != DEAD and (statuses is None or statuses[names[c]]))))
+
+    def ids(self, lo: int, hi: int) -> array:
+        """Ids of the matching rows in lo..hi."""
+        ids = self.store.ids
+        return array("q", [ids[row] for row in self.rows(lo, hi)])
+
+    def rows(self, lo: int, hi: int) -> List[int]:
+        """The matching rows in lo..hi."""
+        store = self.store
+        ids, years, odd_years, year_test = store.ids, store.years, store.odd_years, self.year_test
+        # The columns are looked up on every call; the store swaps them when it compacts
+        tests = [(getattr(store, name), memo) for name, memo in self.tests]
+        out = []
+        for row in range(lo, min(hi, len(ids))):
+            for column, ok in tests:
+                if not ok[column[row]]:
+                    break
+            else:
+                if year_test is not None and years[row] == NO_YEAR and not year_test[odd_years[ids[row]]]:
+                    continue
+                out.append(row)
+        return out
+
+
+class QueryCache:
+    """LRU cache of search results, validated against the ids changed since.
+
+    Results are shared with every caller that gets them and must not be
+    modified. `hits` and `misses` count lookups.
+    """
+
+    def __init__(self, maxsize: int = 32, max_rows: int = 2_000_000, max_log: int = 10_000) -> None:
+        self.maxsize = maxsize
+        self.max_rows = max_rows
+        self.max_log = max_log
+        self.entries: "OrderedDict[SearchKey, Tuple[int, Dict[int, object]]]" = OrderedDict()
+        self.rows = 0
+        self.hits = 0
+        self.misses = 0
+        # Change number `log_start + i + 1` touched id log[i]
+        self.version = 0
+        self.log_start = 0
+        self.log = array("q")
+        # Searches holding the library's read lock look up and store side by side
+        self._mutex = threading.Lock()
+
+    # ---- index protocol ----
+
+    def add(self, book) -> None:
+        self._touch(book.id)
+
+    def extend(self, ids: Sequence[int], titles: Sequence[str], authors: Sequence[str],
+               years: Sequence[str], statuses: Sequence[str]) -> None:
+        if len(self.log) + len(ids) > self.max_log:
+            # Too many to check one by one; every older entry gets recomputed
+            self.version += len(ids)
+            self.log_start = self.version
+            self.log = array("q")
+        else:
+            self.log.extend(ids)
+            self.version += len(ids)
+
+    def remove(self, book) -> None:
+        self._touch(book.id)
+
+    def set_status(self, book, old_status: str) -> None:
+        self._touch(book.id)
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.rows = 0
+        self.version += 1
+        self.log_start = self.version
+        self.log = array("q")
+
+    def _touch(self, book_id: int) -> None:
+        self.version += 1
+        self.log.append(book_id)
+        if len(self.log) > self.max_log:
+            # Forget the older half; entries from before it are recomputed
+            half = len(self.log) // 2
+            del self.log[:half]
+            self.log_start += half
+
+    # ---- lookups ----
+
+    def lookup(self, key: SearchKey, get: Callable[[int], Optional[object]]) -> Optional[Dict[int, object]]:
+        """The cached result for `key` if it is still right, else None."""
+        with self._mutex:
+            return self._lookup(key, get)
+
+    def _lookup(self, key: SearchKey, get: Callable[[int], Optional[object]]) -> Optional[Dict[int, object]]:
+        entry = self.entries.get(key)
+        if entry is not None:
+            version, result = entry
+            if version != self.version and not self._still_valid(key, version, result, get):
+                self._drop(key)
+                entry = None
+            elif version != self.version:
+                self.entries[key] = (self.version, result)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def changed_since(self, version: int) -> Optional[Set[int]]:
+        """Ids touched after `version`, or None if the log no longer goes back that far."""
+        if version < self.log_start:
+            return None
+        return set(self.log[version - self.log_start:])
+
+    def _still_valid(self, key: SearchKey, version: int, result: Dict[int, object],
+                     get: Callable[[int], Optional[object]]) -> bool:
+        changed = self.changed_since(version)
+        if changed is None:
+            return False
+        for bid in changed:
+            book = get(bid)
+            if (book is not None and key_matches(key, book)) != (bid in result):
+                return False
+        return True
+
+    def store(self, key: SearchKey, result: Dict[int, object], version: int) -> None:
+        """Cache `result`, computed when the cache was at `version`."""
+        if version < self.log_start or len(result) > self.max_rows:
+            return
+        with self._mutex:
+            if key in self.entries:
+                self._drop(key)
+            self.entries[key] = (version, result)
+            self.rows += len(result)
+            while len(self.entries) > self.maxsize or self.rows > self.max_rows:
+                self._drop(next(iter(self.entries)))
+
+    def _drop(self, key: SearchKey) -> None:
+        _, result = self.entries.pop(key)
+        self.rows -= len(result)
@@ -0,0 +1,124 @@
+import functools
+import threading
+from typing import Callable, Optional, TypeVar
+
+# -----------------------
+# Reader/writer lock
+# -----------------------
+#
+# Library is shared between the Tk thread and background threads
+# (SearchWorker, loaders). Searches only read, so any number of them may
+# run at once; a mutation waits until the readers are out and keeps new
+# ones out while it runs, so no reader ever sees half of a change.
+#
+# Writers are preferred: once a writer waits, new readers queue behind it,
+# so a steady stream of searches cannot starve it. Both sides nest within a
+# thread: a read inside a read (or inside that thread's own write) goes
+# straight through, and so does a write inside a write. Taking the write
+# lock while holding only the read lock would deadlock against another
+# reader doing the same and raises RuntimeError instead.
+
+F = TypeVar("F", bound=Callable)
+
+
+class _Hold:
+    # Reusable context manager over one side of the lock
+    __slots__ = ("_acquire", "_release")
+
+    def __init__(self, acquire: Callable[[], None], release: Callable[[], None]) -> None:
+        self._acquire = acquire
+        self._release = release
+
+    def __enter__(self) -> None:
+        self._acquire()
+
+    def __exit__(self, *exc) -> None:
+        self._release()
+
+
+class RWLock:
+    def __init__(self) -> None:
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer: Optional[int] = None
+        self._writer_depth = 0
+        self._writers_waiting = 0
+        # Read depth of each thread, so nested reads never queue
+        self._local = threading.local()
+        self._read = _Hold(self.acquire_read, self.release_read)
+        self._write = _Hold(self.acquire_write, self.release_write)
+
+    def read(self) -> _Hold:
+        """`with lock.read():` shares the lock with other readers."""
+        return self._read
+
+    def write(self) -> _Hold:
+        """`with lock.write():` holds the lock alone."""
+        return self._write
+
+    def acquire_read(self) -> None:
+        if self._writer == threading.get_ident():
+            return
+        local = self._local
+        depth = getattr(local, "depth", 0)
+        if not depth:
+            with self._cond:
+                while self._writer is not None or self._writers_waiting:
+                    self._cond.wait()
+                self._readers += 1
+        local.depth = depth + 1
+
+    def release_read(self) -> None:
+        if self._writer == threading.get_ident():
+            return
+        local = self._local
+        local.depth -= 1
+        if not local.depth:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    def acquire_write(self) -> None:
+        me = threading.get_ident()
+        if self._writer == me:
+            self._writer_depth += 1
+            return
+        if getattr(self._local, "depth", 0):
+            raise RuntimeError("Cannot take the write lock while holding the read lock")
+        with self._cond:
+            self._writers_waiting += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+            finally:
+                self._writers_waiting -= 1
+            self._writer = me
+            self._writer_depth = 1
+
+    def release_write(self) -> None:
+        if self._writer != threading.get_ident():
+            raise RuntimeError("Write lock released by a thread that does not hold it")
+        self._writer_depth -= 1
+        if not self._writer_depth:
+            with self._cond:
+                self._writer = None
+                self._cond.notify_all()
+
+
+def read_locked(method: F) -> F:
+    """Run a method under self.lock.read()."""
+    @functools.wraps(method)
+    def locked(self, *args, **kwargs):
+        with self.lock.read():
+            return method(self, *args, **kwargs)
+    return locked  # type: ignore[return-value]
+
+
+def write_locked(method: F) -> F:
+    """Run a method under self.lock.write()."""
+    @functools.wraps(method)
+    def locked(self, *args, **kwargs):
+        with self.lock.write():
+            return method(self, *args, **kwargs)
+    return locked  # type: ignore[return-value]
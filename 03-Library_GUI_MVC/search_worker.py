@@ -0,0 +1,99 @@
+import queue
+import threading
+import time
+from typing import Callable, Iterable, List, Optional
+
+import tkinter as tk
+
+# -----------------------
+# Background search
+# -----------------------
+#
+# Tk is single threaded, so a long search on the main thread freezes the
+# window. SearchWorker runs the search on a daemon thread and passes its
+# results back through a queue. The Tk thread drains the queue from after()
+# callbacks, so widgets are only ever touched by the Tk thread.
+
+_DONE = object()
+
+
+class SearchWorker:
+    """Runs one search at a time off the Tk thread; start() cancels the previous one."""
+
+    def __init__(self, widget: tk.Misc, batch: int = 20000, latency: float = 0.05) -> None:
+        self.widget = widget
+        # Rows per hand-over, and the longest a partial batch waits
+        self.batch = batch
+        self.latency = latency
+        self._cancel: Optional[threading.Event] = None
+
+    def start(
+        self,
+        rows: Iterable,
+        on_rows: Callable[[List], None],
+        on_done: Callable[[float], None],
+        on_error: Optional[Callable[[Exception], None]] = None,
+    ) -> None:
+        """Iterate `rows` on a worker thread.
+
+        on_rows(batch) is called on the Tk thread as results arrive and
+        on_done(seconds) once they are all in. Nothing is called after
+        cancel() or a later start().
+        """
+        self.cancel()
+        cancel = self._cancel = threading.Event()
+        results: "queue.Queue" = queue.Queue()
+        started = time.perf_counter()
+
+        def work() -> None:
+            batch: List = []
+            flushed = time.perf_counter()
+            try:
+                for row in rows:
+                    if cancel.is_set():
+                        return
+                    batch.append(row)
+                    # Full batches, but the first rows go out without waiting for one
+                    if len(batch) >= self.batch or time.perf_counter() - flushed > self.latency:
+                        results.put(batch)
+                        batch = []
+                        flushed = time.perf_counter()
+                results.put(batch)
+                results.put(_DONE)
+            except Exception as e:
+                results.put(e)
+
+        def poll() -> None:
+            if cancel.is_set() or not self.widget.winfo_exists():
+                cancel.set()
+                return
+            while True:
+                try:
+                    item = results.get_nowait()
+                except queue.Empty:
+                    self.widget.after(20, poll)
+                    return
+                if item is _DONE:
+                    self._cancel = None
+                    on_done(time.perf_counter() - started)
+                    return
+                if isinstance(item, Exception):
+                    self._cancel = None
+                    if on_error is None:
+                        raise item
+                    on_error(item)
+                    return
+                on_rows(item)
+
+        threading.Thread(target=work, daemon=True).start()
+        self.widget.after(20, poll)
+
+    def cancel(self) -> None:
+        # The thread stops at its next row; anything it queued is dropped
+        if self._cancel is not None:
+            self._cancel.set()
+            self._cancel = None
+
+    @property
+    def running(self) -> bool:
+        return self._cancel is not None
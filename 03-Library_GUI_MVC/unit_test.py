@@ -0,0 +1,511 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from column_store import ColumnStore
+from library_export import export_library, open_columns
+from library_index import LibraryStats, TrigramIndex
+from library_journal import LibraryJournal, read_journaled
+from library_model import STATUSES, Book, BookGenerator, Library
+from library_shards import ShardedSearch
+from library_sqlite import SQLiteLibrary
+from query_cache import search_key
+from rwlock import RWLock
+
+# Unit tests for Library and the storage, index, file and lock modules behind it.
+# Run from this folder: python -m pytest -q unit_test.py
+
+
+def filled(lib, n: int = 2000, seed: int = 0):
+    lib.add_books_unchecked(*BookGenerator(seed=seed).draw(n))
+    lib.add_book("Café in Münich", "Frow Grpw", "1900", "missing")
+    return lib
+
+
+def books_of(lib) -> dict:
+    # Every book as id -> (title, author, year, status)
+    result = lib.to_json_obj()["books"]
+    return {int(bid): (b["title"], b["author"], b["year"], b["status"]) for bid, b in result.items()}
+
+
+class FileTest(unittest.TestCase):
+    # A library of generated books and a folder to write its files to
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.lib = filled(Library(), 1000)
+        self.lib.hard_delete(5)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.tmp.name, name)
+
+
+class TestTrigramIndex(unittest.TestCase):
+    QUERIES = [
+        dict(title="dawn"),
+        dict(title="in munich of"),
+        dict(author="baron"),
+        dict(title="lost", author="key"),
+        dict(title="of"),
+        dict(title="zzz"),
+    ]
+
+    # indexed searches find the same books as a scan, also after changes
+    def test_matches_scan(self):
+        plain, indexed = filled(Library()), filled(Library(indexed=True))
+        for lib in (plain, indexed):
+            lib.set_status(3, "missing")
+            lib.hard_delete(4)
+            lib.add_book("Dawn in Munich", "Key Baron", "2001", "available")
+        for query in self.QUERIES:
+            self.assertEqual(list(indexed.search(**query)), list(plain.search(**query)), f"Mismatch for {query}")
+
+    # candidates cover every match, short needles and common trigrams leave it to a scan
+    def test_candidates(self):
+        index = TrigramIndex()
+        books = [Book(1, "Dawn in Paris", "Rey Kein", "1999", "available"),
+                 Book(2, "Dusk in Paris", "Key Baron", "2001", "missing")]
+        for book in books:
+            index.add(book)
+        self.assertEqual(index.candidates("title", "paris"), {1, 2})
+        self.assertEqual(index.candidates("author", "baron"), {2})
+        self.assertEqual(index.candidates("title", "zzz"), set())
+        self.assertIsNone(index.candidates("title", "in"))
+        self.assertIsNone(index.candidates("title", "paris", limit=1))
+        index.remove(books[0])
+        index.vacuum()
+        self.assertEqual(index.candidates("title", "dawn"), set())
+        self.assertEqual(index.size, 1)
+
+
+class TestColumnStore(unittest.TestCase):
+    def setUp(self):
+        self.store = ColumnStore(STATUSES)
+        for bid, title in enumerate(["Dawn", "Dusk", "Lost", "Sacred"], 1):
+            self.store[bid] = Book(bid, title, "Rey Kein", "1999" if bid % 2 else "n.d.", "available")
+
+    # rows read back, deleted rows are gone but stay as tombstones
+    def test_add_delete(self):
+        self.assertEqual(self.store[2].title, "Dusk")
+        self.assertEqual(self.store[2].year, "n.d.")
+        del self.store[2]
+        self.assertNotIn(2, self.store)
+        self.assertEqual(len(self.store), 3)
+        self.assertEqual(self.store.tombstones(), 1)
+        self.assertEqual(list(self.store), [1, 3, 4])
+
+    # compaction drops tombstones, row views taken before it still find their book
+    def test_compact_epoch(self):
+        row = self.store[4]
+        epoch = self.store.epoch
+        del self.store[1]
+        del self.store[2]
+        self.store.compact()
+        self.assertGreater(self.store.epoch, epoch)
+        self.assertEqual(self.store.tombstones(), 0)
+        self.assertEqual((row.id, row.title, row.year), (4, "Sacred", "n.d."))
+        row.status = "lent out"
+        self.assertEqual(self.store[4].status, "lent out")
+
+    # a deleted id can be stored again
+    def test_reuse_deleted_id(self):
+        del self.store[3]
+        self.store[3] = Book(3, "Again", "Key Baron", "2001", "missing")
+        self.assertEqual((self.store[3].title, len(self.store)), ("Again", 4))
+
+    # bulk extend must come after the last row
+    def test_extend(self):
+        self.store.extend([5, 6], ["A", "B"], ["X", "Y"], ["2000", "?"], ["missing", "available"])
+        self.assertEqual([self.store[6].title, self.store[6].year], ["B", "?"])
+        with self.assertRaises(ValueError):
+            self.store.extend([2], ["C"], ["Z"], ["2000"], ["missing"])
+
+
+class TestJournal(FileTest):
+    # journaled changes survive reopening, also after a crash left a torn line
+    def test_journal_crash(self):
+        path = self.path("library.json")
+        journal = LibraryJournal.create(path, self.lib)
+        self.lib.set_status(1, "missing")
+        self.lib.add_book("Before", "Crash", "2000", "available")
+        journal.flush()
+        journal.close()
+        with open(path + ".journal", "a", encoding="utf-8") as f:
+            f.write('["a", 99999, "Torn')
+
+        reopened = Library()
+        journal = LibraryJournal.open(path, reopened)
+        reopened.add_book("After", "Crash", "2001", "lent out")
+        reopened.hard_delete(2)
+        journal.flush()
+        journal.close()
+        self.lib.add_book("After", "Crash", "2001", "lent out")
+        self.lib.hard_delete(2)
+
+        again = Library()
+        again.load_json_obj(read_journaled(path))
+        self.assertEqual(books_of(again), books_of(self.lib))
+
+    # compaction folds the journal into the snapshot
+    def test_journal_compact(self):
+        path = self.path("library.json")
+        journal = LibraryJournal.create(path, self.lib)
+        self.lib.set_status(3, "lent out")
+        journal.compact(wait=True)
+        self.lib.clear()
+        self.lib.add_book("Only", "Book", "2000", "available")
+        journal.flush()
+        journal.close()
+        again = Library()
+        again.load_json_obj(read_journaled(path))
+        self.assertEqual(books_of(again), books_of(self.lib))
+
+
+class TestStreamLoad(FileTest):
+    def setUp(self):
+        super().setUp()
+        with open(self.path("library.json"), "w", encoding="utf-8") as f:
+            json.dump(self.lib.to_json_obj(), f)
+
+    # a library file streams in with rising progress and gives the same books
+    def test_stream(self):
+        for columnar in (False, True):
+            other = Library(columnar=columnar)
+            with open(self.path("library.json"), encoding="utf-8") as f:
+                steps = list(other.iter_load_json(f, every=100))
+            self.assertGreater(len(steps), 5)
+            self.assertEqual(steps, sorted(steps))
+            self.assertEqual(steps[-1], 1.0)
+            self.assertEqual(books_of(other), books_of(self.lib))
+            self.assertEqual(other.next_id, self.lib.next_id)
+
+    # the old flat layout loads too, out of order, and next_id follows the highest id
+    def test_flat_file(self):
+        with open(self.path("flat.json"), "w", encoding="utf-8") as f:
+            json.dump({"7": {"title": "B", "author": "A", "year": "2000", "status": "Missing"},
+                       "2": {"title": "A", "author": "A", "year": "1999", "status": "available"}}, f)
+        other = Library()
+        with open(self.path("flat.json"), encoding="utf-8") as f:
+            self.assertTrue(other.load_json_stream(f))
+        self.assertEqual(list(other.books), [2, 7])
+        self.assertEqual(other.get(7).status, "missing")
+        self.assertEqual(other.next_id, 8)
+
+    # closing the load part way leaves the library as it was
+    def test_cancel(self):
+        other = filled(Library(indexed=True), 10)
+        before = books_of(other)
+        with open(self.path("library.json"), encoding="utf-8") as f:
+            steps = other.iter_load_json(f, every=100)
+            next(steps)
+            next(steps)
+            steps.close()
+        self.assertEqual(books_of(other), before)
+        self.assertEqual(list(other.search(title="münich")), [11])
+
+
+class TestSnapshot(FileTest):
+    # a binary snapshot opens with the same books and can be added to
+    def test_snapshot(self):
+        self.lib.save_snapshot(self.path("books.snap"))
+        other = Library()
+        other.load_snapshot(self.path("books.snap"))
+        self.assertEqual(books_of(other), books_of(self.lib))
+        self.assertEqual(other.next_id, self.lib.next_id)
+        book = other.add_book("New", "Author", "2000", "available")
+        self.assertEqual(other.get(book.id).title, "New")
+
+    # an indexed library searches a snapshot right away, its indexes come in from a background thread
+    def test_snapshot_indexes(self):
+        self.lib.save_snapshot(self.path("books.snap"))
+        other = Library(indexed=True)
+        other.load_snapshot(self.path("books.snap"))
+        query = dict(title="dawn", exclude_statuses={"missing"}, year_from=1950, year_to=1999)
+        self.assertEqual(list(other.search(**query)), list(self.lib.search(**query)))
+        for lib in (self.lib, other):
+            lib.add_book("Dawn in Rome", "Author", "1960", "available")
+            lib.set_status(1, "missing")
+        other.index_build.join(10)
+        self.assertIsNotNone(other.text_index)
+        other.cache.clear()
+        self.assertEqual(list(other.search(**query)), list(self.lib.search(**query)))
+        self.assertEqual(other.stats.status_counts(), self.lib.stats.status_counts())
+        self.assertEqual(other.stats.year_histogram(), self.lib.stats.year_histogram())
+
+
+class TestBackends(unittest.TestCase):
+    QUERIES = [
+        dict(title="dawn"),
+        dict(author="garry", year="19"),
+        dict(include_statuses={"missing"}),
+        dict(exclude_statuses={"available", "lent out"}),
+        dict(title="in", year_from=1950, year_to=1999),
+        dict(title="münich"),
+        dict(title="zzz"),
+    ]
+
+    # SQLite, dict and columnar libraries find the same books
+    def test_same_results(self):
+        libs = [filled(Library()), filled(Library(columnar=True)), filled(Library(indexed=True)), filled(SQLiteLibrary())]
+        for lib in libs:
+            lib.set_status(7, "missing")
+            lib.hard_delete(8)
+        for query in self.QUERIES:
+            results = [{bid: (b.title, b.author, b.year, b.status) for bid, b in lib.search(**query).items()}
+                       for lib in libs]
+            for result in results[1:]:
+                self.assertEqual(result, results[0], f"Mismatch for {query}")
+            cursor = [b.id for b in libs[-1].search_cursor(**query)]
+            self.assertEqual(cursor, list(results[0]), f"Cursor mismatch for {query}")
+
+
+class TestSavepoints(unittest.TestCase):
+    # rollback undoes adds, status changes and deletes since the savepoint
+    def test_rollback(self):
+        for columnar in (False, True):
+            lib = filled(Library(indexed=True, columnar=columnar), 300)
+            before, next_id = books_of(lib), lib.next_id
+            sp = lib.savepoint()
+            lib.add_books_bulk([("New", "Author", "2000", "available")] * 3)
+            lib.set_status(1, "missing" if lib.get(1).status != "missing" else "available")
+            lib.hard_delete(2)
+            lib.add_book("Other", "Author", "2001", "lent out")
+            lib.rollback(sp)
+            self.assertEqual(books_of(lib), before)
+            self.assertEqual(lib.next_id, next_id)
+            self.assertEqual(list(lib.search(title="dawn")), [bid for bid, book in before.items() if "dawn" in book[0].lower()])
+            self.assertEqual(lib.stats.total, lib.count())
+
+    # a library cleared after the savepoint comes back
+    def test_rollback_clear(self):
+        lib = filled(Library(indexed=True), 300)
+        before = books_of(lib)
+        sp = lib.savepoint()
+        lib.clear()
+        lib.add_book("Only", "Book", "2000", "available")
+        lib.rollback(sp)
+        self.assertEqual(books_of(lib), before)
+        self.assertEqual(lib.stats.total, len(before))
+        self.assertEqual(lib.search(title="only"), {})
+
+    # release keeps the changes, a transaction that raises keeps none
+    def test_transaction(self):
+        lib = filled(Library(), 10)
+        sp = lib.savepoint()
+        lib.add_book("Kept", "Author", "2000", "available")
+        lib.release(sp)
+        with self.assertRaises(ValueError):
+            with lib.transaction():
+                lib.add_book("Rolled Back", "Author", "2000", "available")
+                lib.set_status(1, "lent out")
+                lib.add_book("Rolled Back", "Author", "20x0", "available")
+        self.assertEqual(lib.count(), 12)
+        self.assertEqual(lib.search(title="rolled back"), {})
+
+    # a bulk add checks every row before adding any
+    def test_bulk_checked(self):
+        lib = Library()
+        with self.assertRaises(ValueError):
+            lib.add_books_bulk([("A", "B", "2000", "available"), ("C", "D", "2000", "stolen")])
+        self.assertEqual(lib.count(), 0)
+
+
+class TestStats(unittest.TestCase):
+    # the running counts equal a recount after every kind of change
+    def test_follow_changes(self):
+        for columnar in (False, True):
+            lib = filled(Library(columnar=columnar), 500)
+            lib.set_status(1, "missing")
+            lib.hard_delete(2)
+            lib.add_book("New", "Rey Kein", "2000", "available")
+            sp = lib.savepoint()
+            lib.hard_delete(3)
+            lib.add_books_bulk([("Gone", "Someone", "1901", "lent out")])
+            lib.rollback(sp)
+            recount = LibraryStats()
+            for columns in lib.iter_columns():
+                recount.extend(*columns)
+            self.assertEqual(lib.stats.total, lib.count())
+            self.assertEqual(lib.stats.status_counts(), recount.status_counts())
+            self.assertEqual(lib.stats.year_histogram(), recount.year_histogram())
+            self.assertEqual(lib.stats.authors, recount.authors)
+
+    # counts that drop to zero leave the histograms
+    def test_drop_to_zero(self):
+        lib = Library()
+        book = lib.add_book("Alone", "Solo", "1950", "available")
+        lib.set_status(book.id, "missing")
+        self.assertEqual(lib.stats.status_counts(), {"missing": 1})
+        lib.hard_delete(book.id)
+        self.assertEqual((lib.stats.status_counts(), lib.stats.year_histogram(), lib.stats.top_authors()), ({}, [], []))
+
+
+class TestSearchCursor(unittest.TestCase):
+    # a cursor picks up after its last id when the library changes between pages
+    def test_cursor_during_changes(self):
+        lib = filled(Library(), 3000)
+        cursor = lib.search_cursor()
+        seen = [b.id for b in cursor.fetch(100)]
+        lib.hard_delete(1500)
+        added = lib.add_book("New", "Author", "2000", "available")
+        seen += [b.id for b in cursor]
+        self.assertEqual(seen, sorted(set(seen)))
+        self.assertNotIn(1500, seen)
+        self.assertIn(added.id, seen)
+        self.assertEqual(len(seen), lib.count())
+
+
+class TestQueryCache(unittest.TestCase):
+    def setUp(self):
+        self.lib = filled(Library(), 500)
+
+    # an unrelated write keeps the cached result, a related one is seen
+    def test_revalidation(self):
+        first = self.lib.search(include_statuses={"missing"})
+        some = next(iter(first))
+        other = next(bid for bid in range(1, 500) if bid not in first)
+        self.lib.set_status(other, "lent out")
+        hits = self.lib.cache.hits
+        self.assertIs(self.lib.search(include_statuses={"missing"}), first)
+        self.assertEqual(self.lib.cache.hits, hits + 1)
+
+        self.lib.set_status(some, "available")
+        self.lib.set_status(other, "missing")
+        added = self.lib.add_book("New", "Author", "2000", "missing")
+        now = self.lib.search(include_statuses={"missing"})
+        self.assertNotIn(some, now)
+        self.assertIn(other, now)
+        self.assertIn(added.id, now)
+
+    # a result stored before a write that changed it is not handed out
+    def test_stale_store(self):
+        key = search_key("dawn", None, None, None, None, None, None)
+        version = self.lib.cache.version
+        result = {b.id: b for b in self.lib._matches(key, None)}
+        some = next(iter(result))
+        self.lib.hard_delete(some)
+        self.lib.cache.store(key, result, version)
+        self.assertNotIn(some, self.lib.search(title="dawn"))
+
+
+class TestShards(unittest.TestCase):
+    QUERIES = [
+        dict(title="dawn"),
+        dict(author="baron", exclude_statuses={"missing"}),
+        dict(title="münich"),
+        dict(title="zzz"),
+    ]
+
+    # the shard workers find the same books as a scan in this process, changes since their snapshot included
+    def test_same_as_scan(self):
+        plain, sharded = filled(Library(), 3000), filled(Library(columnar=True), 3000)
+        sharded.cache.maxsize = 0
+        sharded.enable_shards(2)
+        self.addCleanup(sharded.disable_shards)
+        with patch("library_model.SHARD_MIN", 0):
+            for query in self.QUERIES:
+                self.assertEqual(list(sharded.search(**query)), list(plain.search(**query)), f"Mismatch for {query}")
+            version = sharded.shards.version
+            for lib in (plain, sharded):
+                lib.set_status(10, "missing")
+                lib.hard_delete(11)
+                lib.add_book("Dawn in Rome", "Key Baron", "2001", "available")
+            for query in self.QUERIES:
+                self.assertEqual(list(sharded.search(**query)), list(plain.search(**query)), f"Mismatch for {query}")
+        self.assertEqual(sharded.shards.version, version, "Changed ids should be checked without a new snapshot")
+
+    # the row ranges cover every row once
+    def test_shard_ranges(self):
+        shards = ShardedSearch(3)
+        self.addCleanup(shards.close)
+        shards.rows = 10
+        self.assertEqual(shards.shards(), [(0, 4), (4, 8), (8, 10)])
+        shards.rows = 0
+        self.assertEqual(shards.shards(), [])
+
+
+class TestExport(FileTest):
+    # exported files import to the same books
+    def test_export(self):
+        for ext in (".csv", ".libcols"):
+            path = self.path("books" + ext)
+            self.assertEqual(export_library(self.lib, path), self.lib.count())
+            for columnar in (False, True):
+                other = Library(columnar=columnar)
+                with open_columns(path) as reader:
+                    for _ in other.iter_load_columns(reader):
+                        pass
+                self.assertEqual(books_of(other), books_of(self.lib), f"Mismatch for {ext}")
+        self.assertEqual(other.next_id, self.lib.next_id)
+
+
+class TestRWLock(unittest.TestCase):
+    # both sides nest on the thread holding them, an upgrade fails instead of deadlocking
+    def test_reentrant(self):
+        lock = RWLock()
+        with lock.write():
+            with lock.write():
+                with lock.read():
+                    pass
+        with lock.read():
+            with lock.read():
+                with self.assertRaises(RuntimeError):
+                    lock.acquire_write()
+        with lock.write():
+            pass
+
+    # once a writer waits, new readers queue behind it, the reader already in may read again
+    def test_writer_preference(self):
+        lock = RWLock()
+        order = []
+
+        def write():
+            with lock.write():
+                order.append("write")
+
+        def read():
+            with lock.read():
+                order.append("read")
+
+        lock.acquire_read()
+        writer = threading.Thread(target=write, daemon=True)
+        writer.start()
+        while not lock._writers_waiting:
+            time.sleep(0.001)
+        reader = threading.Thread(target=read, daemon=True)
+        reader.start()
+        with lock.read():
+            pass
+        time.sleep(0.05)
+        before = list(order)
+        lock.release_read()
+        writer.join(1)
+        reader.join(1)
+        self.assertEqual(before, [])
+        self.assertEqual(order, ["write", "read"])
+
+    # readers share the lock
+    def test_readers_share(self):
+        lock = RWLock()
+        inside = threading.Barrier(3, timeout=1)
+
+        def read():
+            with lock.read():
+                inside.wait()
+
+        threads = [threading.Thread(target=read) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertFalse(inside.broken)
+
+
+if __name__ == "__main__":
+    unittest.main()
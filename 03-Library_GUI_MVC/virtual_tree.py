@@ -0,0 +1,161 @@
+from array import array
+from typing import Callable, Dict, Iterable, Optional, Sequence, Tuple
+
+import tkinter as tk
+from tkinter import ttk
+
+# -----------------------
+# Virtual list widget
+# -----------------------
+#
+# A ttk.Treeview only stays fast while it holds a few thousand items, so
+# VirtualTree never gives it more than the rows that fit on screen. The
+# result itself is just an array of book ids; scrolling moves a window over
+# that array and re-binds the same Tk items to the ids now in view.
+
+MAX_ROWS = 100
+
+
+class VirtualTree(ttk.Frame):
+    """Treeview + scrollbar over any number of rows, with about a screenful of Tk items.
+
+    `row_values(book_id)` gives the column values of one row, or None if the
+    book is gone; it is only called for the rows in view.
+    """
+
+    def __init__(self, master: tk.Misc, columns: Sequence[str],
+                 row_values: Callable[[int], Optional[Tuple]], **tree_kw) -> None:
+        super().__init__(master)
+        self.row_values = row_values
+        self.ids = array("q")
+        self.first = 0
+        self.rows = 1
+        # Selected book id and its position in self.ids
+        self.selected: Optional[int] = None
+        self.selected_pos = 0
+        # Tk item -> position in self.ids while it is on screen
+        self.bound: Dict[str, int] = {}
+
+        self.tree = ttk.Treeview(self, columns=columns, show="headings", selectmode="browse", **tree_kw)
+        self.vsb = ttk.Scrollbar(self, orient="vertical", command=self.on_scrollbar)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.vsb.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.tree.bind("<Configure>", self.on_resize)
+        self.tree.bind("<<TreeviewSelect>>", self.on_select)
+        self.tree.bind("<MouseWheel>", lambda e: self.scroll(-1 if e.delta > 0 else 1, "units"))
+        self.tree.bind("<Button-4>", lambda e: self.scroll(-1, "units"))
+        self.tree.bind("<Button-5>", lambda e: self.scroll(1, "units"))
+        # The arrow keys would stop at the last Tk item; move the window instead
+        self.tree.bind("<Up>", lambda e: self.step_selection(-1))
+        self.tree.bind("<Down>", lambda e: self.step_selection(1))
+        self.tree.bind("<Prior>", lambda e: self.scroll(-1, "pages"))
+        self.tree.bind("<Next>", lambda e: self.scroll(1, "pages"))
+        self.tree.bind("<Home>", lambda e: self.scroll_to(0))
+        self.tree.bind("<End>", lambda e: self.scroll_to(len(self.ids)))
+
+    # ---- data ----
+
+    def set_ids(self, ids: Iterable[int]) -> None:
+        self.ids = array("q", ids)
+        self.first = 0
+        self.selected = None
+        self.render()
+
+    def extend_ids(self, ids: Iterable[int]) -> None:
+        # Rows can arrive in chunks; only redraw if some of them are in view
+        before = len(self.ids)
+        self.ids.extend(ids)
+        if before < self.first + self.rows:
+            self.render()
+        else:
+            self.update_scrollbar()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def id_at(self, y: int) -> Optional[int]:
+        """Book id of the row at pixel `y` (e.g. event.y), if any."""
+        pos = self.bound.get(self.tree.identify_row(y))
+        return None if pos is None else self.ids[pos]
+
+    # ---- scrolling ----
+
+    def scroll_to(self, first: int) -> str:
+        first = max(0, min(first, len(self.ids) - self.rows))
+        if first != self.first:
+            self.first = first
+            self.render()
+        return "break"
+
+    def scroll(self, n: int, what: str) -> str:
+        step = self.rows if what == "pages" else 1
+        self.scroll_to(self.first + n * step)
+        return "break"
+
+    def on_scrollbar(self, op: str, *args: str) -> None:
+        if op == "moveto":
+            self.scroll_to(round(float(args[0]) * len(self.ids)))
+        elif op == "scroll":
+            self.scroll(int(args[0]), args[1])
+
+    def step_selection(self, n: int) -> str:
+        if not self.ids:
+            return "break"
+        pos = self.selected_pos + n if self.selected is not None else self.first
+        pos = max(0, min(pos, len(self.ids) - 1))
+        self.selected = self.ids[pos]
+        self.selected_pos = pos
+        if pos < self.first:
+            self.scroll_to(pos)
+        elif pos >= self.first + self.rows:
+            self.scroll_to(pos - self.rows + 1)
+        self.render()
+        return "break"
+
+    def on_resize(self, event: tk.Event) -> None:
+        row_height = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+        rows = max(1, min(MAX_ROWS, (event.height - row_height) // row_height))
+        if rows != self.rows:
+            self.rows = rows
+            self.first = max(0, min(self.first, len(self.ids) - rows))
+            self.render()
+
+    def on_select(self, event: tk.Event) -> None:
+        sel = self.tree.selection()
+        pos = self.bound.get(sel[0]) if sel else None
+        if pos is not None:
+            self.selected = self.ids[pos]
+            self.selected_pos = pos
+
+    # ---- drawing ----
+
+    def render(self) -> None:
+        tree = self.tree
+        count = max(0, min(self.rows, len(self.ids) - self.first))
+        items = tree.get_children()
+        # Keep exactly `count` Tk items and re-bind them to the ids in view
+        for iid in items[count:]:
+            tree.delete(iid)
+        for i in range(len(items), count):
+            tree.insert("", tk.END, iid=f"row{i}")
+        self.bound.clear()
+        select = ()
+        for i in range(count):
+            iid = f"row{i}"
+            pos = self.first + i
+            bid = self.ids[pos]
+            values = self.row_values(bid)
+            tree.item(iid, values=values if values is not None else (bid, "(removed)"))
+            self.bound[iid] = pos
+            if bid == self.selected:
+                select = (iid,)
+        tree.selection_set(select)
+        self.update_scrollbar()
+
+    def update_scrollbar(self) -> None:
+        total = len(self.ids)
+        if total <= self.rows:
+            self.vsb.set(0.0, 1.0)
+        else:
+            self.vsb.set(self.first / total, (self.first + self.rows) / total)
@@ -0,0 +1,297 @@
+# Library Management System V: 3.0
+# Created by: Rownak Deb Kabya & Marcos Blanco-Leon
+# Email: rownak.kabya@stud.th-deg.de
+# Email: marcos.blanco-Leon@stud.th-deg.de
+# This code measures how the library models scale, from 1k to 10M books.
+#
+# Usage:
+#   python benchmarks.py                                  every target and size
+#   python benchmarks.py --sizes 1000 100000 --targets model05
+#   python benchmarks.py --out new.json --compare old.json
+#
+# Two targets are measured: "model05" is the dict model next to this file,
+# "library03" the Library class of 03-Library_GUI_MVC, both set up the way
+# their apps do (search index on). Every target and size runs in its own
+# process, so the peak RSS belongs to that run alone and a run that runs
+# out of memory only loses its own results. The "threads:" rows search on
+# several threads while another one keeps changing the library, see
+# measure_threads().
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:  # not on Windows, peak RSS is left out there
+    resource = None
+
+SIZES = [1_000, 100_000, 1_000_000, 10_000_000]
+TARGETS = ['model05', 'library03']
+
+# Searches as (name, title, author, year, status)
+SEARCHES = [
+    ('title', 'dawn', '', '', ''),
+    ('author', '', 'garry', '', ''),
+    ('year', '', '', '1999', ''),
+    ('status', '', '', '', 'missing'),
+    ('title+status', 'sacred in roy', '', '', 'available'),
+    ('author+year', '', 'baron', '2001', ''),
+]
+
+# Single book operations timed per run, fewer on very small libraries
+SINGLE_OPS = 10_000
+
+# Search threads running next to the thread changing statuses
+READERS = 4
+
+# Peak resident memory of this process so far, in MB
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (1 << 20 if sys.platform == 'darwin' else 1 << 10), 1)
+
+# Runs fn once and returns one result row for it
+def measure(target, books, op, count, fn):
+    started = time.perf_counter()
+    fn()
+    seconds = time.perf_counter() - started
+    return {'target': target, 'books': books, 'op': op, 'count': count, 'seconds': round(seconds, 6),
+            'ops_per_sec': round(count / seconds, 1) if seconds else None, 'peak_rss_mb': peak_rss_mb()}
+
+# Runs searches on READERS threads while one more thread swaps the statuses of
+# two books at a time, returns a row for each side. A swap leaves the number of
+# books found by search() unchanged, every other number found is counted as
+# inconsistent: a search saw half of a swap.
+def measure_threads(target, books, search, swap, repeat):
+    expected = search()
+    stop = threading.Event()
+    swaps = 0
+    inconsistent = 0
+
+    def read():
+        nonlocal inconsistent
+        for _ in range(repeat):
+            if search() != expected:
+                inconsistent += 1
+
+    def write():
+        nonlocal swaps
+        while not stop.is_set():
+            swap(swaps)
+            swaps += 1
+
+    readers = [threading.Thread(target=read) for _ in range(READERS)]
+    writer = threading.Thread(target=write)
+    started = time.perf_counter()
+    writer.start()
+    for reader in readers:
+        reader.start()
+    for reader in readers:
+        reader.join()
+    stop.set()
+    writer.join()
+    seconds = time.perf_counter() - started
+    searches = READERS * repeat
+    rss = peak_rss_mb()
+    return [{'target': target, 'books': books, 'op': f'threads:search x{READERS}', 'count': searches,
+             'seconds': round(seconds, 6), 'ops_per_sec': round(searches / seconds, 1), 'peak_rss_mb': rss,
+             'inconsistent': inconsistent},
+            {'target': target, 'books': books, 'op': 'threads:swap', 'count': swaps,
+             'seconds': round(seconds, 6), 'ops_per_sec': round(swaps / seconds, 1), 'peak_rss_mb': rss}]
+
+# The dict model of this folder
+def run_model05(size, folder):
+    import library_model as model
+    model.enable_search_index()
+    rng = random.Random(0)
+    results = []
+
+    def generate():
+        # One generator per batch, so the library ends at exactly size books
+        while len(model.library) < size:
+            generate_batch, _ = model.generate_books_model(seed=len(model.library),
+                                                           batch_size=min(5000, size - len(model.library)))
+            generate_batch()
+
+    results.append(measure('model05', size, 'generate', size, generate))
+
+    count = min(SINGLE_OPS, size)
+    rows = [(rng.choice(model.all_titles), rng.choice(model.all_authors), rng.choice(model.all_years),
+             rng.choice(model.status_base)) for _ in range(count)]
+    results.append(measure('model05', size, 'add_book', count, lambda: [model.add_book_model(*row) for row in rows]))
+
+    changes = [(key, rng.choice(model.status_base)) for key in rng.sample(list(model.library), count)]
+    results.append(measure('model05', size, 'set_status', count,
+                           lambda: [model.change_status_model(key, status) for key, status in changes]))
+
+    repeat = 5 if size <= 100_000 else 1
+    for name, *query in SEARCHES:
+        results.append(measure('model05', size, 'search:' + name, repeat,
+                               lambda: [model.search_books_model(*query) for _ in range(repeat)]))
+
+    keys = list(model.library)
+
+    def swap(n):
+        a, b = keys[n * 2 % len(keys)], keys[(n * 2 + 1) % len(keys)]
+        with model.library_lock.write():
+            status_a = model.library[a]['status']
+            model.change_status_model(a, model.library[b]['status'])
+            model.change_status_model(b, status_a)
+
+    results.extend(measure_threads('model05', size, lambda: len(model.search_books_model('', '', '', 'missing')),
+                                   swap, repeat))
+
+    path = os.path.join(folder, 'library.json')
+    total = len(model.library)
+    results.append(measure('model05', size, 'save', total, lambda: model.save_file_model(path)))
+    model.close_journal()
+
+    def load():
+        model.library.clear()
+        model.load_file_model(path)
+
+    results.append(measure('model05', size, 'load', total, load))
+    return results
+
+# The Library class of 03-Library_GUI_MVC
+def run_library03(size, folder):
+    # 03 has modules named like the ones here, so it goes first on the path
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '03-Library_GUI_MVC'))
+    from library_model import STATUSES, BookGenerator, Library
+    lib = Library(indexed=True)
+    # Repeated searches would otherwise be answered by the query cache
+    lib.cache.maxsize = 0
+    rng = random.Random(0)
+    generator = BookGenerator(seed=0)
+    results = [measure('library03', size, 'generate', size, lambda: generator.generate(lib, size))]
+
+    count = min(SINGLE_OPS, size)
+    rows = list(zip(*generator.draw(count)))
+    results.append(measure('library03', size, 'add_book', count, lambda: [lib.add_book(*row) for row in rows]))
+
+    statuses = [s for s in STATUSES if s != 'deleted']
+    changes = [(bid, rng.choice(statuses)) for bid in rng.sample(range(1, lib.next_id), count)]
+    results.append(measure('library03', size, 'set_status', count,
+                           lambda: [lib.set_status(bid, status) for bid, status in changes]))
+
+    repeat = 5 if size <= 100_000 else 1
+    for name, title, author, year, status in SEARCHES:
+        query = dict(title=title, author=author, year=year, include_statuses={status} if status else None)
+        results.append(measure('library03', size, 'search:' + name, repeat,
+                               lambda: [lib.search(**query) for _ in range(repeat)]))
+
+    ids = range(1, lib.next_id)
+
+    def swap(n):
+        a, b = ids[n * 2 % len(ids)], ids[(n * 2 + 1) % len(ids)]
+        with lib.transaction():
+            status_a = lib.get(a).status
+            lib.set_status(a, lib.get(b).status)
+            lib.set_status(b, status_a)
+
+    results.extend(measure_threads('library03', size, lambda: len(lib.search(include_statuses={'missing'})),
+                                   swap, repeat))
+
+    path = os.path.join(folder, 'library.json')
+    total = lib.count()
+
+    def save():
+        # As File > Save As... writes it
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(lib.to_json_obj(), f, indent=2)
+
+    def load():
+        with open(path, encoding='utf-8') as f:
+            lib.load_json_stream(f)
+
+    results.append(measure('library03', size, 'save', total, save))
+    results.append(measure('library03', size, 'load', total, load))
+    return results
+
+# Runs one target at one size in this process and prints its rows as JSON
+def run_case(target, size):
+    with tempfile.TemporaryDirectory(prefix='library-bench-') as folder:
+        results = (run_model05 if target == 'model05' else run_library03)(size, folder)
+    print(json.dumps(results))
+
+# Runs one target at one size in a new process, returns its rows or raises RuntimeError
+def spawn_case(target, size):
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), '--case', target, str(size)],
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        lines = proc.stderr.strip().splitlines() or [f'exit code {proc.returncode}']
+        raise RuntimeError(lines[-1])
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+# Prints one result row
+def print_row(row):
+    rate = f"{row['ops_per_sec']:>14,.1f}" if row['ops_per_sec'] else f"{'-':>14}"
+    rss = f"{row['peak_rss_mb']:>10,.1f}" if row['peak_rss_mb'] is not None else f"{'-':>10}"
+    print(f"{row['target']:<10}{row['books']:>12,}  {row['op']:<20}{rate}{rss}")
+
+# Prints the change in ops/sec against an older results file
+def compare(old_path, results):
+    with open(old_path, encoding='utf-8') as f:
+        old = {(r['target'], r['books'], r['op']): r for r in json.load(f)['results']}
+    print(f"\n{'target':<10}{'books':>12}  {'op':<20}{'old ops/s':>14}{'new ops/s':>14}{'change':>9}")
+    for row in results:
+        before = old.get((row['target'], row['books'], row['op']))
+        if before is None or not before['ops_per_sec'] or not row['ops_per_sec']:
+            continue
+        change = row['ops_per_sec'] / before['ops_per_sec'] - 1
+        print(f"{row['target']:<10}{row['books']:>12,}  {row['op']:<20}"
+              f"{before['ops_per_sec']:>14,.1f}{row['ops_per_sec']:>14,.1f}{change:>+9.1%}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Library model scale benchmarks')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help='library sizes in books')
+    parser.add_argument('--targets', nargs='+', choices=TARGETS, default=TARGETS)
+    parser.add_argument('--out', default='benchmark_results.json', help='where to write the results')
+    parser.add_argument('--compare', help='older results file to compare against')
+    parser.add_argument('--case', nargs=2, metavar=('TARGET', 'SIZE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.case:
+        run_case(args.case[0], int(args.case[1]))
+        return
+
+    report = {
+        'started': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'results': [],
+        'errors': [],
+    }
+    print(f"{'target':<10}{'books':>12}  {'op':<20}{'ops/s':>14}{'peak MB':>10}")
+    for size in args.sizes:
+        for target in args.targets:
+            try:
+                rows = spawn_case(target, size)
+            except RuntimeError as e:
+                report['errors'].append({'target': target, 'books': size, 'error': str(e)})
+                print(f"{target:<10}{size:>12,}  failed: {e}")
+                continue
+            report['results'].extend(rows)
+            for row in rows:
+                print_row(row)
+                if row.get('inconsistent'):
+                    print(f"{'':<22}{row['inconsistent']} searches saw half of a change")
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.out}")
+    if args.compare:
+        compare(args.compare, report['results'])
+
+if __name__ == '__main__':
+    main()
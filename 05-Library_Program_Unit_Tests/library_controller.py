@@ -9,6 +9,12 @@ from library_model import *
 from library_view import *
 from ImageDrawer import *
 from tkinter import messagebox, filedialog, simpledialog, ttk
+import queue
+import threading
+import time
+
+# Cancel flag of the search running in the background, see start_search()
+search_job = {'cancel': None}
 
 # Funnction to load the json file
 def load_file_controller(display_book):
@@ -23,6 +29,121 @@ def load_file_controller(display_book):
     except Exception as e:
         messagebox.showerror("Error", f"Operation failed due to: {str(e)}")
 
+# Opens a large library file without loading it, books are read when needed
+def open_large_file_controller(display_book):
+    file_path = filedialog.askopenfilename(filetypes=[("JSON files", "*.json")])
+    if not file_path:
+        return
+    if book_count() and not messagebox.askyesno('Open Large File', 'Books that are not saved will be lost. Continue?'):
+        return
+    success, message = open_lazy_model(file_path)
+    if success:
+        messagebox.showinfo('Success', message)
+        update_book_count(display_book)
+    else:
+        messagebox.showerror("Error", message)
+
+# Merges several library files into the library, read in the background so the window stays responsive
+def merge_files_controller(window, display_book):
+    file_paths = filedialog.askopenfilenames(filetypes=[("JSON files", "*.json")])
+    if not file_paths:
+        return
+    results = queue.Queue()
+
+    def work():
+        try:
+            results.put(merge_files_model(file_paths))
+        except Exception as e:
+            results.put((False, f"Operation failed due to: {str(e)}", None))
+
+    def poll():
+        try:
+            success, message, report = results.get_nowait()
+        except queue.Empty:
+            # The count waits for the merge, each file is merged under the write lock
+            window.after(100, poll)
+            return
+        update_book_count(display_book)
+        if success:
+            messagebox.showinfo('Success', message)
+        else:
+            messagebox.showerror("Error", message)
+
+    threading.Thread(target=work, daemon=True).start()
+    window.after(100, poll)
+
+# Shows one book by its number and lets its status be changed
+def find_book_controller():
+    book_number = simpledialog.askstring("Find Book", "Enter book number:")
+    if not book_number:
+        return
+    book = get_book_model(book_number.strip())
+    if book is None:
+        messagebox.showerror('Error', 'Book not found!')
+        return
+    new_status = simpledialog.askstring("Change Status",
+                                        f"{book.get('title', '')} - {book.get('author', '')} ({book.get('year', '')}), "
+                                        f"{book.get('status', '')}\n\nEnter new status (available/lent out/missing), "
+                                        "or cancel to keep it:")
+    if new_status:
+        success, message = change_status_model(book_number.strip(), new_status)
+        if success:
+            messagebox.showinfo("Success", message)
+        else:
+            messagebox.showerror('Error', message)
+
+# Runs a search generator on a worker thread, results reach the Tk thread in batches through after()
+def start_search(widget, rows, on_rows, on_done, batch_size=1000):
+    cancel_search()
+    cancel = threading.Event()
+    search_job['cancel'] = cancel
+    results = queue.Queue()
+    started = time.perf_counter()
+
+    def work():
+        batch = []
+        flushed = time.perf_counter()
+        try:
+            for row in rows:
+                if cancel.is_set():
+                    return
+                batch.append(row)
+                # Send full batches, and the first rows without waiting for a full one
+                if len(batch) >= batch_size or time.perf_counter() - flushed > 0.05:
+                    results.put(batch)
+                    batch = []
+                    flushed = time.perf_counter()
+            results.put(batch)
+            results.put(None)
+        except Exception as e:
+            results.put(e)
+
+    def poll():
+        if cancel.is_set() or not widget.winfo_exists():
+            cancel.set()
+            return
+        try:
+            while True:
+                batch = results.get_nowait()
+                if batch is None:
+                    on_done(time.perf_counter() - started)
+                    return
+                if isinstance(batch, Exception):
+                    messagebox.showerror('Error', f'Search failed due to: {batch}')
+                    return
+                on_rows(batch)
+        except queue.Empty:
+            widget.after(20, poll)
+
+    threading.Thread(target=work, daemon=True).start()
+    widget.after(20, poll)
+
+# Stops the background search, its remaining results are dropped
+def cancel_search():
+    if search_job['cancel'] is not None:
+        search_job['cancel'].set()
+        search_job['cancel'] = None
+
 # Function for saving library as a JSON file
 def save_file_controller():
     try:
@@ -61,8 +182,17 @@ def confirm_delete_controller(title, display_book):
     else:
         messagebox.showinfo('Failed!', message)
 
+# Removes the deleted books kept as tombstones
+def vacuum_controller(display_book):
+    success, message = vacuum_model()
+    messagebox.showinfo('Success' if success else 'Failed!', message)
+    update_book_count(display_book)
+
 # Function to Generate books using string random functions with button for cancellation of creation of already created books
 def generate_books_controller(window, display_book):
+    if lazy_mode_model():
+        messagebox.showerror('Error', 'Books cannot be added to a file opened on demand, load it first!')
+        return
     generate_batch, cancel_generation = generate_books_model()
     progress_window, label_gen, progress_bar = generate_books_view(lambda: [cancel_generation(), 
                                                                             progress_window.destroy(), 
@@ -70,8 +200,9 @@ def generate_books_controller(window, display_book):
     
     def update_progress():
         if progress_window.winfo_exists():
-            index, not_cancelled, progress = generate_batch()
+            index, not_cancelled, progress, rate = generate_batch()
             progress_bar['value'] = progress
+            label_gen.configure(text=f'Generating... {rate:,.0f} books/s')
             progress_window.update_idletasks()
             if index < 1_000_000 and not_cancelled:
                 window.after(1, update_progress)
@@ -100,6 +231,9 @@ def upload_image_controller(display_book):
                                                            display_book), recognized_text)
         def search_library(recognized_text):
             filtered = search_books_model(recognized_text.lower(), "", "", "")
+            # OCR often misreads a letter or two, fall back to the closest titles
+            if not filtered:
+                filtered = fuzzy_search_model(recognized_text)
             display_search_results(filtered, recognized_text)
         app = ImageDrawer(image_window, file_path, save_book, search_library)
         # Show OCR result when window closes
@@ -116,10 +250,25 @@ def upload_image_controller(display_book):
 def lend_receive_controller():
     def search_books_controller():
         def search(title, author, year, status):
-            filtered = search_books_model(title.lower(), author.lower(), year, status.lower())
-            update_list_view(list_box, filtered)
-            if not filtered:
-                messagebox.showinfo('Unsuccessful', 'No Books Found.')
+            # Runs in the background, a new search cancels the one still running
+            stop_list_view(list_box)
+            list_box.delete(0, END)
+            status_label.configure(text='Searching...')
+            found = 0
+
+            def on_rows(rows):
+                nonlocal found
+                found += len(rows)
+                append_list_view(list_box, rows)
+                status_label.configure(text=f'Searching... {found} book(s) found')
+
+            def on_done(seconds):
+                status_label.configure(text=f'{found} book(s) found in {seconds:.2f} s')
+                if not found:
+                    messagebox.showinfo('Unsuccessful', 'No Books Found.')
+
+            start_search(list_box, iter_search_books_model(title.lower(), author.lower(), year, status.lower()),
+                         on_rows, on_done)
         search_books_view(search)
 
     def on_book_double_click(event):
@@ -131,6 +280,8 @@ def lend_receive_controller():
             success, message = change_status_model(book_number, new_status)
             if success:
                 messagebox.showinfo("Success", message)
+                cancel_search()
+                status_label.configure(text='')
                 update_list_view(list_box, library)
             else:
                 messagebox.showerror('Error', message)
@@ -140,16 +291,22 @@ def lend_receive_controller():
             messagebox.showerror('Error', f'Operation failed due to: {e}')
 
     def list_window_exit():
+        cancel_search()
         list_window.destroy()
 
-    list_window, list_box = lend_receive_view(search_books_controller, 
+    list_window, list_box, status_label = lend_receive_view(search_books_controller, 
                                               list_window_exit, 
                                               on_book_double_click)
     if len(library) > 0:
         update_list_view(list_box, library)
 
-# Initialize and run the application
+# Shows the book counts kept by the model
+def stats_controller():
+    stats_view(status_counts_model(), top_authors_model(), year_histogram_model())
+
+# Initialize and run the application. Only here: merge workers (library_merge.py) import this module again.
 if __name__ == "__main__":
+    enable_search_index()
     window, display_book = create_main_window_view(
         book_count_value=book_count(),
         save_cmd=lambda: save_file_controller(),
@@ -168,7 +325,12 @@ if __name__ == "__main__":
                                                                        display_book)),
         delete_cmd=lambda: delete_book_view(lambda title: confirm_delete_controller(title, display_book)),
         lend_cmd=lambda: lend_receive_controller(),
-        upload_cmd=lambda: upload_image_controller(display_book)
+        upload_cmd=lambda: upload_image_controller(display_book),
+        stats_cmd=lambda: stats_controller(),
+        vacuum_cmd=lambda: vacuum_controller(display_book),
+        open_large_cmd=lambda: open_large_file_controller(display_book),
+        find_cmd=lambda: find_book_controller(),
+        merge_cmd=lambda: merge_files_controller(window, display_book)
     )
     # start the main loop
     window.mainloop()
@@ -0,0 +1,141 @@
+# Library Management System V: 3.0
+# Created by: Rownak Deb Kabya & Marcos Blanco-Leon
+# Email: rownak.kabya@stud.th-deg.de
+# Email: marcos.blanco-Leon@stud.th-deg.de
+# This code keeps a trigram index over book titles and authors for fast searches.
+
+import math
+from collections import Counter
+
+# Returns every 3 character slice of the text
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+class TrigramIndex:
+    # Posting lists: field -> trigram -> set of library keys
+    def __init__(self):
+        self.postings = {'title': {}, 'author': {}}
+        self.size = 0
+
+    # Index a book under its key
+    def add(self, key, book):
+        for field, postings in self.postings.items():
+            for gram in trigrams(book.get(field, '').lower()):
+                postings.setdefault(gram, set()).add(key)
+        self.size += 1
+
+    # Index many (key, book) pairs, the trigrams of each distinct title and author are worked out once
+    def extend(self, books):
+        for field, postings in self.postings.items():
+            keys_of = {}
+            for key, book in books.items():
+                keys_of.setdefault(book.get(field, ''), []).append(key)
+            for text, keys in keys_of.items():
+                for gram in trigrams(text.lower()):
+                    postings.setdefault(gram, set()).update(keys)
+        self.size += len(books)
+
+    # Remove a book that was indexed under its key
+    def remove(self, key, book):
+        for field, postings in self.postings.items():
+            for gram in trigrams(book.get(field, '').lower()):
+                keys = postings.get(gram)
+                if keys:
+                    keys.discard(key)
+        self.size -= 1
+
+    # Index a whole library from scratch
+    def rebuild(self, books):
+        for postings in self.postings.values():
+            postings.clear()
+        self.size = 0
+        for key, book in books.items():
+            self.add(key, book)
+
+    # Keys whose field may contain the lowercased text, None if the text is too short
+    def candidates(self, field, text):
+        if len(text) < 3:
+            return None
+        postings = self.postings[field]
+        lists = []
+        for gram in trigrams(text):
+            if not postings.get(gram):
+                return set()
+            lists.append(postings[gram])
+        lists.sort(key=len)
+        return set.intersection(*lists)
+
+# Trigrams of a title padded with spaces, so short words and word starts count too
+def padded_trigrams(text):
+    return trigrams('  ' + ' '.join(text.lower().split()) + ' ')
+
+class TitleIndex:
+    # Approximate title matching for OCR text. Every distinct title is stored
+    # once with the keys of its books, and its trigrams point at it. A lookup
+    # only counts shared trigrams for titles found through the rarest ones,
+    # so it never compares the text against every title. Deleted books are
+    # counted in size but not indexed.
+    def __init__(self):
+        self.codes = {}
+        self.titles = []
+        self.keys = []
+        self.gram_counts = []
+        self.postings = {}
+        self.size = 0
+
+    # Index a book under its key
+    def add(self, key, book):
+        title = ' '.join(book.get('title', '').lower().split())
+        if title and book.get('status') != 'deleted':
+            code = self.codes.get(title)
+            if code is None:
+                code = self.codes[title] = len(self.titles)
+                self.titles.append(title)
+                # Keys in a dict, so they stay in the order the books were added
+                self.keys.append({})
+                grams = padded_trigrams(title)
+                self.gram_counts.append(len(grams))
+                for gram in grams:
+                    self.postings.setdefault(gram, set()).add(code)
+            self.keys[code][key] = None
+        self.size += 1
+
+    # Remove a book that was indexed under its key, the title itself stays
+    def remove(self, key, book):
+        code = self.codes.get(' '.join(book.get('title', '').lower().split()))
+        if code is not None:
+            self.keys[code].pop(key, None)
+        self.size -= 1
+
+    # Keys of the books with this title, oldest first
+    def find(self, title):
+        code = self.codes.get(' '.join(title.lower().split()))
+        return self.keys[code] if code is not None else {}
+
+    # Index a whole library from scratch
+    def rebuild(self, books):
+        self.__init__()
+        for key, book in books.items():
+            self.add(key, book)
+
+    # Yields titles sharing at least min_share of the text's trigrams, best first, as (score, title, keys)
+    def similar(self, text, min_share=0.6):
+        grams = padded_trigrams(text)
+        if not grams:
+            return
+        need = max(1, math.ceil(min_share * len(grams)))
+        lists = sorted((self.postings.get(gram, set()) for gram in grams), key=len)
+        # A title missing all of the rarest len - need + 1 trigrams cannot share need of them
+        split = len(lists) - need + 1
+        shared = Counter()
+        for postings in lists[:split]:
+            shared.update(postings)
+        found = set(shared)
+        for postings in lists[split:]:
+            shared.update(found & postings)
+        counts = self.gram_counts
+        codes = [code for code, n in shared.items() if n >= need and self.keys[code]]
+        # Most of the text found first, then most of the title covered by it
+        codes.sort(key=lambda code: (-shared[code], counts[code], code))
+        for code in codes:
+            yield shared[code] / len(grams), self.titles[code], self.keys[code]
@@ -0,0 +1,57 @@
+# Library Management System V: 3.0
+# Created by: Rownak Deb Kabya & Marcos Blanco-Leon
+# Email: rownak.kabya@stud.th-deg.de
+# Email: marcos.blanco-Leon@stud.th-deg.de
+# This code reads and reopens the journal files written next to a saved library.
+#
+# A journal has one [key, book] record per line, book None means removed.
+# A crash in the middle of a write leaves a torn last line. It is cut off
+# before the journal is appended to again, otherwise the next record would
+# be glued onto it and both would be lost on the next load.
+
+import json
+import os
+
+# Cuts a journal back to the end of its last complete line
+def repair_journal(journal_path):
+    try:
+        file = open(journal_path, 'r+b')
+    except FileNotFoundError:
+        return
+    with file:
+        size = end = file.seek(0, os.SEEK_END)
+        keep = 0
+        while end > 0:
+            start = max(0, end - 65536)
+            file.seek(start)
+            newline = file.read(end - start).rfind(b'\n')
+            if newline >= 0:
+                keep = start + newline + 1
+                break
+            end = start
+        if keep != size:
+            file.truncate(keep)
+
+# Opens a journal for appending, after cutting off a torn last line
+def open_journal(journal_path):
+    repair_journal(journal_path)
+    return open(journal_path, 'a')
+
+# Yields the (key, book) records of a journal file
+def read_journal(journal_path):
+    with open(journal_path, 'r') as file:
+        for line in file:
+            try:
+                key, book = json.loads(line)
+            except ValueError:
+                # Torn line from a crash while writing, the records after it still count
+                continue
+            yield key, book
+
+# Applies a journal file on top of a loaded library dict
+def replay_journal(books, journal_path):
+    for key, book in read_journal(journal_path):
+        if book is None:
+            books.pop(key, None)
+        else:
+            books[key] = book
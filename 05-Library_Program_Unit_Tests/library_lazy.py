@@ -0,0 +1,216 @@
+# Library Management System V: 3.0
+# Created by: Rownak Deb Kabya & Marcos Blanco-Leon
+# Email: rownak.kabya@stud.th-deg.de
+# Email: marcos.blanco-Leon@stud.th-deg.de
+# This code opens a saved library file without loading it, books are read one at a time on demand.
+#
+# The first open scans the file once and writes a sidecar index next to it
+# (file + '.offsets'): the size and modification time of the file, then the
+# byte offset and length of every book record, then the keys in file order.
+# Later opens only read the sidecar. A sidecar that no longer matches its
+# file is rebuilt.
+#
+# The file stays the source of truth: changes are appended to its journal
+# (file + '.journal', the same records save_file_model() writes), which a
+# normal load replays on top of the file.
+
+import json
+import os
+import re
+import struct
+import threading
+from array import array
+from library_journal import open_journal, read_journal
+
+MAGIC = b'LIBOFFS1'
+HEADER = struct.Struct('<8sQQQ')
+
+# Yields (key, start, end) byte ranges of the book records of a library file
+def scan_records(file, chunk_size=1 << 20):
+    # Decoded as latin-1, one character per byte, so text positions are file
+    # offsets. JSON syntax is ASCII, so the records still parse.
+    decode = json.JSONDecoder().raw_decode
+    skip = re.compile(r'[ \t\r\n]*').match
+    buf = ''
+    base = 0
+    pos = 0
+    eof = False
+
+    def more():
+        nonlocal buf, base, pos, eof
+        data = file.read(chunk_size)
+        eof = not data
+        base += pos
+        buf, pos = buf[pos:] + data.decode('latin-1'), 0
+
+    more()
+    pos = skip(buf).end()
+    if buf[pos:pos + 1] != '{':
+        raise ValueError('Expected { at the start of the library file')
+    pos = skip(buf, pos + 1).end()
+    if buf[pos:pos + 1] == '}':
+        return
+    # One record per round; on a cut off record read on and parse it again
+    while True:
+        if not eof and len(buf) - pos < chunk_size:
+            more()
+        try:
+            key, p = decode(buf, skip(buf, pos).end())
+            p = skip(buf, p).end()
+            if buf[p:p + 1] != ':':
+                raise ValueError(f'Expected : after {key!r} in library file')
+            start = skip(buf, p + 1).end()
+            _, end = decode(buf, start)
+            p = skip(buf, end).end()
+            sep = buf[p:p + 1]
+            if sep not in (',', '}'):
+                raise ValueError(f'Expected , or }} in library file, found {sep or "end of file"!r}')
+        except ValueError:
+            if eof:
+                raise
+            more()
+            continue
+        if not key.isascii():
+            key = json.loads(buf[skip(buf, pos).end():start].rstrip(' \t\r\n:').encode('latin-1'))
+        yield key, base + start, base + end
+        pos = p + 1
+        if sep == '}':
+            return
+
+# Size and modification time that tie a sidecar to its file
+def file_stamp(file_path):
+    info = os.stat(file_path)
+    return info.st_size, info.st_mtime_ns
+
+# Scans the library file and writes its sidecar, returns (keys, starts, lengths)
+def build_offsets(file_path):
+    keys = []
+    starts = array('Q')
+    lengths = array('I')
+    with open(file_path, 'rb') as file:
+        for key, start, end in scan_records(file):
+            keys.append(key)
+            starts.append(start)
+            lengths.append(end - start)
+    size, mtime = file_stamp(file_path)
+    with open(file_path + '.offsets.tmp', 'wb') as side:
+        side.write(HEADER.pack(MAGIC, size, mtime, len(keys)))
+        side.write(starts.tobytes())
+        side.write(lengths.tobytes())
+        side.write(json.dumps(keys, separators=(',', ':')).encode('utf-8'))
+    os.replace(file_path + '.offsets.tmp', file_path + '.offsets')
+    return keys, starts, lengths
+
+# Reads the sidecar, None if there is none or it belongs to an older version of the file
+def read_offsets(file_path):
+    try:
+        with open(file_path + '.offsets', 'rb') as side:
+            magic, size, mtime, count = HEADER.unpack(side.read(HEADER.size))
+            if magic != MAGIC or (size, mtime) != file_stamp(file_path):
+                return None
+            starts = array('Q')
+            starts.frombytes(side.read(8 * count))
+            lengths = array('I')
+            lengths.frombytes(side.read(4 * count))
+            keys = json.loads(side.read())
+    except (OSError, ValueError, struct.error):
+        return None
+    if len(keys) != count or len(starts) != count or len(lengths) != count:
+        return None
+    return keys, starts, lengths
+
+class LazyLibrary:
+    # A saved library opened read-on-demand: the sidecar gives the byte range
+    # of every book, books changed since (the journal) are kept in memory.
+    def __init__(self, file_path):
+        self.path = file_path
+        offsets = read_offsets(file_path) or build_offsets(file_path)
+        keys, self.starts, self.lengths = offsets
+        self.rows = dict(zip(keys, range(len(keys))))
+        self.file = open(file_path, 'rb')
+        # Searches read books side by side, one seek and read at a time
+        self.file_lock = threading.Lock()
+        # Books changed since the file was written, None means removed
+        self.changed = {}
+        self.count = len(self.rows)
+        for journal_path in (file_path + '.journal.old', file_path + '.journal'):
+            if os.path.exists(journal_path):
+                for key, book in read_journal(journal_path):
+                    self.note(key, book)
+        self.journal = open_journal(file_path + '.journal')
+
+    # Keeps the count in step with one changed book
+    def note(self, key, book):
+        existed = key in self
+        self.changed[key] = book
+        self.count += (book is not None) - existed
+
+    # Number of books, without reading any
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, key):
+        if key in self.changed:
+            return self.changed[key] is not None
+        return key in self.rows
+
+    # The book stored under key, read from the file, or None
+    def get(self, key):
+        if key in self.changed:
+            return self.changed[key]
+        row = self.rows.get(key)
+        if row is None:
+            return None
+        with self.file_lock:
+            self.file.seek(self.starts[row])
+            data = self.file.read(self.lengths[row])
+        return json.loads(data)
+
+    # Stores a book by appending it to the journal, the file itself is not rewritten
+    def put(self, key, book):
+        self.journal.write(json.dumps([key, book], separators=(',', ':')) + '\n')
+        self.journal.flush()
+        self.note(key, book)
+
+    # Changes the status of one book, False if there is no such book
+    def set_status(self, key, status):
+        book = self.get(key)
+        if book is None:
+            return False
+        self.put(key, dict(book, status=status))
+        return True
+
+    # Writes the whole library to a new file: unchanged records are copied from this file as they are
+    def write_to(self, file_path):
+        encode = json.JSONEncoder(separators=(',', ':')).encode
+        with open(file_path + '.tmp', 'wb') as out:
+            out.write(b'{')
+            sep = b''
+            for key, row in self.rows.items():
+                if key in self.changed:
+                    book = self.changed[key]
+                    if book is None:
+                        continue
+                    data = encode(book).encode('utf-8')
+                else:
+                    with self.file_lock:
+                        self.file.seek(self.starts[row])
+                        data = self.file.read(self.lengths[row])
+                out.write(sep + encode(key).encode('utf-8') + b':' + data)
+                sep = b','
+            # Books added since the file was written come last
+            for key, book in self.changed.items():
+                if book is not None and key not in self.rows:
+                    out.write(sep + encode(key).encode('utf-8') + b':' + encode(book).encode('utf-8'))
+                    sep = b','
+            out.write(b'}')
+        os.replace(file_path + '.tmp', file_path)
+
+    # Makes sure the journaled changes are on disk
+    def sync(self):
+        self.journal.flush()
+        os.fsync(self.journal.fileno())
+
+    def close(self):
+        self.file.close()
+        self.journal.close()
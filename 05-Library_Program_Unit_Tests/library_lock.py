@@ -0,0 +1,113 @@
+# Library Management System V: 3.0
+# Created by: Rownak Deb Kabya & Marcos Blanco-Leon
+# Email: rownak.kabya@stud.th-deg.de
+# Email: marcos.blanco-Leon@stud.th-deg.de
+# This code is the lock that lets several threads use the library at the same time.
+#
+# Searches only read the library, so any number of them may run at once. A
+# change waits until the running searches are done and keeps new ones out
+# while it runs, so a search never sees half of a change. Once a change is
+# waiting no new search starts, so a stream of searches cannot hold it off.
+#
+# Both sides can be taken again by the thread holding them: a model function
+# may call another one. Changing the library while holding only the read
+# side would wait for itself, that raises RuntimeError instead.
+
+import functools
+import threading
+
+class RWLock:
+    def __init__(self):
+        self.condition = threading.Condition(threading.Lock())
+        self.readers = 0
+        self.writer = None
+        self.writer_depth = 0
+        self.writers_waiting = 0
+        # How often each thread holds the read side
+        self.local = threading.local()
+        self.read_side = LockSide(self.acquire_read, self.release_read)
+        self.write_side = LockSide(self.acquire_write, self.release_write)
+
+    # For "with lock.read():", shared with other readers
+    def read(self):
+        return self.read_side
+
+    # For "with lock.write():", held alone
+    def write(self):
+        return self.write_side
+
+    def acquire_read(self):
+        # A thread that is changing the library may also read it
+        if self.writer == threading.get_ident():
+            return
+        depth = getattr(self.local, 'depth', 0)
+        if not depth:
+            with self.condition:
+                while self.writer is not None or self.writers_waiting:
+                    self.condition.wait()
+                self.readers += 1
+        self.local.depth = depth + 1
+
+    def release_read(self):
+        if self.writer == threading.get_ident():
+            return
+        self.local.depth -= 1
+        if not self.local.depth:
+            with self.condition:
+                self.readers -= 1
+                if not self.readers:
+                    self.condition.notify_all()
+
+    def acquire_write(self):
+        me = threading.get_ident()
+        if self.writer == me:
+            self.writer_depth += 1
+            return
+        if getattr(self.local, 'depth', 0):
+            raise RuntimeError('The library cannot be changed while this thread is reading it')
+        with self.condition:
+            self.writers_waiting += 1
+            try:
+                while self.writer is not None or self.readers:
+                    self.condition.wait()
+            finally:
+                self.writers_waiting -= 1
+            self.writer = me
+            self.writer_depth = 1
+
+    def release_write(self):
+        if self.writer != threading.get_ident():
+            raise RuntimeError('The library lock was released by a thread that does not hold it')
+        self.writer_depth -= 1
+        if not self.writer_depth:
+            with self.condition:
+                self.writer = None
+                self.condition.notify_all()
+
+    # Decorator for a function that only reads the library
+    def reads(self, function):
+        @functools.wraps(function)
+        def locked(*args, **kwargs):
+            with self.read_side:
+                return function(*args, **kwargs)
+        return locked
+
+    # Decorator for a function that changes the library
+    def writes(self, function):
+        @functools.wraps(function)
+        def locked(*args, **kwargs):
+            with self.write_side:
+                return function(*args, **kwargs)
+        return locked
+
+# One side of the lock as a context manager
+class LockSide:
+    def __init__(self, acquire, release):
+        self.acquire = acquire
+        self.release = release
+
+    def __enter__(self):
+        self.acquire()
+
+    def __exit__(self, *exc):
+        self.release()
@@ -0,0 +1,74 @@
+# Library Management System V: 3.0
+# Created by: Rownak Deb Kabya & Marcos Blanco-Leon
+# Email: rownak.kabya@stud.th-deg.de
+# Email: marcos.blanco-Leon@stud.th-deg.de
+# This code reads many library files at once on worker processes, for merge_files_model().
+#
+# Parsing JSON is the slow part of loading and each file parses on its own,
+# so the files are read on a process pool, a few ahead of the one being
+# merged. Only the merging itself runs in the app's process, one file after
+# the other in the order given, so the result does not depend on which
+# worker finished first.
+#
+# The workers are spawned. A spawned worker imports this module and also
+# the app's main module again, under another name, so the main module must
+# not do anything at import time. library_controller.py only builds the
+# window under its "if __name__ == '__main__':" guard, so a worker loads
+# the app's modules but opens no window. This module itself imports nothing
+# of the app, read_library_file() needs only json and the journal reader.
+
+import json
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from library_journal import replay_journal
+
+# The library files to merge, a directory stands for its .json files in name order
+def library_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(os.path.join(path, name) for name in sorted(os.listdir(path))
+                         if name.lower().endswith('.json'))
+        else:
+            files.append(path)
+    return files
+
+# Reads one library file with the changes in its journal, returns (path, books, error)
+def read_library_file(path):
+    try:
+        with open(path, 'r') as file:
+            books = json.load(file)
+        if not isinstance(books, dict):
+            return path, None, 'Not a library file.'
+        for journal_path in (path + '.journal.old', path + '.journal'):
+            if os.path.exists(journal_path):
+                replay_journal(books, journal_path)
+        return path, books, None
+    except json.JSONDecodeError:
+        return path, None, 'Invalid JSON format.'
+    except OSError as e:
+        return path, None, e.strerror or str(e)
+
+# Yields read_library_file() for every file in order, read on up to workers processes
+def read_library_files(files, workers=None):
+    workers = min(workers or os.cpu_count() or 1, len(files))
+    if workers < 2:
+        for path in files:
+            yield read_library_file(path)
+        return
+    # Spawned, the app's threads and Tk are not copied into the workers
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        # At most one file per worker waits to be merged, so memory stays at a few files
+        pending = deque()
+        for path in files:
+            pending.append(pool.submit(read_library_file, path))
+            if len(pending) > workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+# What makes two books the same book, whatever number they are stored under
+def book_signature(book):
+    return book.get('title', '').strip().lower(), book.get('author', '').strip().lower(), str(book.get('year', '')).strip()
@@ -4,12 +4,77 @@
 # Email: marcos.blanco-Leon@stud.th-deg.de
 # This code is the model for the Library Management System.
 
-from random import randint, choice
+from random import randint, choice, Random
+import time
 import pyocr.builders
 import pyocr
 import json
+import os
+import threading
+from collections import Counter
+from library_index import TrigramIndex, TitleIndex
+from library_lazy import LazyLibrary
+from library_lock import RWLock
+from library_journal import replay_journal
+from library_merge import book_signature, library_files, read_library_files
 
-library = {}
+# The books by key. Every change to the dict itself counts up its version, so the
+# indexes and counts can tell when books were changed without going through the model.
+class Books(dict):
+    version = 0
+
+    def __setitem__(self, key, book):
+        dict.__setitem__(self, key, book)
+        self.version += 1
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        self.version += 1
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def pop(self, *args):
+        self.version += 1
+        return dict.pop(self, *args)
+
+    def popitem(self):
+        self.version += 1
+        return dict.popitem(self)
+
+    def setdefault(self, key, default=None):
+        self.version += 1
+        return dict.setdefault(self, key, default)
+
+    def update(self, *args, **kwargs):
+        dict.update(self, *args, **kwargs)
+        self.version += 1
+
+    def clear(self):
+        dict.clear(self)
+        self.version += 1
+
+library = Books()
+
+# The library version each index and the counts were last up to date with, see Books
+synced = {'search': -1, 'title': -1, 'stats': -1}
+
+# Searches share it, changes hold it alone, see library_lock.py
+library_lock = RWLock()
+
+# Optional trigram index for title/author searches, see enable_search_index()
+search_index = None
+
+# Index of distinct titles for approximate matches, built by the first fuzzy_search_model()
+title_index = None
+
+# A large saved file opened read on demand instead of loaded, see open_lazy_model()
+lazy_library = None
+
+# Append-only journal of changes since the last full save, see save_file_model()
+journal = {'path': None, 'file': None, 'records': 0, 'compactor': None}
+journal_compact_after = 100_000
 
 # Lists for generating 
 adj = ["Dusk", "Dawn", "Ancient", "Lost", "Sacred", "Salvation"]
@@ -23,12 +88,264 @@ surname = ["jerrey", "Kein", "Garry", "Frow", "Grpw", "Arrow", "Aron", "Baron",
 # Book Status
 status_base = ["available", "lent out", "missing"]
 
-status_count = []
+# Keys of books removed by vacuum_model(), new books get them before new numbers
+free_keys = []
+
+# Open savepoints, each a list of the keys added since it was taken, see savepoint_model()
+savepoints = []
+
+# Running counts per status, year and author, kept current by the model functions
+stats = {'books': 0, 'status': Counter(), 'year': Counter(), 'author': Counter()}
+
+# Every title and author the lists above can make, so a batch is drawn with one choices() call per column
+all_titles = [a + " in " + n + " of the " + t for a in adj for n in noun for t in themes]
+all_authors = [n + " " + s for n in name for s in surname]
+all_years = [str(y) for y in range(1900, 2024)]
 
 # Returns the library count
+@library_lock.reads
 def book_count():
+    if lazy_library is not None:
+        return len(lazy_library)
     return len(library)
 
+# Opens a saved library without loading it, books are read from the file when needed
+@library_lock.writes
+def open_lazy_model(file_path):
+    global lazy_library
+    if not file_path:
+        return False, 'No file selected.'
+    try:
+        close_lazy_model()
+        # The file's journal gets the changes now, not the books in memory
+        close_journal()
+        library.clear()
+        rebuild_stats()
+        lazy_library = LazyLibrary(file_path)
+        return True, f'{len(lazy_library)} books opened from {os.path.basename(file_path)}.'
+    except FileNotFoundError:
+        return False, "File not found. Please select a valid file."
+    except ValueError:
+        return False, "Failed to open library. Invalid JSON format."
+
+# Goes back to the books in memory
+@library_lock.writes
+def close_lazy_model():
+    global lazy_library
+    if lazy_library is not None:
+        lazy_library.close()
+        lazy_library = None
+
+# True while a file is opened on demand instead of loaded
+def lazy_mode_model():
+    return lazy_library is not None
+
+# The book stored under a book number, or None
+@library_lock.reads
+def get_book_model(book_number):
+    if lazy_library is not None:
+        return lazy_library.get(book_number)
+    return library.get(book_number)
+
+# Turns on the trigram index used by search_books_model
+@library_lock.writes
+def enable_search_index():
+    global search_index
+    search_index = TrigramIndex()
+    search_index.rebuild(library)
+    synced['search'] = library.version
+
+# Rebuilds the index when the library was changed without going through the model.
+# The sync_ functions are called before the read lock is taken, a rebuild holds the write lock.
+def sync_search_index():
+    if search_index is not None and synced['search'] != library.version:
+        with library_lock.write():
+            if search_index is not None and synced['search'] != library.version:
+                search_index.rebuild(library)
+                synced['search'] = library.version
+
+# Builds the title index, or rebuilds it when the library was changed without going through the model
+def sync_title_index():
+    global title_index
+    if title_index is None or synced['title'] != library.version:
+        with library_lock.write():
+            if title_index is None:
+                title_index = TitleIndex()
+                title_index.rebuild(library)
+            elif synced['title'] != library.version:
+                title_index.rebuild(library)
+            synced['title'] = library.version
+
+# Called after a change made through the model, which keeps the indexes current itself:
+# an index that was up to date before the change still is
+def still_synced(before):
+    for name, version in synced.items():
+        if version == before:
+            synced[name] = library.version
+
+# Fields a book is counted under, a deleted book only counts as deleted
+def counted_fields(book):
+    return ('status',) if book.get('status') == 'deleted' else ('status', 'year', 'author')
+
+# Adds (sign 1) or takes away (sign -1) one book from the running counts
+def count_book(book, sign):
+    stats['books'] += sign
+    for field in counted_fields(book):
+        if field in book:
+            stats[field][book[field]] += sign
+
+# Recounts every book
+def rebuild_stats():
+    stats['books'] = 0
+    for field in ('status', 'year', 'author'):
+        stats[field].clear()
+        stats[field].update(book[field] for book in library.values() if field in counted_fields(book) and field in book)
+    stats['books'] = len(library)
+    synced['stats'] = library.version
+
+# Recounts when the library was changed without going through the model
+def sync_stats():
+    if synced['stats'] != library.version:
+        with library_lock.write():
+            if synced['stats'] != library.version:
+                rebuild_stats()
+
+# Stores a book under a key and keeps the search index and counts current
+def put_book(key, book):
+    before = library.version
+    if key not in library:
+        for added in savepoints:
+            added.append(key)
+    if key in library:
+        count_book(library[key], -1)
+    if search_index is not None:
+        if key in library:
+            search_index.remove(key, library[key])
+        search_index.add(key, book)
+    if title_index is not None:
+        if key in library:
+            title_index.remove(key, library[key])
+        title_index.add(key, book)
+    library[key] = book
+    still_synced(before)
+    count_book(book, 1)
+    log_change(key, book)
+
+# Stores many new books at once with the same bookkeeping as put_book, once per batch instead of once per book
+def put_books(books):
+    books = dict(books)
+    if any(key in library for key in books):
+        # Replacing books has to take the old ones out of the counts and indexes first
+        for key, book in books.items():
+            put_book(key, book)
+        return
+    before = library.version
+    library.update(books)
+    still_synced(before)
+    for added in savepoints:
+        added.extend(books)
+    stats['books'] += len(books)
+    stats['status'].update(book['status'] for book in books.values())
+    for field in ('year', 'author'):
+        stats[field].update(book[field] for book in books.values() if book['status'] != 'deleted')
+    if search_index is not None:
+        search_index.extend(books)
+    if title_index is not None:
+        for key, book in books.items():
+            title_index.add(key, book)
+    if journal['file'] is not None:
+        encode = json.JSONEncoder(separators=(',', ':')).encode
+        journal['file'].writelines([encode([key, book]) + '\n' for key, book in books.items()])
+        journal['records'] += len(books)
+
+# Picks count unused keys: freed ones first, then numbered on from the end of the library
+def new_keys(prefix, count):
+    keys = []
+    while free_keys and len(keys) < count:
+        key = free_keys.pop()
+        if key not in library:
+            keys.append(key)
+    number = len(library) + len(keys) + 1
+    while len(keys) < count:
+        key = prefix + str(number)
+        if key not in library:
+            keys.append(key)
+        number += 1
+    return keys
+
+# Starts recording the keys of the books added from now on, rollback_model() removes them again
+def savepoint_model():
+    added = []
+    savepoints.append(added)
+    return added
+
+# Stops recording for a savepoint and keeps its books
+def release_model(savepoint):
+    for i, added in enumerate(savepoints):
+        if added is savepoint:
+            del savepoints[i]
+            return
+
+# Removes the books added since a savepoint by key, newest first, in O(books added).
+# Also takes any list of keys, e.g. the books one generator added.
+@library_lock.writes
+def rollback_model(savepoint):
+    release_model(savepoint)
+    before = library.version
+    for key in reversed(savepoint):
+        # Books removed since, e.g. by vacuum_model(), are already gone
+        book = library.pop(key, None)
+        if book is None:
+            continue
+        count_book(book, -1)
+        if search_index is not None:
+            search_index.remove(key, book)
+        if title_index is not None:
+            title_index.remove(key, book)
+        log_change(key, None)
+    still_synced(before)
+    savepoint.clear()
+
+# Appends one [key, book] record to the journal, book None means removed
+def log_change(key, book):
+    if journal['file'] is not None:
+        journal['file'].write(json.dumps([key, book], separators=(',', ':')) + '\n')
+        journal['records'] += 1
+
+# Folds sealed journal segments into the saved file, runs on a background thread
+def fold_journal(file_path, segments):
+    with open(file_path, 'r') as file:
+        books = json.load(file)
+    for segment in segments:
+        replay_journal(books, segment)
+    with open(file_path + '.tmp', 'w') as file:
+        json.dump(books, file, separators=(',', ':'))
+    os.replace(file_path + '.tmp', file_path)
+    for segment in segments:
+        os.remove(segment)
+
+# Seals the journal and starts folding it into the saved file
+def compact_journal():
+    compactor = journal['compactor']
+    if compactor is not None:
+        compactor.join()
+    file_path = journal['path']
+    journal['file'].close()
+    sealed = file_path + '.journal.old'
+    os.replace(file_path + '.journal', sealed)
+    journal['file'] = open(file_path + '.journal', 'w')
+    journal['records'] = 0
+    journal['compactor'] = threading.Thread(target=fold_journal, args=(file_path, [sealed]), daemon=True)
+    journal['compactor'].start()
+
+# Stops journaling, waiting for a running compaction
+def close_journal():
+    if journal['compactor'] is not None:
+        journal['compactor'].join()
+    if journal['file'] is not None:
+        journal['file'].close()
+    journal.update(path=None, file=None, records=0, compactor=None)
+
 # Function to upload image
 def upload_image_model(recognized_text):
     try:
@@ -39,12 +356,27 @@ def upload_image_model(recognized_text):
         return False, f"Failed to process image. {str(e)}"
 
 # Function for loading books from a JSON file
+@library_lock.writes
 def load_file_model(file_path):
     try:
         if file_path:
+            close_lazy_model()
             with open(file_path, 'r') as file:
                 library_load = json.load(file)
+            # Changes saved since the last full save
+            for journal_path in (file_path + '.journal.old', file_path + '.journal'):
+                if os.path.exists(journal_path):
+                    replay_journal(library_load, journal_path)
+            # The loaded books are not in the journal, so the next save has to write the whole library
+            close_journal()
             library.update(library_load)
+            rebuild_stats()
+            if search_index is not None:
+                search_index.rebuild(library)
+            if title_index is not None:
+                title_index.rebuild(library)
+            for name in synced:
+                synced[name] = library.version
             return True, 'Library loaded successfully!'
         return False, 'No file selected.'
     except json.JSONDecodeError:
@@ -52,81 +384,299 @@ def load_file_model(file_path):
     except FileNotFoundError:
         return False, "File not found. Please select a valid file."
 
+# Fields every merged book must have
+book_fields = {'title', 'author', 'year', 'status'}
+
+# Adds the books of one read file, skipping ones already there and renumbering taken numbers
+def merge_books(path, books, seen, report):
+    kept = []
+    moved = []
+    skipped = duplicates = 0
+    for key, book in books.items():
+        # Deleted books and entries that are not whole books are not merged
+        if type(book) is not dict or not book.keys() >= book_fields or book['status'] == 'deleted':
+            skipped += 1
+            continue
+        signature = book_signature(book)
+        if signature in seen:
+            duplicates += 1
+            continue
+        seen.add(signature)
+        if key in library:
+            moved.append((key, book))
+        else:
+            kept.append((key, book))
+    report['skipped'] += skipped
+    report['duplicates'] += duplicates
+    put_books(kept)
+    new = new_keys('', len(moved))
+    put_books(zip(new, (book for _, book in moved)))
+    report['conflicts'].extend((path, key, new_key) for (key, _), new_key in zip(moved, new))
+    report['added'] += len(kept) + len(moved)
+
+# Merges library files, or directories of them, into the library; files are read in parallel.
+# Returns (success, message, report), report has the counts and every (file, number, new number) renumbered.
+def merge_files_model(paths, workers=None):
+    if lazy_library is not None:
+        return False, "Books cannot be added to a file opened on demand, load it first!", None
+    files = library_files(paths)
+    if not files:
+        return False, 'No file selected.', None
+    started = time.perf_counter()
+    report = {'files': 0, 'books': 0, 'added': 0, 'duplicates': 0, 'skipped': 0, 'conflicts': [], 'errors': []}
+    with library_lock.read():
+        # Books already in the library are duplicates too
+        seen = {book_signature(book) for book in library.values() if book.get('status') != 'deleted'}
+    for path, books, error in read_library_files(files, workers):
+        if error is not None:
+            report['errors'].append((path, error))
+            continue
+        report['files'] += 1
+        report['books'] += len(books)
+        # One file at a time, searches can run in between
+        with library_lock.write():
+            merge_books(path, books, seen, report)
+    report['seconds'] = time.perf_counter() - started
+    report['books_per_sec'] = report['books'] / report['seconds'] if report['seconds'] else 0.0
+    message = (f"{report['added']} books merged from {report['files']} of {len(files)} files "
+               f"in {report['seconds']:.1f} s ({report['books_per_sec']:,.0f} books/s). "
+               f"{report['duplicates']} duplicates skipped, {len(report['conflicts'])} books renumbered.")
+    if report['errors']:
+        message += ' Not read: ' + ', '.join(f'{os.path.basename(path)} ({error})' for path, error in report['errors'])
+    return report['files'] > 0, message, report
+
 # Function for saving library as a JSON file
+@library_lock.writes
 def save_file_model(file_path):
+    global lazy_library
     try:
+        if file_path and lazy_library is not None:
+            # The books are in the opened file and its journal, not in the library dict
+            if os.path.abspath(file_path) == os.path.abspath(lazy_library.path):
+                lazy_library.sync()
+                return True, 'Library saved successfully!'
+            lazy_library.write_to(file_path)
+            for stale in (file_path + '.journal.old', file_path + '.journal'):
+                if os.path.exists(stale):
+                    os.remove(stale)
+            # Go on with the new file, like a normal save does
+            close_lazy_model()
+            lazy_library = LazyLibrary(file_path)
+            return True, 'Library saved successfully!'
+        if file_path and file_path == journal['path']:
+            # Saving to the same file again only has to flush the journal
+            journal['file'].flush()
+            os.fsync(journal['file'].fileno())
+            if journal['records'] >= journal_compact_after:
+                compact_journal()
+            return True, 'Library saved successfully!'
         if file_path:
+            close_journal()
             with open(file_path, 'w') as file:
-                json.dump(library, file, indent=4)
+                json.dump(library, file, separators=(',', ':'))
+            for stale in (file_path + '.journal.old', file_path + '.journal'):
+                if os.path.exists(stale):
+                    os.remove(stale)
+            journal.update(path=file_path, file=open(file_path + '.journal', 'w'))
             return True, 'Library saved successfully!'
         return False, 'No file selected.'
     except Exception as e:
         return False, f"Failed to save library. {str(e)}"
 
 # Function for adding books to library
+@library_lock.writes
 def add_book_model(title, author, year, status):
     book_attribute_value = [title, author, year, status]
+    if lazy_library is not None:
+        return False, "Books cannot be added to a file opened on demand, load it first!"
     if title and author and year.isdigit():
         if status not in status_base:
             return False, "Status is not valid!"
         else:
             book_attribute = ['title', 'author', 'year', 'status']
-            library[str(len(library) + 1)] = {book_attribute[i]: book_attribute_value[i] for i in range(len(book_attribute))}
+            put_book(new_keys('', 1)[0], {book_attribute[i]: book_attribute_value[i] for i in range(len(book_attribute))})
             return True, "Book " + title + " Added!"
     else:
         return False, "All Boxes need to be filled correctly!"
 
+# Adds many books at once, nothing is added if one of them is not valid
+@library_lock.writes
+def add_books_bulk_model(books):
+    rows = []
+    for title, author, year, status in books:
+        if not (title and author and year.isdigit()):
+            return False, "All Boxes need to be filled correctly!"
+        if status not in status_base:
+            return False, "Status is not valid!"
+        rows.append({'title': title, 'author': author, 'year': year, 'status': status})
+    put_books(zip(new_keys('', len(rows)), rows))
+    return True, str(len(rows)) + " Books Added!"
+
 # Function to Generate books using string random functions
-def generate_books_model():
-    pre_lib = library.copy()
+def generate_books_model(seed=None, batch_size=5000):
+    # Only these books are removed on cancel, not ones added by hand in between
+    generated = []
     target = 1_000_000
     index = 0
     not_cancelled = True
+    rng = Random(seed)
+    seconds = 0.0
 
+    @library_lock.writes
     def generate_batch():
-        nonlocal index, not_cancelled
-        for _ in range(1000):
-            if index >= target or not_cancelled == False:
-                break
-            title = adj[randint(0, len(adj)-1)] + " in " + noun[randint(0, len(noun)-1)] + " of the " + themes[randint(0, len(themes)-1)]
-            author = name[randint(0, len(name)-1)] + " " + surname[randint(0, len(surname)-1)]
-            year = str(randint(1900, 2023))
-            status = status_base[randint(0, 2)]
-            library['book ' + str(len(library) + 1)] = {'title': title, 'author': author, 'year': year, 'status': status}
-            index += 1
-        return index, not_cancelled, (index / target) * 100
+        nonlocal index, not_cancelled, seconds
+        k = min(batch_size, target - index) if not_cancelled else 0
+        started = time.perf_counter()
+        titles = rng.choices(all_titles, k=k)
+        authors = rng.choices(all_authors, k=k)
+        years = rng.choices(all_years, k=k)
+        statuses = rng.choices(status_base, k=k)
+        keys = new_keys('book ', k)
+        put_books(zip(keys, [{'title': t, 'author': a, 'year': y, 'status': s}
+                             for t, a, y, s in zip(titles, authors, years, statuses)]))
+        generated.extend(keys)
+        index += k
+        seconds += time.perf_counter() - started
+        rate = index / seconds if seconds else 0.0
+        return index, not_cancelled, (index / target) * 100, rate
 
+    @library_lock.writes
     def cancel_generation():
-        nonlocal not_cancelled, pre_lib
+        nonlocal not_cancelled
         not_cancelled = False
-        library.clear()
-        library.update(pre_lib)
+        rollback_model(generated)
         return not_cancelled
 
     return generate_batch, cancel_generation
 
 # Functions for the buttons
+@library_lock.writes
 def delete_book_model(title):
-    for key, val in list(library.items()):
-        if val['title'].lower() == title.lower():
-            library[key] = {'status': 'deleted'}
+    # The title index finds the book without looking at every other one
+    sync_title_index()
+    for key in title_index.find(title):
+        val = library.get(key)
+        if val is not None and val['title'].lower() == title.lower():
+            # The book stays as a tombstone until vacuum_model(), so its key is not handed out again
+            put_book(key, dict(val, status='deleted'))
             return True, f'Book {title} deleted!'
     return False, "Book with Title not found!"
 
+# Removes deleted books for good, every other book keeps its key
+@library_lock.writes
+def vacuum_model():
+    dead = [key for key, val in library.items() if val.get('status') == 'deleted']
+    if not dead:
+        return False, 'No deleted books to remove.'
+    before = library.version
+    for key in dead:
+        book = library.pop(key)
+        count_book(book, -1)
+        if search_index is not None:
+            search_index.remove(key, book)
+        if title_index is not None:
+            title_index.remove(key, book)
+        log_change(key, None)
+    # A dict keeps the room of removed entries, copy the rest into a new table
+    live = list(library.items())
+    library.clear()
+    library.update(live)
+    still_synced(before)
+    # The freed keys are handed out again before new ones, oldest first
+    free_keys.extend(reversed(dead))
+    return True, f'{len(dead)} deleted books removed.'
+
+
 # Function to change the status of a book
+@library_lock.writes
 def change_status_model(book_number, new_status):
+    if lazy_library is not None:
+        if new_status not in status_base:
+            return False, 'Invalid Input As Status!'
+        if not lazy_library.set_status(book_number, new_status.lower()):
+            return False, 'Book not found!'
+        return True, "Status changed successfully!"
     if new_status in status_base:
+        count_book(library[book_number], -1)
+        if title_index is not None:
+            # A deleted book may come back, it is only indexed while it is not deleted
+            title_index.remove(book_number, library[book_number])
+            title_index.add(book_number, dict(library[book_number], status=new_status.lower()))
         library[book_number]['status'] = new_status.lower()
+        count_book(library[book_number], 1)
+        log_change(book_number, library[book_number])
         return True, "Status changed successfully!"
     return False, 'Invalid Input As Status!'
 
+# Number of books per status, from the running counts
+def status_counts_model():
+    sync_stats()
+    with library_lock.read():
+        return {status: n for status, n in stats['status'].items() if n > 0}
+
+# Number of books per year, oldest first
+def year_histogram_model():
+    sync_stats()
+    with library_lock.read():
+        years = [(year, n) for year, n in stats['year'].items() if n > 0]
+    return sorted(years, key=lambda item: int(item[0]) if str(item[0]).isdigit() else 0)
+
+# The authors with the most books
+def top_authors_model(count=10):
+    sync_stats()
+    with library_lock.read():
+        return [(author, n) for author, n in stats['author'].most_common(count) if n > 0]
+
 # Searching books
 def search_books_model(title, author, year, status):
+    sync_search_index()
+    with library_lock.read():
+        return dict(iter_search_books_model(title, author, year, status))
+
+# Yields the matching (key, book) pairs one by one, so results can be shown while the search runs
+def iter_search_books_model(title, author, year, status, page=1000):
+    sync_search_index()
+    with library_lock.read():
+        # Let the trigram index narrow down the keys worth checking
+        keys = library
+        if search_index is not None:
+            for field, text in (('title', title), ('author', author)):
+                if text:
+                    found = search_index.candidates(field, text)
+                    if found is not None:
+                        keys = found if keys is library else keys & found
+        # Copy the keys, the library may change while a background search runs
+        keys = list(keys)
+    # A page of keys at a time under the read lock, changes get in between pages
+    for start in range(0, len(keys), page):
+        matches = []
+        with library_lock.read():
+            for key in keys[start:start + page]:
+                val = library.get(key)
+                if val is None:
+                    continue
+                # Deleted books are only found when searching by status
+                if not status and val.get('status') == 'deleted':
+                    continue
+                # Books deleted by older versions are only {'status': 'deleted'}
+                if (title in val.get('title', '').lower() if title else True) and \
+                   (author in val.get('author', '').lower() if author else True) and \
+                   (year in val.get('year', '') if year else True) and \
+                   (status in val.get('status', '').lower() if status else True):
+                    matches.append((key, val))
+        yield from matches
+
+# Books whose title is close to the text, e.g. OCR output with misread letters, most similar first
+def fuzzy_search_model(text, limit=500, min_share=0.6):
+    sync_title_index()
     filtered = {}
-    for key, val in library.items():
-        if (title in val['title'].lower() if title else True) and \
-           (author in val['author'].lower() if author else True) and \
-           (year in val['year'] if year else True) and \
-           (status in val['status'].lower() if status else True):
-            filtered[key] = val
-    return filtered
\ No newline at end of file
+    with library_lock.read():
+        for score, title, keys in title_index.similar(text, min_share):
+            for key in sorted(keys):
+                if len(filtered) >= limit:
+                    return filtered
+                # The library may have changed since the index was synced
+                book = library.get(key)
+                if book is not None:
+                    filtered[key] = book
+    return filtered
@@ -7,7 +7,7 @@ from tkinter import messagebox, filedialog, simpledialog, ttk
 from tkinter import *
 
 # Function to create the main window and its components
-def create_main_window_view(book_count_value, save_cmd, load_cmd, generate_cmd, about_cmd, add_cmd, delete_cmd, lend_cmd, upload_cmd):
+def create_main_window_view(book_count_value, save_cmd, load_cmd, generate_cmd, about_cmd, add_cmd, delete_cmd, lend_cmd, upload_cmd, stats_cmd=None, vacuum_cmd=None, open_large_cmd=None, find_cmd=None, merge_cmd=None):
     
     # Create the main window
     window = Tk()
@@ -31,6 +31,14 @@ def create_main_window_view(book_count_value, save_cmd, load_cmd, generate_cmd,
     menu.add_cascade(label='File', menu=file_menu)
     file_menu.add_command(label='Save File', command=save_cmd)
     file_menu.add_command(label='Load File', command=load_cmd)
+    if open_large_cmd is not None:
+        file_menu.add_command(label='Open Large File', command=open_large_cmd)
+    if merge_cmd is not None:
+        file_menu.add_command(label='Merge Files', command=merge_cmd)
+    if find_cmd is not None:
+        file_menu.add_command(label='Find Book by Number', command=find_cmd)
+    if vacuum_cmd is not None:
+        file_menu.add_command(label='Remove Deleted Books', command=vacuum_cmd)
     file_menu.add_separator()
     file_menu.add_command(label='Exit', command=window.quit)
 
@@ -39,6 +47,12 @@ def create_main_window_view(book_count_value, save_cmd, load_cmd, generate_cmd,
     menu.add_cascade(label='Generate', menu=generate_menu)
     generate_menu.add_command(label='Generate books', command=generate_cmd)
 
+    # Statistics
+    if stats_cmd is not None:
+        stats_menu = Menu(menu)
+        menu.add_cascade(label='Statistics', menu=stats_menu)
+        stats_menu.add_command(label='Library Statistics', command=stats_cmd)
+
     # Help
     help_menu = Menu(menu)
     menu.add_cascade(label='Help', menu=help_menu)
@@ -113,6 +127,31 @@ def delete_book_view(confirm_cmd):
     
     Button(delete_window, text='Confirm', font=('Georgia', 13), fg='red', command=lambda: confirm_cmd(enter_title.get())).place(relx=0.5, rely=0.7, anchor=CENTER)
 
+# Window with the book counts per status, author and year
+def stats_view(status_counts, top_authors, year_histogram):
+    stats_window = Toplevel()
+    stats_window.title('Library Statistics')
+    stats_window.geometry('400x500')
+
+    Label(stats_window, text='Books per Status', font=('Georgia', 12)).pack(pady=(10, 2))
+    for status, count in status_counts.items():
+        Label(stats_window, text=f'{status}: {count}', font=('Georgia', 10)).pack()
+
+    Label(stats_window, text='Top Authors', font=('Georgia', 12)).pack(pady=(10, 2))
+    for author, count in top_authors:
+        Label(stats_window, text=f'{author}: {count}', font=('Georgia', 10)).pack()
+
+    Label(stats_window, text='Books per Year', font=('Georgia', 12)).pack(pady=(10, 2))
+    year_frame = Frame(stats_window)
+    year_frame.pack(fill=BOTH, expand=True, padx=10, pady=10)
+    year_scroll = Scrollbar(year_frame, orient=VERTICAL)
+    year_scroll.pack(side=RIGHT, fill=Y)
+    year_box = Listbox(year_frame, font=('Georgia', 10), yscrollcommand=year_scroll.set)
+    year_box.pack(side=LEFT, fill=BOTH, expand=True)
+    year_scroll.config(command=year_box.yview)
+    for year, count in year_histogram:
+        year_box.insert(END, f'{year}: {count}')
+
 # Progress window for the generation process
 def generate_books_view(cancel_cmd):
     progress_window = Toplevel()
@@ -163,6 +202,10 @@ def lend_receive_view(search_cmd, exit_cmd, double_click_cmd):
     # Connect the scrollbar with the listbox
     list_box_scroll.config(command=list_box.yview)
 
+    # Status line for searches
+    status_label = Label(list_window, text='', font=('Georgia', 9), anchor=W)
+    status_label.pack(fill=X, padx=10, pady=(0, 6))
+
     try:
         list_box.bind("<Double-Button-1>", double_click_cmd)
     except TclError:
@@ -170,7 +213,7 @@ def lend_receive_view(search_cmd, exit_cmd, double_click_cmd):
     except Exception as e:
         messagebox.showerror('Error', f'Operation failed due to: {e}')
 
-    return list_window, list_box
+    return list_window, list_box, status_label
 
 # Function to search books
 def search_books_view(search_cmd):
@@ -232,6 +275,7 @@ def display_search_results(filtered_books, search_title):
 
 # Function to update the list box with current library books
 def update_list_view(list_box, books):
+    stop_list_view(list_box)
     list_box.delete(0, END)
     keys = list(books.keys())
     index = 0
@@ -245,5 +289,16 @@ def update_list_view(list_box, books):
             val = books[key]
             list_box.insert(END, f"{key} - Title: {val['title']} Author: {val['author']} Year: {val['year']} Status: {val['status']}")
             index += 1
-        list_box.after(10, insert_batch)
-    insert_batch()
\ No newline at end of file
+        list_box.fill_job = list_box.after(10, insert_batch)
+    insert_batch()
+
+# Stops a fill started by update_list_view that is still running
+def stop_list_view(list_box):
+    if getattr(list_box, 'fill_job', None) is not None:
+        list_box.after_cancel(list_box.fill_job)
+        list_box.fill_job = None
+
+# Adds (key, book) pairs to the end of the list
+def append_list_view(list_box, rows):
+    for key, val in rows:
+        list_box.insert(END, f"{key} - Title: {val['title']} Author: {val['author']} Year: {val['year']} Status: {val['status']}")
@@ -2,9 +2,15 @@
 # Created by: Rownak Deb Kabya & Marcos Blanco-Leon
 # Email: rownak.kabya@stud.th-deg.de 
 # Email: marcos.blanco-Leon@stud.th-deg.de
+import json
+import os
+import tempfile
+import threading
+import time
 import unittest
 from unittest.mock import patch, mock_open
-from library_model import book_count, upload_image_model, load_file_model, save_file_model, add_book_model, delete_book_model, search_books_model, library
+import library_model
+from library_model import book_count, upload_image_model, load_file_model, save_file_model, add_book_model, delete_book_model, search_books_model, change_status_model, library
 
 class TestLibraryModel(unittest.TestCase):
     def setUp(self):
@@ -64,6 +70,503 @@ class TestLibraryModel(unittest.TestCase):
         self.assertEqual(len(result), 1, "Search should return one book")
         self.assertEqual(result[0]["title"], title, "Book title should match the search criteria")
 
-        
+
+class TestSearchIndex(unittest.TestCase):
+    def setUp(self):
+        library.clear()
+        library_model.enable_search_index()
+        add_book_model("Dawn in Paris of the Sun", "Rey Kein", "1999", "available")
+        add_book_model("Lost in Munich of the Sea", "Key Baron", "2001", "lent out")
+        add_book_model("Dusk in Berlin of the Moon", "Ron Aron", "1950", "missing")
+
+    def tearDown(self):
+        library_model.search_index = None
+        library.clear()
+
+    def scan(self, *args):
+        index = library_model.search_index
+        library_model.search_index = None
+        try:
+            return search_books_model(*args)
+        finally:
+            library_model.search_index = index
+
+    # indexed search must return the same books as the linear scan
+    def test_index_matches_scan(self):
+        for query in [("in munich", "", "", ""), ("", "baron", "", ""), ("of the", "ro", "", ""),
+                      ("dawn", "", "1999", "available"), ("zzz", "", "", "")]:
+            self.assertEqual(search_books_model(*query), self.scan(*query), f"Mismatch for {query}")
+
+    # deleted books drop out of the index
+    def test_index_after_delete(self):
+        delete_book_model("Lost in Munich of the Sea")
+        self.assertEqual(search_books_model("munich", "", "", ""), {}, "Deleted book should not be found")
+
+    # books put in the library directly are picked up on the next search
+    def test_index_resyncs(self):
+        library["9"] = {"title": "Sacred in Roy of the End", "author": "Frow Grpw", "year": "2010", "status": "available"}
+        self.assertIn("9", search_books_model("sacred", "", "", ""), "Index should be rebuilt")
+
+    # books replaced directly by as many other books are found in the new books
+    def test_index_after_same_size_replace(self):
+        library.clear()
+        library.update({str(i): {"title": title, "author": "A", "year": "2000", "status": "available"}
+                        for i, title in enumerate(["Alpha", "Beta", "Gamma"], 1)})
+        self.assertEqual(list(search_books_model("gamma", "", "", "")), ["3"])
+        self.assertEqual(search_books_model("munich", "", "", ""), {})
+
+    # an index that is out of date is rebuilt under the write lock, once, while searches run side by side
+    def test_index_rebuilt_under_write_lock(self):
+        library["9"] = {"title": "Sacred in Roy of the End", "author": "Frow Grpw", "year": "2010", "status": "available"}
+        index = library_model.search_index
+        rebuild = index.rebuild
+        held = []
+
+        def locked_rebuild(books):
+            held.append(library_model.library_lock.writer == threading.get_ident())
+            rebuild(books)
+
+        index.rebuild = locked_rebuild
+        found = []
+        threads = [threading.Thread(target=lambda: found.append(search_books_model("sacred", "", "", ""))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(held, [True])
+        self.assertEqual([set(result) for result in found], [{"9"}] * 4)
+
+    # a background search keeps going when the library changes under it
+    def test_iter_search_during_change(self):
+        rows = library_model.iter_search_books_model("", "", "", "")
+        first = next(rows)
+        add_book_model("Sacred in Roy of the End", "Frow Grpw", "2010", "available")
+        found = dict([first, *rows])
+        self.assertEqual(set(found), {"1", "2", "3"}, "Books from the start of the search should all be found")
+
+    # generated batches go into the index in bulk and still match the linear scan
+    def test_index_after_generate(self):
+        generate_batch, _ = library_model.generate_books_model(seed=1, batch_size=500)
+        generate_batch()
+        self.assertEqual(library_model.search_index.size, 503)
+        for query in [("dawn in paris", "", "", ""), ("", "baron", "", ""), ("sea", "ron", "", "missing")]:
+            self.assertEqual(search_books_model(*query), self.scan(*query), f"Mismatch for {query}")
+
+class TestJournal(unittest.TestCase):
+    def setUp(self):
+        library.clear()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "library.json")
+
+    def tearDown(self):
+        library_model.close_journal()
+        library.clear()
+        self.tmp.cleanup()
+
+    # second save of the same file only appends the changes
+    def test_save_appends_journal(self):
+        add_book_model("Book A", "Author A", "2001", "available")
+        save_file_model(self.path)
+        change_status_model("1", "lent out")
+        add_book_model("Book B", "Author B", "2002", "missing")
+        success, _ = save_file_model(self.path)
+        self.assertTrue(success, "Saving again should succeed")
+        with open(self.path + ".journal") as file:
+            self.assertEqual(len(file.readlines()), 2, "Journal should hold one record per change")
+        library.clear()
+        load_file_model(self.path)
+        self.assertEqual(library["1"]["status"], "lent out", "Status change should be replayed")
+        self.assertIn("2", library, "Added book should be replayed")
+
+    # books added in bulk are journaled one record each
+    def test_bulk_add_journaled(self):
+        add_book_model("Book A", "Author A", "2001", "available")
+        save_file_model(self.path)
+        library_model.add_books_bulk_model([("Book B", "Author B", "2002", "missing"), ("Book C", "Author C", "2003", "lent out")])
+        save_file_model(self.path)
+        library_model.close_journal()
+        library.clear()
+        load_file_model(self.path)
+        self.assertEqual(book_count(), 3)
+        self.assertEqual(library_model.status_counts_model(), {"available": 1, "missing": 1, "lent out": 1})
+
+    # compaction folds the journal back into the saved file
+    def test_compact_journal(self):
+        add_book_model("Book A", "Author A", "2001", "available")
+        save_file_model(self.path)
+        change_status_model("1", "missing")
+        library_model.compact_journal()
+        library_model.close_journal()
+        self.assertFalse(os.path.exists(self.path + ".journal.old"), "Sealed journal should be removed")
+        library.clear()
+        load_file_model(self.path)
+        self.assertEqual(library["1"]["status"], "missing", "Snapshot should contain the change")
+
+    # books loaded while the journal is open reach the file on the next save
+    def test_load_then_save(self):
+        other = os.path.join(self.tmp.name, "other.json")
+        with open(other, "w") as file:
+            json.dump({"7": {"title": "Other", "author": "A", "year": "2000", "status": "available"}}, file)
+        add_book_model("Book A", "Author A", "2001", "available")
+        save_file_model(self.path)
+        load_file_model(other)
+        save_file_model(self.path)
+        library_model.close_journal()
+        library.clear()
+        load_file_model(self.path)
+        self.assertEqual(book_count(), 2)
+
+class TestStats(unittest.TestCase):
+    def setUp(self):
+        library.clear()
+
+    def tearDown(self):
+        library.clear()
+
+    # counts follow adds, status changes and deletes without a rescan
+    def test_stats_follow_changes(self):
+        add_book_model("Book A", "Author A", "2001", "available")
+        add_book_model("Book B", "Author A", "1999", "available")
+        add_book_model("Book C", "Author B", "2001", "missing")
+        change_status_model("2", "lent out")
+        delete_book_model("Book C")
+        self.assertEqual(library_model.status_counts_model(), {"available": 1, "lent out": 1, "deleted": 1})
+        self.assertEqual(library_model.year_histogram_model(), [("1999", 1), ("2001", 1)])
+        self.assertEqual(library_model.top_authors_model(1), [("Author A", 2)])
+
+    # books put in the library directly are counted on the next call
+    def test_stats_resync(self):
+        library.update({"1": {"title": "T", "author": "A", "year": "2000", "status": "missing"}})
+        self.assertEqual(library_model.status_counts_model(), {"missing": 1})
+
+    # books replaced directly by as many other books are counted instead of the old ones
+    def test_stats_after_same_size_replace(self):
+        add_book_model("Book A", "Author A", "2001", "available")
+        self.assertEqual(library_model.status_counts_model(), {"available": 1})
+        library.clear()
+        library.update({"1": {"title": "T", "author": "B", "year": "1990", "status": "lent out"}})
+        self.assertEqual(library_model.status_counts_model(), {"lent out": 1})
+        self.assertEqual(library_model.year_histogram_model(), [("1990", 1)])
+        self.assertEqual(library_model.top_authors_model(), [("B", 1)])
+
+class TestGenerate(unittest.TestCase):
+    def setUp(self):
+        library.clear()
+
+    def tearDown(self):
+        library.clear()
+
+    # the same seed draws the same books
+    def test_generate_seeded(self):
+        generate_batch, _ = library_model.generate_books_model(seed=7, batch_size=100)
+        index, _, _, _ = generate_batch()
+        first = dict(library)
+        library.clear()
+        generate_batch, _ = library_model.generate_books_model(seed=7, batch_size=100)
+        generate_batch()
+        self.assertEqual(index, 100, "One batch should add batch_size books")
+        self.assertEqual(library, first, "Same seed should give the same books")
+
+    # cancelling puts the library back the way it was
+    def test_generate_cancel(self):
+        add_book_model("Book A", "Author A", "2001", "available")
+        generate_batch, cancel_generation = library_model.generate_books_model(seed=1, batch_size=50)
+        generate_batch()
+        cancel_generation()
+        self.assertEqual(list(library), ["1"], "Generated books should be removed")
+
+    # cancelling removes only the generated books, also after a vacuum or a book added by hand
+    def test_generate_cancel_after_changes(self):
+        add_book_model("Book A", "Author A", "2001", "available")
+        add_book_model("Book B", "Author B", "2002", "available")
+        delete_book_model("Book A")
+        generate_batch, cancel_generation = library_model.generate_books_model(seed=1, batch_size=50)
+        generate_batch()
+        library_model.vacuum_model()
+        add_book_model("Book C", "Author C", "2003", "missing")
+        generate_batch()
+        cancel_generation()
+        self.assertEqual(sorted(book["title"] for book in library.values()), ["Book B", "Book C"])
+        self.assertEqual(book_count(), 2)
+
+    # a bulk add is all or nothing and can be rolled back
+    def test_add_books_bulk(self):
+        mark = library_model.savepoint_model()
+        success, _ = library_model.add_books_bulk_model([("Book A", "Author A", "2001", "available"),
+                                                        ("Book B", "Author B", "200x", "available")])
+        self.assertFalse(success, "Invalid row should be rejected")
+        self.assertEqual(len(library), 0, "Nothing should be added")
+        success, _ = library_model.add_books_bulk_model([("Book A", "Author A", "2001", "available"),
+                                                        ("Book B", "Author B", "2002", "missing")])
+        self.assertTrue(success, "Valid rows should be added")
+        self.assertEqual(library["2"]["title"], "Book B", "Keys should follow on from the library")
+        library_model.rollback_model(mark)
+        self.assertEqual(len(library), 0, "Rollback should remove the added books")
+
+class TestFuzzySearch(unittest.TestCase):
+    def setUp(self):
+        library.clear()
+        add_book_model("Dawn in Paris of the Sun", "Rey Kein", "1999", "available")
+        add_book_model("Dawn in Paris of the Sea", "Key Baron", "2001", "lent out")
+        add_book_model("Dusk in Berlin of the Moon", "Ron Aron", "1950", "missing")
+
+    def tearDown(self):
+        library_model.title_index = None
+        library.clear()
+
+    # a misread letter still finds the title, closest first
+    def test_fuzzy_misread(self):
+        found = library_model.fuzzy_search_model("Dawm in Paris of the Sun")
+        self.assertEqual(list(found)[:2], ["1", "2"], "Closest title should come first")
+        self.assertNotIn("3", found, "Unrelated title should not match")
+
+    # the title index follows adds, deletes and direct changes
+    def test_fuzzy_follows_changes(self):
+        library_model.fuzzy_search_model("dusk")
+        delete_book_model("Dusk in Berlin of the Moon")
+        self.assertEqual(library_model.fuzzy_search_model("Dusk in Berlln"), {}, "Deleted book should not match")
+        library["9"] = {"title": "Sacred in Roy of the End", "author": "Frow Grpw", "year": "2010", "status": "available"}
+        self.assertIn("9", library_model.fuzzy_search_model("Sacrad in Roy"), "Index should be rebuilt")
+
+    # books replaced directly by as many other books are matched, the old ones are not
+    def test_fuzzy_after_same_size_replace(self):
+        library_model.fuzzy_search_model("dusk")
+        library.clear()
+        library.update({str(i): {"title": title, "author": "A", "year": "2000", "status": "available"}
+                        for i, title in enumerate(["Alpha Centauri", "Beta Pictoris", "Gamma Draconis"], 7)})
+        self.assertEqual(list(library_model.fuzzy_search_model("Gamma Dracomis")), ["9"])
+        self.assertEqual(library_model.fuzzy_search_model("Dawn in Paris of the Sun"), {})
+
+class TestTombstones(unittest.TestCase):
+    def setUp(self):
+        library.clear()
+        del library_model.free_keys[:]
+        add_book_model("Dawn in Paris", "Rey Kein", "1999", "available")
+        add_book_model("Sacred in Roy", "Frow Grpw", "2010", "lent out")
+        add_book_model("Dawn in Paris", "Key Baron", "2001", "missing")
+
+    def tearDown(self):
+        library_model.title_index = None
+        del library_model.free_keys[:]
+        library.clear()
+
+    # a deleted book keeps its record, and is only found by its status
+    def test_delete_keeps_record(self):
+        delete_book_model("Dawn in Paris")
+        self.assertEqual(library["1"], {"title": "Dawn in Paris", "author": "Rey Kein", "year": "1999", "status": "deleted"})
+        self.assertEqual(list(search_books_model("dawn", "", "", "")), ["3"])
+        self.assertEqual(list(search_books_model("", "", "", "deleted")), ["1"])
+
+    # deleting by title takes the oldest book that is not deleted yet
+    def test_delete_next_copy(self):
+        delete_book_model("dawn in paris")
+        delete_book_model("Dawn in Paris")
+        self.assertEqual(library["3"]["status"], "deleted")
+        self.assertEqual(delete_book_model("Dawn in Paris"), (False, "Book with Title not found!"))
+
+    # new books never take the key of a deleted one that is still kept
+    def test_add_after_delete(self):
+        delete_book_model("Sacred in Roy")
+        library.pop("1")
+        add_book_model("New Book", "Some One", "2020", "available")
+        self.assertEqual(library["2"]["status"], "deleted", "Tombstone should not be overwritten")
+        self.assertEqual(library["4"]["title"], "New Book")
+
+    # vacuum removes the deleted books, the others keep their keys
+    def test_vacuum(self):
+        delete_book_model("Sacred in Roy")
+        self.assertEqual(library_model.vacuum_model(), (True, "1 deleted books removed."))
+        self.assertEqual(list(library), ["1", "3"])
+        self.assertEqual(library_model.status_counts_model(), {"available": 1, "missing": 1})
+        self.assertEqual(library_model.vacuum_model()[0], False)
+        add_book_model("New Book", "Some One", "2020", "available")
+        self.assertEqual(library["2"]["title"], "New Book", "Freed key should be used again")
+
+    # a deleted book set back to available can be deleted again
+    def test_undelete(self):
+        delete_book_model("Sacred in Roy")
+        change_status_model("2", "available")
+        self.assertEqual(dict(library_model.top_authors_model(3))["Frow Grpw"], 1)
+        self.assertTrue(delete_book_model("Sacred in Roy")[0])
+
+    # books replaced directly by as many other books are still found by title
+    def test_delete_after_same_size_replace(self):
+        delete_book_model("Sacred in Roy")
+        library.clear()
+        library.update({str(i): {"title": title, "author": "A", "year": "2000", "status": "available"}
+                        for i, title in enumerate(["Alpha", "Beta", "Gamma"], 1)})
+        self.assertEqual(delete_book_model("Beta"), (True, "Book Beta deleted!"))
+        self.assertEqual(library["2"]["status"], "deleted")
+
+class TestLazyFile(unittest.TestCase):
+    def setUp(self):
+        library.clear()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "library.json")
+        add_book_model("Dawn in Paris", "Rey Kein", "1999", "available")
+        add_book_model("Café in Münich", "Frow Grpw", "2010", "lent out")
+        add_book_model("Sacred in Roy", "Key Baron", "2001", "missing")
+        save_file_model(self.path)
+        library_model.close_journal()
+        library.clear()
+
+    def tearDown(self):
+        library_model.close_lazy_model()
+        library.clear()
+        self.tmp.cleanup()
+
+    # books are counted and read one by one without loading the file
+    def test_open_lazy(self):
+        self.assertTrue(library_model.open_lazy_model(self.path)[0])
+        self.assertEqual(book_count(), 3)
+        self.assertEqual(len(library), 0, "Nothing should be loaded")
+        self.assertEqual(library_model.get_book_model("2"), {"title": "Café in Münich", "author": "Frow Grpw", "year": "2010", "status": "lent out"})
+        self.assertIsNone(library_model.get_book_model("9"))
+        self.assertTrue(os.path.exists(self.path + ".offsets"))
+
+    # a status change is journaled, so a normal load of the file sees it
+    def test_status_change_reaches_file(self):
+        library_model.open_lazy_model(self.path)
+        self.assertTrue(change_status_model("3", "available")[0])
+        self.assertEqual(change_status_model("9", "available"), (False, "Book not found!"))
+        self.assertEqual(library_model.get_book_model("3")["status"], "available")
+        load_file_model(self.path)
+        self.assertEqual(library["3"]["status"], "available")
+        self.assertEqual(book_count(), 3)
+
+    # the sidecar is reused, and rebuilt once the file changed
+    def test_sidecar_follows_file(self):
+        library_model.open_lazy_model(self.path)
+        stamp = os.stat(self.path + ".offsets").st_mtime_ns
+        library_model.open_lazy_model(self.path)
+        self.assertEqual(os.stat(self.path + ".offsets").st_mtime_ns, stamp, "Sidecar should be reused")
+        library_model.close_lazy_model()
+        library["1"] = {"title": "T", "author": "A", "year": "2000", "status": "missing"}
+        save_file_model(self.path)
+        library_model.close_journal()
+        library_model.open_lazy_model(self.path)
+        self.assertEqual(book_count(), 1)
+        self.assertEqual(library_model.get_book_model("1")["title"], "T")
+
+    # a torn journal line from a crash is cut off, changes made after reopening are kept
+    def test_torn_journal_line(self):
+        library_model.open_lazy_model(self.path)
+        change_status_model("1", "missing")
+        library_model.close_lazy_model()
+        with open(self.path + ".journal", "a") as journal:
+            journal.write('["2", {"title": "Caf')
+        library_model.open_lazy_model(self.path)
+        change_status_model("3", "lent out")
+        library_model.close_lazy_model()
+        load_file_model(self.path)
+        self.assertEqual(library["1"]["status"], "missing")
+        self.assertEqual(library["2"]["status"], "lent out")
+        self.assertEqual(library["3"]["status"], "lent out")
+
+    # saving while a file is opened on demand keeps its books and changes
+    def test_save_lazy(self):
+        library_model.open_lazy_model(self.path)
+        change_status_model("3", "lent out")
+        self.assertEqual(save_file_model(self.path), (True, "Library saved successfully!"))
+        other = os.path.join(self.tmp.name, "other.json")
+        self.assertTrue(save_file_model(other)[0])
+        change_status_model("1", "missing")
+        library_model.close_lazy_model()
+        for path, status in ((self.path, "available"), (other, "missing")):
+            library.clear()
+            load_file_model(path)
+            self.assertEqual(book_count(), 3)
+            self.assertEqual(library["1"]["status"], status)
+            self.assertEqual(library["2"]["title"], "Café in Münich")
+            self.assertEqual(library["3"]["status"], "lent out")
+
+class TestThreads(unittest.TestCase):
+    def setUp(self):
+        library.clear()
+        library_model.rebuild_stats()
+        library_model.add_books_bulk_model([("Book %d" % i, "Author", "2000", ("available", "lent out")[i % 2]) for i in range(2000)])
+
+    def tearDown(self):
+        library.clear()
+        library_model.rebuild_stats()
+
+    # searches on other threads never see half of a change that swaps two statuses
+    def test_searches_see_whole_changes(self):
+        counts = []
+        stop = threading.Event()
+
+        def search():
+            while not stop.is_set():
+                counts.append(len(search_books_model("", "", "", "available")))
+
+        readers = [threading.Thread(target=search) for _ in range(3)]
+        for reader in readers:
+            reader.start()
+        for i in range(1, 200):
+            with library_model.library_lock.write():
+                change_status_model(str(i), library[str(i + 1)]["status"])
+                # Give the searches a chance to run in the middle of the change
+                time.sleep(0.0005)
+                change_status_model(str(i + 1), "lent out" if library[str(i)]["status"] == "available" else "available")
+        stop.set()
+        for reader in readers:
+            reader.join()
+        self.assertTrue(counts)
+        self.assertEqual(set(counts), {1000})
+
+    # changing the library while reading it on the same thread fails instead of waiting forever
+    def test_no_write_inside_read(self):
+        with library_model.library_lock.read():
+            self.assertEqual(book_count(), 2000)
+            with self.assertRaises(RuntimeError):
+                add_book_model("New Book", "New Author", "2023", "available")
+        self.assertTrue(add_book_model("New Book", "New Author", "2023", "available")[0])
+
+class TestMerge(unittest.TestCase):
+    def setUp(self):
+        library.clear()
+        library_model.rebuild_stats()
+        self.tmp = tempfile.TemporaryDirectory()
+        files = {
+            "a.json": {"1": {"title": "Dawn in Paris", "author": "Rey Kein", "year": "1999", "status": "available"},
+                       "2": {"title": "Sacred in Roy", "author": "Key Baron", "year": "2001", "status": "missing"}},
+            "b.json": {"1": {"title": "Lost in Berlin", "author": "Aron Frow", "year": "2010", "status": "lent out"},
+                       "5": {"title": "dawn in paris ", "author": "Rey Kein", "year": "1999", "status": "lent out"},
+                       "6": {"status": "deleted"}},
+        }
+        for name, books in files.items():
+            with open(os.path.join(self.tmp.name, name), "w") as file:
+                json.dump(books, file)
+        with open(os.path.join(self.tmp.name, "c.json"), "w") as file:
+            file.write("{not json")
+
+    def tearDown(self):
+        library.clear()
+        library_model.rebuild_stats()
+        self.tmp.cleanup()
+
+    # a directory is merged in name order, duplicates are skipped and taken numbers renumbered
+    def test_merge_directory(self):
+        success, message, report = library_model.merge_files_model([self.tmp.name], workers=2)
+        self.assertTrue(success)
+        self.assertEqual(book_count(), 3)
+        self.assertEqual((report["files"], report["books"], report["added"]), (2, 5, 3))
+        self.assertEqual((report["duplicates"], report["skipped"]), (1, 1))
+        path, old, new = report["conflicts"][0]
+        self.assertEqual((os.path.basename(path), old), ("b.json", "1"))
+        self.assertEqual(library[new]["title"], "Lost in Berlin")
+        self.assertEqual(library["1"]["title"], "Dawn in Paris")
+        self.assertEqual(os.path.basename(report["errors"][0][0]), "c.json")
+        self.assertIn("1 books renumbered", message)
+
+    # books already in the library count as duplicates
+    def test_merge_into_library(self):
+        add_book_model("Sacred in Roy", "Key Baron", "2001", "available")
+        success, message, report = library_model.merge_files_model([os.path.join(self.tmp.name, "a.json")], workers=1)
+        self.assertTrue(success)
+        self.assertEqual(report["duplicates"], 1)
+        self.assertEqual(book_count(), 2)
+        self.assertEqual(library_model.status_counts_model(), {"available": 2})
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file